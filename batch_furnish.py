@@ -0,0 +1,399 @@
+"""Headless batch furnishing over a directory or manifest of room images
+
+Examples:
+    python batch_furnish.py rooms/ --output-dir results --preferences prefs.json --workers 4 --rpm 10
+    python batch_furnish.py manifest.jsonl --output-dir results --fake
+
+A directory input runs every image against every preference set in
+--preferences (a JSON object or list of objects). A manifest is a JSONL file
+with one job per line:
+    {"id": "unit-12", "image": "rooms/unit12.jpg", "preferences": {"style": "rustic"},
+     "furniture": [{"image": "sofa.jpg", "description": "Gray sofa"}]}
+
+Each finished job is appended to results.jsonl in the output directory and
+furnished images are written to its images/ folder. Re-running the same
+command skips jobs that already succeeded, so an interrupted run resumes
+where it stopped.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from furnishing.backends import (
+    BACKENDS, DEFAULT_BACKEND, DEFAULT_FAKE_OPTIONS, FakeOptions, create_client, requires_api_key
+)
+from furnishing.engine import DEFAULT_MODEL, FurnishingEngine, furniture_cache_items
+from furnishing.image_preprocessing import (
+    DEFAULT_FORMAT, DEFAULT_MAX_EDGE, DEFAULT_QUALITY, OUTPUT_FORMATS, PreprocessSettings
+)
+from furnishing.perceptual_hash import room_hashes
+from furnishing.prompts import DEFAULT_PROMPT_TOKEN_BUDGET
+from furnishing.response_cache import ResponseCache, content_digest
+from furnishing.room_index import RoomIndex, request_fingerprint
+from furnishing.scheduler import DEFAULT_RETRY_POLICY, RequestScheduler
+
+# Every job in a run shares one quota
+SCHEDULER_KEY = "batch"
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+RESULTS_FILE = "results.jsonl"
+ROOM_INDEX_FILE = "room_index.jsonl"
+
+# Same defaults create_room_prompt falls back to
+DEFAULT_PREFERENCES = {
+    'room_type': 'living room',
+    'style': 'modern',
+    'color_scheme': 'neutral',
+    'furniture_style': 'contemporary',
+    'lighting': 'natural',
+    'additional_items': [],
+    'special_instructions': ''
+}
+
+
+def load_preference_sets(path):
+    """Read one preference dict or a list of them, filled in with defaults"""
+    if not path:
+        return [dict(DEFAULT_PREFERENCES)]
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = [data]
+    return [{**DEFAULT_PREFERENCES, **preferences} for preferences in data]
+
+
+def job_fingerprint(image_path, preferences, furniture, model_id, draft):
+    """Digest of everything that decides a job's output: image path, preferences, furniture and render settings"""
+    fingerprint = json.dumps([os.path.abspath(image_path), preferences, furniture, model_id, draft], sort_keys=True)
+    return hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()
+
+
+def make_job(job_id, image_path, preferences, furniture, model_id, draft):
+    """Job dict; without a `job_id` (manifest lines may set one) a stable id is derived from the fingerprint
+
+    Reruns only skip a job whose id and fingerprint both match a finished
+    one. Output names carry the fingerprint too, so ids chosen in a
+    manifest never make two different jobs overwrite each other's image.
+    """
+    fingerprint = job_fingerprint(image_path, preferences, furniture, model_id, draft)
+    name = f"{job_id or os.path.splitext(os.path.basename(image_path))[0]}-{fingerprint[:10]}"
+    return {
+        'id': job_id or name,
+        'image': image_path,
+        'preferences': preferences,
+        'furniture': furniture,
+        'fingerprint': fingerprint,
+        'output_name': name
+    }
+
+
+def load_jobs(input_path, preference_sets, model_id=DEFAULT_MODEL, draft=False):
+    """Expand a directory or JSONL manifest into a list of job dicts
+
+    Fingerprints cover `model_id` and `draft`, so changing either starts
+    fresh jobs instead of resuming ones rendered with the old settings.
+    """
+    jobs = []
+    if os.path.isdir(input_path):
+        images = sorted(
+            os.path.join(input_path, name) for name in os.listdir(input_path)
+            if name.lower().endswith(IMAGE_EXTENSIONS)
+        )
+        for image_path in images:
+            for preferences in preference_sets:
+                jobs.append(make_job(None, image_path, preferences, [], model_id, draft))
+        return jobs
+
+    base_dir = os.path.dirname(os.path.abspath(input_path))
+    with open(input_path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+                image_path = os.path.join(base_dir, record['image'])
+            except (ValueError, KeyError) as e:
+                raise ValueError(f"{input_path}:{line_number}: invalid manifest line ({e})")
+            preferences = {**DEFAULT_PREFERENCES, **record.get('preferences', {})}
+            furniture = [
+                {'image': os.path.join(base_dir, item['image']), 'description': item['description']}
+                for item in record.get('furniture', [])
+            ]
+            jobs.append(make_job(record.get('id'), image_path, preferences, furniture, model_id, draft))
+    return jobs
+
+
+def load_completed(results_path):
+    """(id, fingerprint) pairs of jobs that already succeeded in a previous run"""
+    completed = set()
+    try:
+        with open(results_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A run killed mid-write can leave a partial last line
+                    continue
+                if record.get('status') == 'ok' and record.get('fingerprint'):
+                    completed.add((record['id'], record['fingerprint']))
+    except FileNotFoundError:
+        pass
+    return completed
+
+
+class ResultsWriter:
+    """Appends one JSON line per finished job and flushes it to disk immediately"""
+
+    def __init__(self, path):
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        with self._lock:
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+def _image_extension(data):
+    if data.startswith(b"\x89PNG"):
+        return "png"
+    if data.startswith(b"\xff\xd8"):
+        return "jpg"
+    if data[8:12] == b"WEBP":
+        return "webp"
+    return "bin"
+
+
+def _read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class BatchRunner:
+    """Runs furnishing jobs through a bounded worker pool under a request budget
+
+    `scheduler` is a RequestScheduler enforcing the budget and retrying
+    transient API errors; `deadline` bounds each request in seconds. With
+    `draft`, every job is a quick low-resolution draft render. Prompts are
+    fitted to `prompt_token_budget` estimated tokens.
+    """
+
+    def __init__(self, client, model_id, output_dir, scheduler, settings, response_cache=None, stream=True,
+                 dedupe=False, deadline=None, draft=False, prompt_token_budget=DEFAULT_PROMPT_TOKEN_BUDGET):
+        # Cache hits do not count against the request budget
+        self.engine = FurnishingEngine(
+            client, model_id, settings, response_cache=response_cache, scheduler=scheduler,
+            request_key=SCHEDULER_KEY, deadline=deadline, stream=stream, prompt_token_budget=prompt_token_budget
+        )
+        self.scheduler = scheduler
+        self.draft = draft
+        self._render = "draft" if draft else "final"
+        self.output_dir = output_dir
+        self.image_dir = os.path.join(output_dir, "images")
+        os.makedirs(self.image_dir, exist_ok=True)
+        # Near-duplicate rooms with the same request copy an earlier output
+        self.room_index = RoomIndex(os.path.join(output_dir, ROOM_INDEX_FILE)) if dedupe else None
+
+    def _output_exists(self, record):
+        return os.path.exists(os.path.join(self.output_dir, record['output']))
+
+    def _write_output(self, job, image_bytes):
+        output_path = os.path.join(self.image_dir, f"{job['output_name']}.{_image_extension(image_bytes)}")
+        with open(output_path, "wb") as f:
+            f.write(image_bytes)
+        return os.path.relpath(output_path, self.output_dir)
+
+    def run_job(self, job):
+        """Furnish one room and return its results record"""
+        started = time.perf_counter()
+        preferences = job['preferences']
+        room_bytes = _read(job['image'])
+        furniture_data = []
+        for item in job['furniture']:
+            data = _read(item['image'])
+            furniture_data.append({'data': data, 'description': item['description'], 'digest': content_digest(data)})
+
+        if self.room_index is not None:
+            hashes = room_hashes(room_bytes)
+            fingerprint = request_fingerprint(
+                preferences, furniture_cache_items(furniture_data), self.engine.model_id, self.draft
+            )
+            duplicate = self.room_index.find(hashes, fingerprint, is_available=self._output_exists)
+            if duplicate:
+                distance, match = duplicate
+                output = self._write_output(job, _read(os.path.join(self.output_dir, match['output'])))
+                return {
+                    'id': job['id'],
+                    'image': job['image'],
+                    'preferences': preferences,
+                    'furniture': job['furniture'],
+                    'fingerprint': job['fingerprint'],
+                    'model': self.engine.model_id,
+                    'render': self._render,
+                    'cached': True,
+                    'duplicate_of': match['job'],
+                    'distance': distance,
+                    'seconds': round(time.perf_counter() - started, 3),
+                    'status': 'ok',
+                    'output': output
+                }
+
+        result = self.engine.generate(room_bytes, preferences, furniture_data, draft=self.draft)
+
+        record = {
+            'id': job['id'],
+            'image': job['image'],
+            'preferences': preferences,
+            'furniture': job['furniture'],
+            'fingerprint': job['fingerprint'],
+            'model': self.engine.model_id,
+            'render': self._render,
+            'cached': result.cached,
+            'text': result.text,
+            'seconds': round(time.perf_counter() - started, 3)
+        }
+        if result.timing:
+            record.update(ttfb=round(result.timing.ttfb, 3), request_seconds=round(result.timing.total, 3))
+        image_bytes = result.image_bytes
+        if not image_bytes:
+            record.update(status='error', error="No furnished image was generated")
+            return record
+
+        record.update(status='ok', output=self._write_output(job, image_bytes))
+        if self.room_index is not None:
+            self.room_index.add(hashes, fingerprint, job=job['id'], output=record['output'])
+        return record
+
+    def _safe_run_job(self, job):
+        try:
+            return self.run_job(job)
+        except Exception as e:
+            return {'id': job['id'], 'image': job['image'], 'preferences': job['preferences'],
+                    'status': 'error', 'error': f"{type(e).__name__}: {e}"}
+
+    def run(self, jobs, workers, log=print):
+        """Run jobs, checkpointing each result; return (succeeded, failed) counts"""
+        results_path = os.path.join(self.output_dir, RESULTS_FILE)
+        completed = load_completed(results_path)
+        pending = [job for job in jobs if (job['id'], job['fingerprint']) not in completed]
+        if completed:
+            log(f"Resuming: {len(jobs) - len(pending)} of {len(jobs)} jobs already done")
+
+        writer = ResultsWriter(results_path)
+        succeeded = failed = 0
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="furnish")
+        try:
+            futures = [executor.submit(self._safe_run_job, job) for job in pending]
+            for done, future in enumerate(as_completed(futures), start=1):
+                record = future.result()
+                writer.write(record)
+                if record['status'] == 'ok':
+                    succeeded += 1
+                else:
+                    failed += 1
+                if record.get('duplicate_of'):
+                    detail = f"near-duplicate of {record['duplicate_of']}"
+                else:
+                    detail = "cached" if record.get('cached') else record.get('error', f"{record.get('seconds', 0):.1f}s")
+                log(f"[{done}/{len(pending)}] {record['id']}: {record['status']} ({detail})")
+        except KeyboardInterrupt:
+            log("Interrupted; waiting for running jobs. Run the same command again to resume.")
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
+        finally:
+            executor.shutdown(wait=True)
+            writer.close()
+        return succeeded, failed
+
+
+def build_client(args):
+    """Create a client for the chosen model backend (--fake is short for --backend fake)"""
+    backend = "fake" if args.fake else args.backend
+    api_key = None
+    if requires_api_key(backend):
+        api_key = args.api_key or os.environ.get("GOOGLE_API_KEY") or os.environ.get("GEMINI_API_KEY")
+        if not api_key:
+            raise SystemExit("An API key is required: pass --api-key or set GOOGLE_API_KEY (or use --fake)")
+    return create_client(backend, api_key, FakeOptions(args.fake_delay, args.fake_failure_rate, args.fake_seed))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Furnish a directory or manifest of room images without the web UI",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__.split("\n\n", 1)[1]
+    )
+    parser.add_argument("input", help="Directory of room images or a JSONL manifest")
+    parser.add_argument("--output-dir", required=True, help="Where images and results.jsonl are written")
+    parser.add_argument("--preferences", help="JSON file with a preference object or list (directory input)")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent requests")
+    parser.add_argument("--rpm", type=float, default=10, help="Request budget in requests per minute")
+    parser.add_argument("--max-attempts", type=int, default=DEFAULT_RETRY_POLICY.max_attempts,
+                        help="Attempts per request, counting retries of rate-limit and server errors")
+    parser.add_argument("--deadline", type=float, help="Give up on a request after this many seconds")
+    parser.add_argument("--max-edge", type=int, default=DEFAULT_MAX_EDGE, help="Downscale uploads to this edge")
+    parser.add_argument("--format", choices=list(OUTPUT_FORMATS), default=DEFAULT_FORMAT)
+    parser.add_argument("--quality", type=int, default=DEFAULT_QUALITY)
+    parser.add_argument("--cache-dir", help="Reuse a response cache directory")
+    parser.add_argument("--no-stream", action="store_true", help="Use blocking requests instead of streaming")
+    parser.add_argument("--draft", action="store_true",
+                        help="Quick low-resolution drafts from downscaled images and a short prompt")
+    parser.add_argument("--prompt-budget", type=int, default=DEFAULT_PROMPT_TOKEN_BUDGET,
+                        help="Estimated token budget for each prompt; long furniture lists are summarized to fit")
+    parser.add_argument("--dedupe", action="store_true",
+                        help="Copy the earlier output for near-duplicate rooms with the same preferences")
+    parser.add_argument("--api-key", help="Google AI API key (defaults to GOOGLE_API_KEY)")
+    parser.add_argument("--backend", choices=list(BACKENDS), default=DEFAULT_BACKEND, help="Model backend")
+    parser.add_argument("--fake", action="store_true", help="Use the local fake model instead of Gemini")
+    parser.add_argument("--fake-delay", type=float, default=0.5)
+    parser.add_argument("--fake-failure-rate", type=float, default=0.0)
+    parser.add_argument("--fake-seed", type=int, default=DEFAULT_FAKE_OPTIONS.seed)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    jobs = load_jobs(args.input, load_preference_sets(args.preferences), args.model, args.draft)
+    if not jobs:
+        print("No room images found", file=sys.stderr)
+        return 1
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    runner = BatchRunner(
+        build_client(args),
+        args.model,
+        args.output_dir,
+        RequestScheduler(args.rpm, burst=1, retry_policy=DEFAULT_RETRY_POLICY._replace(max_attempts=args.max_attempts)),
+        PreprocessSettings(args.max_edge, args.format, args.quality),
+        ResponseCache(args.cache_dir) if args.cache_dir else None,
+        stream=not args.no_stream,
+        dedupe=args.dedupe,
+        deadline=args.deadline,
+        draft=args.draft,
+        prompt_token_budget=args.prompt_budget
+    )
+    try:
+        succeeded, failed = runner.run(jobs, args.workers)
+    except KeyboardInterrupt:
+        return 130
+    print(f"Done: {succeeded} succeeded, {failed} failed. Results in {os.path.join(args.output_dir, RESULTS_FILE)}")
+    stats = runner.scheduler.stats()
+    if stats['retries'] or stats['deadline_exceeded'] or stats['circuit_rejections']:
+        print(f"Requests: {stats['attempts']} attempts, {stats['retries']} retries, "
+              f"{stats['deadline_exceeded']} past deadline, {stats['circuit_rejections']} rejected by the circuit breaker")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
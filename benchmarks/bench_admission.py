@@ -0,0 +1,94 @@
+"""Benchmark: queue wait of single requests next to a session flooding the API with variations
+
+One heavy session keeps submitting 4-variation batches while light
+sessions each send single requests. Requests go through either a plain
+semaphore with the same global limit (first come, first served) or the
+AdmissionController (per-session limit plus fair queuing), against a fake
+model with a fixed latency.
+
+Run from the repository root:
+    python -m benchmarks.bench_admission --slots 4 --batches 6 --light-sessions 3
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from furnishing.admission import AdmissionController
+from furnishing.fake_gemini import FakeClient
+from furnishing.metrics import percentile
+
+MODEL_ID = "gemini-2.5-flash-image-preview"
+
+
+class SemaphoreAdmission:
+    """Global limit only, admitted in arrival order"""
+
+    def __init__(self, slots):
+        self._semaphore = threading.Semaphore(slots)
+
+    @contextmanager
+    def admit(self, session):
+        started = time.perf_counter()
+        self._semaphore.acquire()
+        try:
+            yield time.perf_counter() - started
+        finally:
+            self._semaphore.release()
+
+
+def run(admission, args):
+    """Queue waits in seconds of the heavy session's requests and of the light sessions' requests"""
+    client = FakeClient(delay=args.delay)
+    waits = {'heavy': [], 'light': []}
+    lock = threading.Lock()
+
+    def request(session, kind):
+        with admission.admit(session) as waited:
+            client.models.generate_content(model=MODEL_ID, contents=[session])
+        with lock:
+            waits[kind].append(waited)
+
+    # Variation workers per batch plus the light sessions' requests
+    with ThreadPoolExecutor(max_workers=args.batches * 4 + args.light_sessions) as executor:
+        futures = [executor.submit(request, "heavy", "heavy") for _ in range(args.batches * 4)]
+        # Light sessions click a little later, once the heavy batches are queued
+        time.sleep(args.delay / 2)
+        for _ in range(args.light_rounds):
+            light = [executor.submit(request, f"light-{i}", "light") for i in range(args.light_sessions)]
+            for future in light:
+                future.result()
+        for future in futures:
+            future.result()
+    return waits
+
+
+def describe(waits):
+    values = sorted(waits)
+    return f"p50 {percentile(values, 0.5):5.2f}s  p95 {percentile(values, 0.95):5.2f}s"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--slots", type=int, default=4, help="Requests in flight across all sessions")
+    parser.add_argument("--per-session", type=int, default=2, help="Requests in flight per session (fair queuing)")
+    parser.add_argument("--batches", type=int, default=6, help="4-variation batches of the heavy session")
+    parser.add_argument("--light-sessions", type=int, default=3)
+    parser.add_argument("--light-rounds", type=int, default=3, help="Single requests per light session")
+    parser.add_argument("--delay", type=float, default=0.2, help="Fake model latency in seconds")
+    args = parser.parse_args()
+
+    for label, admission in [
+        ("first come, first served", SemaphoreAdmission(args.slots)),
+        ("fair admission", AdmissionController(args.slots, args.per_session)),
+    ]:
+        started = time.perf_counter()
+        waits = run(admission, args)
+        print(f"{label}: done in {time.perf_counter() - started:.2f}s")
+        print(f"  single requests:    {describe(waits['light'])}")
+        print(f"  variation requests: {describe(waits['heavy'])}")
+
+
+if __name__ == "__main__":
+    main()
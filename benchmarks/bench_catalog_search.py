@@ -0,0 +1,74 @@
+"""Benchmark: furniture catalog search latency against catalog size
+
+Index rows are inserted directly (no image files are written) so large
+catalogs build in seconds; search only reads the SQLite index either way.
+
+Run from the repository root:
+    python -m benchmarks.bench_catalog_search --items 50000
+"""
+import argparse
+import hashlib
+import random
+import statistics
+import tempfile
+import time
+
+from furnishing.furniture_catalog import FurnitureCatalog
+
+STYLES = ["contemporary", "vintage", "modern", "traditional", "industrial", "scandinavian", "mid-century", "rustic", "luxury"]
+COLORS = ["gray", "white", "black", "walnut", "oak", "navy", "green", "beige", "leather", "velvet", "brass", "marble"]
+PIECES = ["sofa", "armchair", "coffee table", "dining table", "bookshelf", "floor lamp", "rug", "bed frame",
+          "nightstand", "dresser", "sideboard", "desk", "office chair", "bar stool", "mirror", "plant stand"]
+QUERIES = ["sofa", "gray sofa", "walnut coffee table", "lamp", "velvet", "brass floor", "oak desk", "marble"]
+
+
+def populate(catalog, count, seed=0):
+    rng = random.Random(seed)
+    start = time.time() - count
+    for i in range(count):
+        piece = rng.choice(PIECES)
+        description = f"{rng.choice(COLORS).title()} {rng.choice(COLORS)} {piece} #{i}"
+        catalog._index(
+            hashlib.sha256(str(i).encode()).hexdigest(),
+            description,
+            rng.choice(STYLES),
+            [piece.split()[-1], rng.choice(COLORS)],
+            f"item_{i}.jpg",
+            (1200, 900),
+            250_000,
+            added=start + i
+        )
+
+
+def time_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), max(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        catalog = FurnitureCatalog(root)
+        started = time.perf_counter()
+        populate(catalog, args.items)
+        print(f"indexed {args.items} items in {time.perf_counter() - started:.1f}s")
+
+        cases = [("(browse)", None)] + [(query, None) for query in QUERIES] + [("sofa", "modern"), ("(browse)", "rustic")]
+        print(f"{'query':>22} {'style':>13} {'median (ms)':>12} {'max (ms)':>9}")
+        for query, style in cases:
+            text = "" if query == "(browse)" else query
+            median, worst = time_ms(lambda: catalog.search(text, style), args.repeat)
+            print(f"{query:>22} {style or '-':>13} {median:>12.2f} {worst:>9.2f}")
+        catalog.close()
+
+
+if __name__ == "__main__":
+    main()
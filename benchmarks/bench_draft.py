@@ -0,0 +1,61 @@
+"""Benchmark: request payload and time of a draft render vs a full-quality one
+
+Run from the repository root:
+    python -m benchmarks.bench_draft --furniture 0 1 3
+"""
+import argparse
+import io
+import time
+
+from benchmarks.bench_gallery_rerun import make_room_image
+from furnishing.engine import FurnishingEngine
+from furnishing.fake_gemini import FakeClient
+from furnishing.prompts import create_draft_prompt, create_room_prompt
+from furnishing.response_cache import content_digest
+
+PHOTO_SIZE = (2400, 1800)
+FURNITURE_SIZE = (1200, 1200)
+PREFERENCES = {'room_type': 'living room', 'style': 'modern', 'color_scheme': 'neutral'}
+
+
+def encode(image, size):
+    buffer = io.BytesIO()
+    image.resize(size).save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def prepare_ms(room, items, draft):
+    # Fresh engine so the preprocessing memo does not hide the encode cost
+    engine = FurnishingEngine(FakeClient(delay=0))
+    started = time.perf_counter()
+    _, payload = engine.prepare_images(room, items, draft=draft)
+    return (time.perf_counter() - started) * 1000, payload['encoded_bytes']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--furniture", type=int, nargs="+", default=[0, 1, 3])
+    args = parser.parse_args()
+
+    room = encode(make_room_image(0), PHOTO_SIZE)
+    furniture = []
+    for i in range(max(args.furniture)):
+        data = encode(make_room_image(i + 1), FURNITURE_SIZE)
+        furniture.append({'data': data, 'digest': content_digest(data), 'description': f"Item {i + 1}"})
+
+    prepare_ms(room, [], draft=False)  # warm up codecs
+
+    print(f"{'furniture':>10} {'full':>18} {'draft':>18} {'prompt chars':>16}")
+    for count in args.furniture:
+        items = furniture[:count]
+        full_ms, full_bytes = prepare_ms(room, items, draft=False)
+        draft_ms, draft_bytes = prepare_ms(room, items, draft=True)
+        full_prompt = create_room_prompt(PREFERENCES, items or None)
+        draft_prompt = create_draft_prompt(PREFERENCES, items or None)
+        print(f"{count:>10} {full_bytes / 1024:>6.0f} KB {full_ms:>5.0f} ms"
+              f" {draft_bytes / 1024:>6.0f} KB {draft_ms:>5.0f} ms"
+              f" {len(full_prompt):>7} -> {len(draft_prompt):>4}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Benchmark: request payload of a refinement edit vs regenerating from scratch
+
+Regenerating sends the empty room plus every furniture image with the full
+room prompt; an edit sends only the furnished image and a short instruction.
+
+Run from the repository root:
+    python -m benchmarks.bench_edit_payload --furniture 0 1 3 5
+"""
+import argparse
+import io
+
+from benchmarks.bench_gallery_rerun import make_room_image
+from furnishing.engine import FurnishingEngine
+from furnishing.fake_gemini import FakeClient
+from furnishing.prompts import add_special_instructions, create_edit_prompt, create_room_prompt
+from furnishing.response_cache import content_digest
+
+PHOTO_SIZE = (2400, 1800)
+FURNITURE_SIZE = (1200, 1200)
+FURNISHED_SIZE = (1024, 768)
+PREFERENCES = {'room_type': 'living room', 'style': 'modern', 'color_scheme': 'neutral'}
+INSTRUCTION = "Make the sofa blue"
+
+
+def encode(image, size, format="JPEG"):
+    buffer = io.BytesIO()
+    image.resize(size).save(buffer, format=format, quality=90)
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--furniture", type=int, nargs="+", default=[0, 1, 3, 5])
+    args = parser.parse_args()
+
+    engine = FurnishingEngine(FakeClient(delay=0))
+    room = encode(make_room_image(0), PHOTO_SIZE)
+    furnished = encode(make_room_image(99), FURNISHED_SIZE, "PNG")
+    furniture = []
+    for i in range(max(args.furniture)):
+        data = encode(make_room_image(i + 1), FURNITURE_SIZE)
+        furniture.append({'data': data, 'digest': content_digest(data), 'description': f"Item {i + 1}"})
+
+    _, edit_payload = engine.prepare_images(furnished)
+    edit_prompt = create_edit_prompt(INSTRUCTION)
+
+    print(f"{'furniture':>10} {'regenerate':>12} {'edit':>10} {'prompt chars':>20}")
+    for count in args.furniture:
+        items = furniture[:count]
+        _, payload = engine.prepare_images(room, items)
+        prompt = add_special_instructions(create_room_prompt(PREFERENCES, items or None), INSTRUCTION)
+        print(f"{count:>10} {payload['encoded_bytes'] / 1024:>9.0f} KB {edit_payload['encoded_bytes'] / 1024:>7.0f} KB"
+              f" {len(prompt):>9} -> {len(edit_prompt):>5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Benchmark: furniture upload column rerun cost, before and after the asset registry
+
+Before: every rerun read, hashed and decoded each furniture upload, and
+st.image re-encoded the full decoded image to send it to the browser.
+After: FurnitureRegistry.sync looks the uploads up by file id and the
+column shows the thumbnail built when the file was first registered.
+
+Run from the repository root:
+    python -m benchmarks.bench_furniture_rerun --items 0 1 5 10
+"""
+import argparse
+import io
+import time
+
+from PIL import Image as PILImage
+
+from benchmarks.bench_gallery_rerun import make_room_image
+from furnishing.furniture_assets import FurnitureRegistry
+from furnishing.response_cache import content_digest
+
+PHOTO_SIZE = (2400, 1800)
+
+
+class UploadedFile(io.BytesIO):
+    """Just enough of Streamlit's UploadedFile: bytes, name and file id"""
+
+    def __init__(self, data, name):
+        super().__init__(data)
+        self.name = name
+        self.file_id = name
+
+
+def make_upload(i):
+    buffer = io.BytesIO()
+    make_room_image(i).resize(PHOTO_SIZE).save(buffer, format="JPEG", quality=90)
+    return UploadedFile(buffer.getvalue(), f"item_{i}.jpg")
+
+
+def rerun_before(uploads):
+    """Old column: hash, decode and re-encode every upload (what st.image did with the PIL image)"""
+    start = time.perf_counter()
+    for upload in uploads:
+        image = PILImage.open(upload)
+        data = upload.getvalue()
+        content_digest(data)
+        image.convert("RGB").save(io.BytesIO(), format="JPEG", quality=100)
+    return time.perf_counter() - start
+
+
+def rerun_after(registry, uploads):
+    """New column: registry lookups; thumbnails are already encoded"""
+    start = time.perf_counter()
+    for asset in registry.sync(uploads):
+        asset.as_furniture("Gray sofa")
+        len(asset.thumbnail)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, nargs="+", default=[0, 1, 5, 10])
+    parser.add_argument("--reruns", type=int, default=5)
+    args = parser.parse_args()
+
+    uploads = [make_upload(i) for i in range(max(args.items))]
+
+    print(f"{'items':>6} {'before (ms)':>12} {'after (ms)':>11} {'first upload (ms)':>18}")
+    for count in args.items:
+        registry = FurnitureRegistry()
+        start = time.perf_counter()
+        registry.sync(uploads[:count])
+        first = time.perf_counter() - start
+
+        before = min(rerun_before(uploads[:count]) for _ in range(args.reruns))
+        after = min(rerun_after(registry, uploads[:count]) for _ in range(args.reruns))
+        print(f"{count:>6} {before * 1000:>12.1f} {after * 1000:>11.3f} {first * 1000:>18.1f}")
+
+
+if __name__ == "__main__":
+    main()
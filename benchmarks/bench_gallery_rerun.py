@@ -0,0 +1,87 @@
+"""Benchmark: gallery rerun cost against gallery size, before and after lazy downloads
+
+Before: every rerun re-encoded the original and furnished image of every
+room as PNG to build the download buttons. After: a rerun only reads the
+opened room's blobs; download payloads are encoded on click and memoized.
+
+Run from the repository root:
+    python -m benchmarks.bench_gallery_rerun --sizes 5 10 25
+"""
+import argparse
+import io
+import os
+import tempfile
+import time
+
+from PIL import Image as PILImage
+from PIL import ImageFilter
+
+from furnishing.gallery_store import GalleryStore
+
+IMAGE_SIZE = (1024, 768)
+
+
+def make_room_image(seed):
+    """A noisy gradient, closer to a photo than a flat color for PNG encoding"""
+    gradient = PILImage.linear_gradient("L").resize(IMAGE_SIZE)
+    noise = PILImage.effect_noise(IMAGE_SIZE, 40 + seed % 10).filter(ImageFilter.GaussianBlur(2))
+    return PILImage.merge("RGB", (gradient, noise, gradient.rotate(90 + seed)))
+
+
+def encode_png(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def rerun_before(rooms):
+    """Old gallery: PNG-encode both images of every room on every rerun"""
+    start = time.perf_counter()
+    for original, furnished in rooms:
+        encode_png(original)
+        encode_png(furnished)
+    return time.perf_counter() - start
+
+
+def rerun_after(store, entries):
+    """New gallery: read the opened room's blobs; downloads are lazy callables"""
+    start = time.perf_counter()
+    opened = entries[-1]
+    store.get_bytes(opened['original'])
+    store.get_bytes(opened['furnished'])
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 10, 25])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        store = GalleryStore(os.path.join(root, "gallery"))
+        original = make_room_image(0)
+        original_digest = store.put_bytes(encode_png(original))
+        rooms, entries = [], []
+        for i in range(max(args.sizes)):
+            furnished = make_room_image(i + 1)
+            rooms.append((original, furnished))
+            entries.append({'original': original_digest, 'furnished': store.put_bytes(encode_png(furnished))})
+
+        # Cost of a download click: first encode, then memoized
+        start = time.perf_counter()
+        store.export_bytes(entries[0]['furnished'])
+        first_click = time.perf_counter() - start
+        start = time.perf_counter()
+        store.export_bytes(entries[0]['furnished'])
+        memoized_click = time.perf_counter() - start
+
+        print(f"{'rooms':>6} {'before (ms)':>12} {'after (ms)':>11}")
+        for size in args.sizes:
+            before = rerun_before(rooms[:size])
+            after = rerun_after(store, entries[:size])
+            print(f"{size:>6} {before * 1000:>12.1f} {after * 1000:>11.2f}")
+        print(f"download click: first {first_click * 1000:.1f} ms, memoized {memoized_click * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
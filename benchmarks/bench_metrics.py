@@ -0,0 +1,64 @@
+"""Benchmark: instrumentation overhead per timed stage, enabled vs disabled
+
+Also times a full engine generation against the fake client with and
+without metrics, to put the per-call cost next to a real request.
+
+Run from the repository root:
+    python -m benchmarks.bench_metrics --calls 200000
+"""
+import argparse
+import io
+import time
+
+from PIL import Image as PILImage
+
+from furnishing.engine import FurnishingEngine
+from furnishing.fake_gemini import FakeClient
+from furnishing.metrics import Metrics
+
+
+def per_call_ns(fn, calls):
+    started = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - started) / calls * 1e9
+
+
+def timed_stage(metrics):
+    def stage():
+        with metrics.timer("stage_seconds"):
+            pass
+    return stage
+
+
+def generation_ms(metrics, room_bytes, repeat):
+    engine = FurnishingEngine(FakeClient(delay=0), stream=False, metrics=metrics)
+    engine.generate(room_bytes, {'style': 'modern'})
+    started = time.perf_counter()
+    for _ in range(repeat):
+        engine.generate(room_bytes, {'style': 'modern'})
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200000)
+    parser.add_argument("--generations", type=int, default=50)
+    args = parser.parse_args()
+
+    baseline = per_call_ns(lambda: None, args.calls)
+    disabled = per_call_ns(timed_stage(Metrics(enabled=False)), args.calls)
+    enabled = per_call_ns(timed_stage(Metrics()), args.calls)
+    print(f"empty call:         {baseline:7.0f} ns")
+    print(f"timer, disabled:    {disabled:7.0f} ns")
+    print(f"timer, enabled:     {enabled:7.0f} ns")
+
+    buffer = io.BytesIO()
+    PILImage.new("RGB", (1024, 768), (180, 170, 150)).save(buffer, format="JPEG")
+    room_bytes = buffer.getvalue()
+    print(f"generation, metrics off: {generation_ms(Metrics(enabled=False), room_bytes, args.generations):6.2f} ms")
+    print(f"generation, metrics on:  {generation_ms(Metrics(), room_bytes, args.generations):6.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
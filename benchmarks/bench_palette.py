@@ -0,0 +1,79 @@
+"""Benchmark: palette extraction time and color search latency against gallery size
+
+Extraction runs on a synthetic furnished room encoded as JPEG and PNG at
+the given size. The index is filled with random palettes (a handful of
+colors with random coverage, random style and room type, 50 rooms per
+session like a full gallery); searches for one color and for a
+five-color palette are timed with and without the style and room type
+filters, and within one session as the app runs them.
+
+Run from the repository root:
+    python -m benchmarks.bench_palette --rooms 50000
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from benchmarks.bench_structure import draw_room, encode
+from furnishing.gallery_store import DEFAULT_MAX_SESSION_ENTRIES
+from furnishing.palette import PALETTE_COLORS, PaletteIndex, extract_palette, palette_from_colors
+
+# The app's selectbox options
+STYLES = ["modern", "minimalist", "traditional", "contemporary", "scandinavian", "industrial", "bohemian", "rustic",
+          "mid-century modern", "art deco"]
+ROOM_TYPES = ["living room", "bedroom", "dining room", "kitchen", "office", "bathroom", "nursery", "study room"]
+
+
+def random_palette(rng):
+    rgb = rng.integers(0, 256, (PALETTE_COLORS, 3))
+    weights = np.sort(rng.dirichlet(np.ones(PALETTE_COLORS)))[::-1]
+    return palette_from_colors(["#%02x%02x%02x" % tuple(color) for color in rgb], weights.tolist())
+
+
+def time_ms(fn, repeat):
+    fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), max(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rooms", type=int, default=50000)
+    parser.add_argument("--size", type=int, default=1024, help="Long edge of the furnished image in pixels")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    room = draw_room((args.size, args.size * 3 // 4), furniture=True)
+    for format in ("JPEG", "PNG"):
+        data = encode(room, format)
+        median, worst = time_ms(lambda: extract_palette(data), args.repeat)
+        palette = extract_palette(data)
+        print(f"extract from {args.size} px {format:<4}: {median:6.2f} ms (max {worst:.2f})  "
+              + " ".join(f"{color} {weight:.0%}" for color, weight in zip(palette.colors, palette.weights)))
+
+    rng = np.random.default_rng(0)
+    index = PaletteIndex()
+    started = time.perf_counter()
+    for i in range(args.rooms):
+        index.add(random_palette(rng), STYLES[rng.integers(len(STYLES))], ROOM_TYPES[rng.integers(len(ROOM_TYPES))],
+                  f"session-{i // DEFAULT_MAX_SESSION_ENTRIES}", furnished=f"{i:064x}")
+    print(f"\nindexed {args.rooms} palettes in {time.perf_counter() - started:.1f}s")
+
+    queries = [("one color", palette_from_colors(["#c8a27a"])), ("five-color palette", palette)]
+    filters = [("-", None, None, None), ("modern", "modern", None, None),
+               ("modern bedroom", "modern", "bedroom", None), ("one session", None, None, "session-0")]
+    print(f"{'query':>20} {'filter':>16} {'median (ms)':>12} {'max (ms)':>9}")
+    for label, query in queries:
+        for filter_label, style, room_type, session in filters:
+            median, worst = time_ms(lambda: index.search(query, style, room_type, session), args.repeat)
+            print(f"{label:>20} {filter_label:>16} {median:>12.2f} {worst:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Benchmark: wait for the next single-style try with and without speculative prefetch
+
+Simulated users generate a style, think for a moment, then try a
+neighbouring style or color scheme (or, now and then, anything else).
+Each click is timed from the request to its result, against a fake model
+with a fixed latency, with no prefetch, with prefetch ranked only by the
+selectbox neighbours, and with prefetch ranked by transition counts
+learned from earlier simulated sessions. Extra model requests are the
+price: they are capped per session, and a prefetch that has not started
+when its request is made is cancelled.
+
+Run from the repository root:
+    python -m benchmarks.bench_prefetch --sessions 3 --steps 8 --delay 0.2
+"""
+import argparse
+import io
+import json
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from benchmarks.bench_gallery_rerun import make_room_image
+from furnishing.engine import FurnishingEngine
+from furnishing.fake_gemini import FakeClient
+from furnishing.metrics import percentile
+from furnishing.prefetch import (
+    DEFAULT_CANDIDATES, DEFAULT_SESSION_BUDGET, DEFAULT_WORKERS, Prefetcher, TransitionStats
+)
+from furnishing.response_cache import ResponseCache, content_digest
+
+# The app's selectbox options
+STYLES = ["modern", "minimalist", "traditional", "contemporary", "scandinavian", "industrial", "bohemian", "rustic",
+          "mid-century modern", "art deco"]
+COLOR_SCHEMES = ["neutral", "warm", "cool", "monochrome", "pastel", "bold", "earth tones", "jewel tones",
+                 "black and white"]
+ROOM_SIZE = (1024, 768)
+
+
+def next_choice(choice, rng):
+    """A user's next try: usually the next style, sometimes the next color scheme, now and then anything"""
+    style, color_scheme = choice
+    roll = rng.random()
+    if roll < 0.6:
+        return STYLES[(STYLES.index(style) + 1) % len(STYLES)], color_scheme
+    if roll < 0.85:
+        return style, COLOR_SCHEMES[(COLOR_SCHEMES.index(color_scheme) + 1) % len(COLOR_SCHEMES)]
+    return rng.choice(STYLES), rng.choice(COLOR_SCHEMES)
+
+
+def walk(rng, steps):
+    choice = (rng.choice(STYLES), rng.choice(COLOR_SCHEMES))
+    choices = [choice]
+    for _ in range(steps - 1):
+        choice = next_choice(choice, rng)
+        choices.append(choice)
+    return choices
+
+
+def trained_stats(sessions, steps, seed):
+    stats = TransitionStats()
+    rng = random.Random(seed)
+    for _ in range(sessions):
+        choices = walk(rng, steps)
+        for previous, current in zip(choices, choices[1:]):
+            stats.record(previous, current)
+    return stats
+
+
+def run(stats, args):
+    """Seconds waited for every click after the first, and the Prefetcher (None without prefetch)"""
+    prefetcher = Prefetcher(args.workers, args.budget) if stats else None
+    waits = []
+    lock = threading.Lock()
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = FurnishingEngine(FakeClient(delay=args.delay), response_cache=ResponseCache(directory), stream=False)
+
+        def session(index):
+            buffer = io.BytesIO()
+            make_room_image(index).resize(ROOM_SIZE).save(buffer, format="JPEG", quality=90)
+            room = buffer.getvalue()
+            digest = content_digest(room)
+            rng = random.Random(args.seed + index)
+            for step, (style, color_scheme) in enumerate(walk(rng, args.steps)):
+                preferences = {'style': style, 'color_scheme': color_scheme}
+                started = time.perf_counter()
+                prefetched = prefetcher and prefetcher.claim(index, json.dumps(preferences, sort_keys=True))
+                if prefetched:
+                    wait([prefetched])
+                result = engine.generate(room, preferences, room_digest=digest)
+                if prefetched:
+                    prefetcher.consume(prefetched, result)
+                if step:
+                    with lock:
+                        waits.append(time.perf_counter() - started)
+                if prefetcher:
+                    for style_next, color_next in stats.likely_next(
+                        (style, color_scheme), STYLES, COLOR_SCHEMES, args.candidates
+                    ):
+                        candidate = {'style': style_next, 'color_scheme': color_next}
+                        prefetcher.submit(
+                            index, json.dumps(candidate, sort_keys=True),
+                            lambda candidate=candidate: engine.generate(room, candidate, room_digest=digest)
+                        )
+                time.sleep(args.think)
+
+        with ThreadPoolExecutor(max_workers=args.sessions) as executor:
+            for future in [executor.submit(session, i) for i in range(args.sessions)]:
+                future.result()
+        if prefetcher:
+            prefetcher.shutdown()
+    return sorted(waits), prefetcher
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=3, help="Simulated users, running at the same time")
+    parser.add_argument("--steps", type=int, default=8, help="Single-style tries per user")
+    parser.add_argument("--train-sessions", type=int, default=500, help="Earlier sessions the transition counts learn from")
+    parser.add_argument("--candidates", type=int, default=DEFAULT_CANDIDATES, help="Prefetches after each try")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Prefetch worker threads")
+    parser.add_argument("--budget", type=int, default=DEFAULT_SESSION_BUDGET, help="Prefetched model requests per session")
+    parser.add_argument("--delay", type=float, default=0.2, help="Fake model latency in seconds")
+    parser.add_argument("--think", type=float, default=0.5, help="Seconds a user looks at a result before the next try")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'':<28} {'p50 wait':>9} {'p95 wait':>9} {'extra requests':>15} {'hit rate':>9}")
+    for label, stats in [
+        ("no prefetch", None),
+        ("prefetch, neighbours only", TransitionStats()),
+        ("prefetch, learned", trained_stats(args.train_sessions, args.steps, args.seed + 10_000)),
+    ]:
+        waits, prefetcher = run(stats, args)
+        line = f"{label:<28} {percentile(waits, 0.5):>8.2f}s {percentile(waits, 0.95):>8.2f}s"
+        if prefetcher:
+            prefetch = prefetcher.stats()
+            line += f" {prefetch['generated'] / args.sessions:>10.1f} / {args.budget} {prefetch['hit_rate']:>8.0%}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
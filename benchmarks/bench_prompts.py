@@ -0,0 +1,46 @@
+"""Benchmark: prompt size and build time against furniture count, with and without a token budget
+
+Run from the repository root:
+    python -m benchmarks.bench_prompts --items 0 5 20 50 --budget 512
+"""
+import argparse
+import time
+
+from furnishing.prompts import fit_room_prompt
+
+PREFERENCES = {
+    'room_type': 'living room',
+    'style': 'modern',
+    'color_scheme': 'neutral',
+    'additional_items': ['plants', 'rugs', 'lamps'],
+    'special_instructions': "Keep the window wall clear and leave space for a piano in the corner. " * 3,
+}
+
+
+def build_us(furniture, budget, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        prompt = fit_room_prompt(PREFERENCES, furniture, budget)
+    return (time.perf_counter() - started) / repeat * 1e6, prompt
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, nargs="+", default=[0, 5, 20, 50])
+    parser.add_argument("--budget", type=int, default=512)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'furniture':>10} {'unbounded':>20} {f'budget {args.budget}':>20}")
+    for count in args.items:
+        furniture = [
+            {'description': f"Item {i + 1}: walnut sideboard with brass handles and tapered legs"} for i in range(count)
+        ]
+        full_us, full = build_us(furniture, None, args.repeat)
+        fitted_us, fitted = build_us(furniture, args.budget, args.repeat)
+        print(f"{count:>10} {full.tokens:>6} tok {full_us:>7.1f} us {fitted.tokens:>6} tok {fitted_us:>7.1f} us"
+              f"{'  (trimmed)' if fitted.trimmed else ''}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Benchmark: near-duplicate room lookup at 100k stored hashes
+
+Compares a linear Hamming scan over every stored pHash with the
+multi-index lookup used by RoomIndex, and times hashing one room photo.
+
+Run from the repository root:
+    python -m benchmarks.bench_room_dedup --hashes 100000 --radius 8
+"""
+import argparse
+import io
+import random
+import statistics
+import time
+
+from benchmarks.bench_gallery_rerun import make_room_image
+from furnishing.perceptual_hash import MultiIndexHash, hamming, room_hashes
+
+PHOTO_SIZE = (2400, 1800)
+
+
+def flip_bits(value, count, rng):
+    for position in rng.sample(range(64), count):
+        value ^= 1 << position
+    return value
+
+
+def median_ms(fn, queries):
+    samples = []
+    for query in queries:
+        started = time.perf_counter()
+        fn(query)
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hashes", type=int, default=100000)
+    parser.add_argument("--radius", type=int, default=8)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    stored = [rng.getrandbits(64) for _ in range(args.hashes)]
+    index = MultiIndexHash()
+    for i, value in enumerate(stored):
+        index.add(value, i)
+
+    # Half the queries are near-duplicates of stored rooms, half are new rooms
+    queries = [flip_bits(rng.choice(stored), rng.randint(0, args.radius), rng) for _ in range(args.queries // 2)]
+    queries += [rng.getrandbits(64) for _ in range(args.queries - len(queries))]
+
+    def linear(query):
+        return sorted((hamming(query, value), i) for i, value in enumerate(stored)
+                      if hamming(query, value) <= args.radius)
+
+    for query in queries[:20]:
+        assert [i for _, i in linear(query)] == [i for _, i in index.search(query, args.radius)]
+
+    buffer = io.BytesIO()
+    make_room_image(0).resize(PHOTO_SIZE).save(buffer, format="JPEG", quality=90)
+    photo = buffer.getvalue()
+    started = time.perf_counter()
+    for _ in range(10):
+        room_hashes(photo)
+    hash_ms = (time.perf_counter() - started) * 100
+
+    print(f"stored hashes: {args.hashes}, radius {args.radius}")
+    print(f"linear scan:   {median_ms(linear, queries[:20]):8.2f} ms per lookup")
+    print(f"multi-index:   {median_ms(lambda q: index.search(q, args.radius), queries):8.3f} ms per lookup")
+    print(f"hash a {PHOTO_SIZE[0]}x{PHOTO_SIZE[1]} JPEG: {hash_ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Benchmark: request scheduler against a fault-injecting fake client
+
+Three scenarios, each with and without the scheduler:
+- a flaky API failing a share of requests with 429/503,
+- an outage where every request fails, to show the circuit breaker
+  shedding load instead of hammering the API,
+- a slow API under a per-request deadline, which each attempt gets as its
+  timeout.
+Backoff delays are scaled down so the run takes seconds.
+
+Run from the repository root:
+    python -m benchmarks.bench_scheduler --requests 40 --failure-rate 0.3
+"""
+import argparse
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from google.genai import types
+
+from furnishing.fake_gemini import FakeClient
+from furnishing.scheduler import RequestScheduler, RetryPolicy
+
+MODEL_ID = "gemini-2.5-flash-image-preview"
+KEY = "bench"
+
+
+def make_scheduler(args):
+    return RequestScheduler(
+        requests_per_minute=args.rpm,
+        burst=args.workers,
+        retry_policy=RetryPolicy(max_attempts=4, base_delay=0.05, max_delay=0.5),
+        failure_threshold=5,
+        reset_timeout=1.0,
+        rng=random.Random(0)
+    )
+
+
+def _config(timeout):
+    """Request config carrying the scheduler's per-attempt timeout"""
+    if timeout is None:
+        return None
+    return types.GenerateContentConfig(http_options=types.HttpOptions(timeout=max(1, round(timeout * 1000))))
+
+
+def run_requests(client, count, workers, scheduler=None, deadline=None):
+    """Send `count` requests; return (successes, {error type: count}, seconds)"""
+    def request(i):
+        call = lambda timeout=None: client.models.generate_content(
+            model=MODEL_ID, contents=[f"room {i}"], config=_config(timeout)
+        )
+        if scheduler:
+            return scheduler.run(KEY, call, deadline)
+        return call()
+
+    errors = {}
+    successes = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(request, i) for i in range(count)]
+        for future in futures:
+            try:
+                future.result()
+                successes += 1
+            except Exception as e:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+    return successes, errors, time.perf_counter() - started
+
+
+def report(label, client, outcome, scheduler=None):
+    successes, errors, seconds = outcome
+    failed = ", ".join(f"{count} {name}" for name, count in sorted(errors.items())) or "none"
+    print(f"  {label:<16} ok {successes:>3} | failed: {failed:<42} | API calls {client.calls:>3} | {seconds:5.2f}s")
+    if scheduler:
+        stats = scheduler.stats()
+        print(f"  {'':<16} retries {stats['retries']}, throttled {stats['throttled']}, "
+              f"past deadline {stats['deadline_exceeded']}, circuit rejections {stats['circuit_rejections']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--delay", type=float, default=0.05, help="Fake model latency in seconds")
+    parser.add_argument("--failure-rate", type=float, default=0.3)
+    parser.add_argument("--rpm", type=float, default=6000)
+    args = parser.parse_args()
+
+    print(f"flaky API ({args.failure_rate:.0%} of requests fail with 429/503)")
+    client = FakeClient(delay=args.delay, failure_rate=args.failure_rate)
+    report("direct", client, run_requests(client, args.requests, args.workers))
+    client = FakeClient(delay=args.delay, failure_rate=args.failure_rate)
+    scheduler = make_scheduler(args)
+    report("scheduler", client, run_requests(client, args.requests, args.workers, scheduler), scheduler)
+
+    print("outage (every request fails with 503)")
+    client = FakeClient(delay=args.delay, failure_rate=1.0, fault_codes=(503,))
+    report("direct", client, run_requests(client, args.requests, args.workers))
+    client = FakeClient(delay=args.delay, failure_rate=1.0, fault_codes=(503,))
+    scheduler = make_scheduler(args)
+    report("scheduler", client, run_requests(client, args.requests, args.workers, scheduler), scheduler)
+
+    # Once the outage ends, a trial request after the cool-down closes the breaker
+    client.failure_rate = 0.0
+    time.sleep(scheduler.reset_timeout)
+    scheduler.run(KEY, lambda timeout: client.models.generate_content(model=MODEL_ID, contents=["trial"]))
+    print(f"  after recovery: circuit {scheduler.stats()['breakers'][KEY]}")
+
+    deadline = args.delay * 3
+    print(f"slow API ({args.delay * 10:.2f}s per request, {deadline:.2f}s deadline)")
+    client = FakeClient(delay=args.delay * 10)
+    client.inject_faults(*[429] * args.workers)
+    scheduler = make_scheduler(args)
+    report("scheduler", client, run_requests(client, args.workers * 2, args.workers, scheduler, deadline), scheduler)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Benchmark: time and scores of the before/after structure check
+
+Synthetic rooms (walls, window and door drawn in perspective, with a
+little sensor noise) are compared with furnished versions: furniture
+added, furniture added and returned smaller and slightly shifted, the
+camera moved, and an unrelated image. The first two should keep most of
+the room's edges, the last two should be flagged as drifted.
+
+Run from the repository root:
+    python -m benchmarks.bench_structure --size 2048 --repeat 20
+"""
+import argparse
+import io
+import statistics
+import time
+
+import numpy as np
+from PIL import Image as PILImage
+from PIL import ImageDraw, ImageFilter
+
+from furnishing.structure import analyze_structure
+
+
+def draw_room(size, vanishing_point=(0.5, 0.45), furniture=False, seed=0):
+    """A one-point-perspective room; `furniture` adds a sofa, a plant and a cabinet"""
+    width, height = size
+    image = PILImage.new("RGB", size, (200, 190, 175))
+    draw = ImageDraw.Draw(image)
+    center_x, center_y = width * vanishing_point[0], height * vanishing_point[1]
+    back_width, back_height = width * 0.4, height * 0.4
+    left, top = center_x - back_width / 2, center_y - back_height / 2
+    right, bottom = center_x + back_width / 2, center_y + back_height / 2
+    line = (90, 80, 70)
+    draw.polygon([(0, height), (left, bottom), (right, bottom), (width, height)], fill=(150, 120, 90))
+    draw.polygon([(0, 0), (left, top), (right, top), (width, 0)], fill=(230, 230, 225))
+    draw.rectangle([left, top, right, bottom], fill=(210, 200, 185), outline=line, width=4)
+    for corner, back_corner in [((0, 0), (left, top)), ((width, 0), (right, top)),
+                                ((0, height), (left, bottom)), ((width, height), (right, bottom))]:
+        draw.line([corner, back_corner], fill=line, width=5)
+    # Window and door on the back wall
+    draw.rectangle([left + back_width * 0.1, top + back_height * 0.15, left + back_width * 0.45, top + back_height * 0.6],
+                   fill=(170, 200, 230), outline=(60, 60, 60), width=6)
+    draw.rectangle([left + back_width * 0.65, top + back_height * 0.3, left + back_width * 0.85, bottom],
+                   fill=(120, 90, 60), outline=(50, 40, 30), width=6)
+    if furniture:
+        draw.rectangle([width * 0.25, height * 0.62, width * 0.7, height * 0.85], fill=(60, 70, 120))
+        draw.ellipse([width * 0.1, height * 0.7, width * 0.25, height * 0.95], fill=(40, 120, 50))
+        draw.rectangle([width * 0.75, height * 0.5, width * 0.85, height * 0.9], fill=(180, 150, 90))
+    pixels = np.asarray(image.filter(ImageFilter.GaussianBlur(1.5)), dtype=np.int16)
+    pixels = pixels + np.random.default_rng(seed).integers(-6, 7, pixels.shape)
+    return PILImage.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+
+def encode(image, format):
+    buffer = io.BytesIO()
+    image.save(buffer, format=format, **({'quality': 90} if format == "JPEG" else {}))
+    return buffer.getvalue()
+
+
+def median_ms(fn, repeat):
+    fn()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=2048, help="Long edge of the test images in pixels")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    size = (args.size, args.size * 3 // 4)
+    half = (size[0] // 2, size[1] // 2)
+    room = encode(draw_room(size), "JPEG")
+    furnished = draw_room(size, furniture=True, seed=1)
+    cases = [
+        ("furnished", encode(furnished, "JPEG")),
+        ("furnished, half size, shifted", encode(
+            draw_room(size, furniture=True, seed=2).crop((16, 8, size[0], size[1])).resize(half), "PNG"
+        )),
+        ("camera moved", encode(draw_room(size, (0.3, 0.55), furniture=True, seed=3), "JPEG")),
+        ("unrelated image", encode(
+            PILImage.effect_noise(half, 40).convert("RGB").filter(ImageFilter.GaussianBlur(3)), "PNG"
+        )),
+    ]
+
+    print(f"{'furnished image':<32} {'edges kept':>10} {'SSIM':>6} {'changed':>8} {'drifted':>8} {'time':>9}")
+    for label, data in cases:
+        report = analyze_structure(room, data)
+        elapsed = median_ms(lambda: analyze_structure(room, data), args.repeat)
+        print(f"{label:<32} {report.edge_preservation:>10.0%} {report.ssim:>6.2f} {report.changed_fraction:>8.0%}"
+              f" {str(report.drifted):>8} {elapsed:>6.1f} ms")
+
+    # Lossless model output at full size: decoding the PNG is most of the time
+    png = encode(furnished, "PNG")
+    decode = median_ms(lambda: PILImage.open(io.BytesIO(png)).load(), args.repeat)
+    total = median_ms(lambda: analyze_structure(room, png), args.repeat)
+    print(f"\n{args.size} px JPEG room + {args.size} px PNG result ({len(png) / 1024 / 1024:.1f} MB): "
+          f"{total:.1f} ms, of which {decode:.1f} ms decoding the PNG")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Benchmark: sequential vs concurrent style variations against a fake client
+
+Run from the repository root:
+    python -m benchmarks.bench_variations --delay 0.5
+"""
+import argparse
+import time
+
+from furnishing.fake_gemini import FakeClient
+from furnishing.variations import STYLE_VARIATIONS, run_variations
+
+MODEL_ID = "gemini-2.5-flash-image-preview"
+
+
+def make_generate_fn(client):
+    def generate(variation):
+        prompt = f"Furnish this room in {variation['style']} style with {variation['color']} colors"
+        response = client.models.generate_content(model=MODEL_ID, contents=[prompt])
+        for part in response.parts:
+            if image := part.as_image():
+                return image.image_bytes
+        return None
+    return generate
+
+
+def bench_sequential(client):
+    generate = make_generate_fn(client)
+    start = time.perf_counter()
+    for variation in STYLE_VARIATIONS:
+        generate(variation)
+    return time.perf_counter() - start
+
+
+def bench_concurrent(client, max_concurrency):
+    generate = make_generate_fn(client)
+    start = time.perf_counter()
+    for _ in run_variations(generate, STYLE_VARIATIONS, max_concurrency):
+        pass
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--delay", type=float, default=0.5, help="Fake model latency in seconds")
+    parser.add_argument("--max-concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    client = FakeClient(delay=args.delay)
+    sequential = bench_sequential(client)
+    concurrent = bench_concurrent(client, args.max_concurrency)
+
+    print(f"variations:      {len(STYLE_VARIATIONS)}")
+    print(f"fake delay:      {args.delay:.2f}s")
+    print(f"sequential:      {sequential:.2f}s")
+    print(f"concurrent (x{args.max_concurrency}): {concurrent:.2f}s")
+    print(f"speedup:         {sequential / concurrent:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
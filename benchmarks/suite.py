@@ -0,0 +1,350 @@
+"""Benchmark suite: end-to-end numbers against the fake backend, tracked over time
+
+Measures, without an API key or network access:
+- single-style latency through FurnishingEngine (cold and warm, and the
+  overhead on top of the fake model's delay)
+- 4-variation wall time and throughput
+- app rerun time against gallery size, driving the real Streamlit script
+  with AppTest on the fake backend
+- peak memory of one app session and of one generation round, each
+  measured in a fresh subprocess
+
+Every run is appended to a JSON lines history file and compared with the
+median of recent runs made with the same options; metrics that got worse
+by more than --tolerance are reported as regressions (exit status 1 with
+--check).
+
+Run from the repository root:
+    python -m benchmarks.suite
+    python -m benchmarks.suite --quick --check
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_gallery_rerun import make_room_image
+from furnishing.variations import STYLE_VARIATIONS
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "room_furnishing_app.py")
+DEFAULT_HISTORY = os.path.join(os.path.expanduser("~"), ".cache", "room_furnishing", "benchmark_history.jsonl")
+PHOTO_SIZE = (2400, 1800)
+
+# Differences below these are noise, whatever the relative change
+NOISE_FLOORS = {'seconds': 0.002, 'mb': 2.0}
+
+
+def room_photo():
+    buffer = io.BytesIO()
+    make_room_image(0).resize(PHOTO_SIZE).save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def bench_single_style(delay, repeat, room_bytes):
+    """Median streamed latency of single-style generations with distinct prompts"""
+    from furnishing.engine import FurnishingEngine
+    from furnishing.fake_gemini import FakeClient
+
+    engine = FurnishingEngine(FakeClient(delay=delay))
+    totals, ttfbs = [], []
+    cold = None
+    for i in range(repeat + 1):
+        started = time.perf_counter()
+        result = engine.generate(room_bytes, {'style': 'modern', 'special_instructions': f"run {i}"})
+        elapsed = time.perf_counter() - started
+        if cold is None:
+            # The first run also preprocesses the room photo
+            cold = elapsed
+            continue
+        totals.append(elapsed)
+        ttfbs.append(result.timing.ttfb)
+    total = statistics.median(totals)
+    return {
+        'single_style_cold_seconds': cold,
+        'single_style_seconds': total,
+        'single_style_ttfb_seconds': statistics.median(ttfbs),
+        'single_style_overhead_seconds': total - delay,
+    }
+
+
+def bench_variations(delay, repeat, room_bytes):
+    """Wall time of the 4 style variations run concurrently"""
+    from furnishing.engine import FurnishingEngine
+    from furnishing.fake_gemini import FakeClient
+
+    engine = FurnishingEngine(FakeClient(delay=delay))
+    engine.prepare_images(room_bytes)
+    samples = []
+    for i in range(repeat):
+        started = time.perf_counter()
+        outcomes = list(engine.generate_variations(room_bytes, {'special_instructions': f"run {i}"}, STYLE_VARIATIONS))
+        samples.append(time.perf_counter() - started)
+        failed = [outcome for outcome in outcomes if outcome.error]
+        if failed:
+            raise RuntimeError(f"variation failed: {failed[0].error}")
+    seconds = statistics.median(samples)
+    return {
+        'variations_seconds': seconds,
+        'variations_per_second': len(STYLE_VARIATIONS) / seconds,
+    }
+
+
+def populate_gallery(data_dir, session_id, size):
+    """Write `size` gallery entries for a session the way the app saves them"""
+    from furnishing.gallery_store import GalleryStore, make_thumbnail
+
+    store = GalleryStore(os.path.join(data_dir, "gallery"))
+    buffer = io.BytesIO()
+    make_room_image(0).save(buffer, format="JPEG", quality=90)
+    original = store.put_bytes(buffer.getvalue())
+    entries = []
+    for i in range(size):
+        buffer = io.BytesIO()
+        make_room_image(i + 1).save(buffer, format="PNG")
+        furnished_bytes = buffer.getvalue()
+        entry = {
+            'id': f"bench{i}",
+            'original': original,
+            'furnished': store.put_bytes(furnished_bytes),
+            'preferences': {'room_type': 'living room', 'style': 'modern', 'color_scheme': 'neutral',
+                            'furniture_style': 'contemporary', 'lighting': 'natural', 'additional_items': []},
+            'uploaded_furniture': None,
+            'filename': f"room_{i}.png",
+            'timestamp': "20250101_000000"
+        }
+        store.add_entry(session_id, entry)
+        entry['thumbnail'] = make_thumbnail(furnished_bytes)
+        entries.append(entry)
+    return entries
+
+
+def app_session(data_dir, gallery_size):
+    """AppTest session of the real app script on the fake backend, with a gallery already saved"""
+    from streamlit.testing.v1 import AppTest
+
+    session_id = f"bench-{gallery_size}"
+    entries = populate_gallery(data_dir, session_id, gallery_size)
+    app = AppTest.from_file(APP_PATH, default_timeout=120)
+    app.session_state['session_id'] = session_id
+    app.session_state['furnished_rooms'] = entries
+    return app
+
+
+def bench_gallery_rerun(data_dir, sizes, repeat):
+    """Median app rerun time for each gallery size"""
+    results = {}
+    for size in sizes:
+        app = app_session(data_dir, size)
+        app.run()
+        if app.exception:
+            raise RuntimeError(f"app raised: {app.exception[0].value}")
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            app.run()
+            samples.append(time.perf_counter() - started)
+        results[f"gallery_rerun_{size}_seconds"] = statistics.median(samples)
+    return results
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def current_rss_mb():
+    """Resident set size right now (Linux), falling back to the high-water mark elsewhere"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except OSError:
+        return peak_rss_mb()
+
+
+def memory_probe(kind, data_dir):
+    """Run in a subprocess: peak RSS growth while one session or one generation round runs
+
+    A warm-up pass runs first so imports and one-off caches are not counted;
+    the result is the high-water mark minus the resident size just before.
+    """
+    if kind == "session":
+        from streamlit.testing.v1 import AppTest
+        with open(os.path.join(data_dir, "session.json"), "r", encoding="utf-8") as f:
+            session = json.load(f)
+        warm_up = AppTest.from_file(APP_PATH, default_timeout=120)
+        warm_up.run()
+        app = AppTest.from_file(APP_PATH, default_timeout=120)
+        app.session_state['session_id'] = session['session_id']
+        app.session_state['furnished_rooms'] = [
+            dict(entry, thumbnail=bytes.fromhex(entry['thumbnail'])) for entry in session['entries']
+        ]
+        baseline = current_rss_mb()
+        app.run()
+        app.run()
+    else:
+        from furnishing.engine import FurnishingEngine
+        from furnishing.fake_gemini import FakeClient
+        with open(os.path.join(data_dir, "room.jpg"), "rb") as f:
+            room_bytes = f.read()
+        buffer = io.BytesIO()
+        make_room_image(1).resize((64, 48)).save(buffer, format="JPEG")
+        FurnishingEngine(FakeClient(delay=0, image_size=(64, 48))).generate(buffer.getvalue(), {})
+        engine = FurnishingEngine(FakeClient(delay=0))
+        baseline = current_rss_mb()
+        engine.generate(room_bytes, {'style': 'modern'})
+        list(engine.generate_variations(room_bytes, {}, STYLE_VARIATIONS))
+    print(json.dumps({'peak_mb': peak_rss_mb() - baseline}))
+
+
+def bench_memory(data_dir, gallery_size, room_bytes):
+    """Peak memory of one app session with a gallery, and of one generation round"""
+    session_id = "bench-memory"
+    entries = populate_gallery(data_dir, session_id, gallery_size)
+    with open(os.path.join(data_dir, "session.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            'session_id': session_id,
+            'entries': [dict(entry, thumbnail=entry['thumbnail'].hex()) for entry in entries]
+        }, f)
+    with open(os.path.join(data_dir, "room.jpg"), "wb") as f:
+        f.write(room_bytes)
+
+    results = {}
+    for kind in ("session", "generation"):
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.suite", "--probe", kind, "--probe-data-dir", data_dir],
+            capture_output=True, text=True, check=True, cwd=os.path.dirname(APP_PATH)
+        ).stdout
+        results[f"{kind}_peak_mb"] = json.loads(output.strip().splitlines()[-1])['peak_mb']
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(APP_PATH)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_history(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def lower_is_better(name):
+    return not name.endswith("_per_second")
+
+
+def noise_floor(name):
+    for unit, floor in NOISE_FLOORS.items():
+        if name.endswith(f"_{unit}"):
+            return floor
+    return 0.0
+
+
+def find_regressions(results, history, options, tolerance, baseline_runs):
+    """[(name, value, baseline)] for metrics worse than the recent median by more than `tolerance`"""
+    previous = [run['results'] for run in history if run.get('options') == options][-baseline_runs:]
+    regressions = []
+    for name, value in results.items():
+        earlier = [run[name] for run in previous if name in run]
+        if not earlier:
+            continue
+        baseline = statistics.median(earlier)
+        change = value - baseline if lower_is_better(name) else baseline - value
+        if change > max(abs(baseline) * tolerance, noise_floor(name)):
+            regressions.append((name, value, baseline))
+    return regressions
+
+
+def format_value(name, value):
+    if name.endswith("_seconds"):
+        return f"{value * 1000:.1f} ms"
+    if name.endswith("_mb"):
+        return f"{value:.1f} MB"
+    return f"{value:.2f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--delay", type=float, default=0.2, help="Fake model latency in seconds")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--gallery-sizes", type=int, nargs="+", default=[0, 10, 25, 50])
+    parser.add_argument("--quick", action="store_true", help="Fewer repeats and gallery sizes")
+    parser.add_argument("--history", default=DEFAULT_HISTORY, help="JSON lines file of earlier runs")
+    parser.add_argument("--no-record", action="store_true", help="Compare with history without appending this run")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed slowdown against recent runs")
+    parser.add_argument("--baseline-runs", type=int, default=5)
+    parser.add_argument("--check", action="store_true", help="Exit with status 1 on regressions")
+    parser.add_argument("--probe", choices=["session", "generation"], help=argparse.SUPPRESS)
+    parser.add_argument("--probe-data-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.probe:
+        memory_probe(args.probe, args.probe_data_dir)
+        return 0
+
+    if args.quick:
+        args.repeat = 2
+        args.gallery_sizes = [0, 25]
+    options = {'delay': args.delay, 'repeat': args.repeat, 'gallery_sizes': args.gallery_sizes}
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        # The app script reads these when AppTest runs it
+        os.environ['ROOM_FURNISHING_DATA_DIR'] = data_dir
+        os.environ['ROOM_FURNISHING_BACKEND'] = "fake"
+        os.environ['ROOM_FURNISHING_FAKE_DELAY'] = str(args.delay)
+
+        room_bytes = room_photo()
+        results = {}
+        stages = [
+            ("single style", lambda: bench_single_style(args.delay, args.repeat, room_bytes)),
+            ("4 variations", lambda: bench_variations(args.delay, args.repeat, room_bytes)),
+            ("gallery rerun", lambda: bench_gallery_rerun(data_dir, args.gallery_sizes, args.repeat)),
+            ("peak memory", lambda: bench_memory(data_dir, max(args.gallery_sizes), room_bytes)),
+        ]
+        for label, run in stages:
+            started = time.perf_counter()
+            results.update(run())
+            print(f"{label}: done in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    history = load_history(args.history)
+    regressions = find_regressions(results, history, options, args.tolerance, args.baseline_runs)
+    regressed = {name: baseline for name, _, baseline in regressions}
+
+    print(f"{'metric':<34} {'value':>12} {'baseline':>12}")
+    for name, value in results.items():
+        flag = f" {format_value(name, regressed[name]):>12}  REGRESSION" if name in regressed else ""
+        print(f"{name:<34} {format_value(name, value):>12}{flag}")
+    compared = sum(1 for run in history if run.get('options') == options)
+    print(f"compared with {min(compared, args.baseline_runs)} earlier run(s) from {args.history}")
+
+    if not args.no_record:
+        os.makedirs(os.path.dirname(os.path.abspath(args.history)), exist_ok=True)
+        with open(args.history, "a", encoding="utf-8") as f:
+            f.write(json.dumps({
+                'time': time.time(),
+                'commit': git_commit(),
+                'python': platform.python_version(),
+                'options': options,
+                'results': results,
+            }) + "\n")
+
+    if regressions and args.check:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1 @@
+"""Building blocks for the AI Room Furnishing Assistant"""
@@ -0,0 +1,136 @@
+"""Process-wide admission control for model requests
+
+Every request that is about to reach the model (cache hits never do)
+first takes a slot from one AdmissionController, shared by all sessions:
+
+- at most `max_in_flight` requests are in flight across the process, and
+  at most `per_session` of them for any one session;
+- requests that have to wait are admitted in weighted fair queuing order.
+  Each session is a flow: a request is tagged with its session's previous
+  tag, or the current virtual time if that is later, plus 1 / weight, and
+  the lowest tag goes first. A session queueing a 4-variation batch gets
+  four consecutive tags, so a single request from another session that
+  arrives afterwards is tagged right after the batch's first request and
+  goes ahead of the rest instead of waiting for all of them.
+
+Rate limits and retries (RequestScheduler) apply after admission.
+"""
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+from furnishing.scheduler import DeadlineExceeded
+
+DEFAULT_MAX_IN_FLIGHT = 8
+DEFAULT_PER_SESSION = 4
+
+
+class _Ticket:
+    __slots__ = ("session", "tag", "sequence", "enqueued")
+
+    def __init__(self, session, tag, sequence, enqueued):
+        self.session = session
+        self.tag = tag
+        self.sequence = sequence
+        self.enqueued = enqueued
+
+    def order(self):
+        return self.tag, self.sequence
+
+
+class AdmissionController:
+    """Global and per-session concurrency limits with fair ordering of waiting requests
+
+    `clock` can be replaced to test timing behaviour.
+    """
+
+    COUNTERS = ("admitted", "queued", "queue_wait_seconds", "deadline_exceeded")
+
+    def __init__(self, max_in_flight=DEFAULT_MAX_IN_FLIGHT, per_session=DEFAULT_PER_SESSION, clock=time.monotonic):
+        self.max_in_flight = max_in_flight
+        self.per_session = per_session
+        self._clock = clock
+        self._condition = threading.Condition()
+        self._sequence = itertools.count()
+        self._virtual_time = 0.0
+        self._last_tags = {}
+        self._waiting = []
+        self._in_flight = {}
+        self._counters = dict.fromkeys(self.COUNTERS, 0)
+
+    @contextmanager
+    def admit(self, session, weight=1.0, deadline=None):
+        """Hold a request slot for `session` for the duration of the block
+
+        Yields the seconds spent waiting for the slot. Raises
+        DeadlineExceeded if no slot frees up within `deadline` seconds.
+        """
+        with self._condition:
+            started = self._clock()
+            start_tag = max(self._virtual_time, self._last_tags.get(session, 0.0))
+            ticket = _Ticket(session, start_tag + 1.0 / weight, next(self._sequence), started)
+            self._last_tags[session] = ticket.tag
+            self._waiting.append(ticket)
+            if self._next_admission() is not ticket:
+                self._counters['queued'] += 1
+            deadline_at = None if deadline is None else started + deadline
+            while self._next_admission() is not ticket:
+                remaining = None if deadline_at is None else deadline_at - self._clock()
+                if remaining is not None and remaining <= 0:
+                    self._waiting.remove(ticket)
+                    self._counters['deadline_exceeded'] += 1
+                    self._condition.notify_all()
+                    raise DeadlineExceeded("No request slot became free before the request deadline")
+                self._condition.wait(remaining)
+
+            self._waiting.remove(ticket)
+            self._in_flight[session] = self._in_flight.get(session, 0) + 1
+            self._virtual_time = max(self._virtual_time, start_tag)
+            waited = self._clock() - started
+            self._counters['admitted'] += 1
+            self._counters['queue_wait_seconds'] += waited
+            # Another waiter may be admissible too (e.g. from a different session)
+            self._condition.notify_all()
+        try:
+            yield waited
+        finally:
+            with self._condition:
+                self._in_flight[session] -= 1
+                if not self._in_flight[session]:
+                    del self._in_flight[session]
+                self._forget_idle()
+                self._condition.notify_all()
+
+    def _next_admission(self):
+        """The waiting ticket to admit now, or None while every slot it could use is taken"""
+        if sum(self._in_flight.values()) >= self.max_in_flight:
+            return None
+        for ticket in sorted(self._waiting, key=_Ticket.order):
+            if self._in_flight.get(ticket.session, 0) < self.per_session:
+                return ticket
+        return None
+
+    def _forget_idle(self):
+        # A session with nothing queued or running and a tag the virtual time
+        # has passed would start from the virtual time anyway
+        busy = {ticket.session for ticket in self._waiting} | set(self._in_flight)
+        for session in [session for session, tag in self._last_tags.items() if session not in busy and tag <= self._virtual_time]:
+            del self._last_tags[session]
+
+    def position(self, session):
+        """(place in line of this session's next waiting request, requests waiting), or None if it has none waiting"""
+        with self._condition:
+            waiting = sorted(self._waiting, key=_Ticket.order)
+            for place, ticket in enumerate(waiting, start=1):
+                if ticket.session == session:
+                    return place, len(waiting)
+        return None
+
+    def stats(self):
+        """Counters plus requests currently in flight and waiting"""
+        with self._condition:
+            stats = dict(self._counters)
+            stats['in_flight'] = sum(self._in_flight.values())
+            stats['waiting'] = len(self._waiting)
+        return stats
@@ -0,0 +1,72 @@
+"""Pluggable model backends
+
+Everything that talks to the model (FurnishingEngine, the variation
+workers, the client pool) only relies on this much of genai.Client:
+
+- `client.models.generate_content(model, contents, config=None)` returning
+  a response whose `parts` have `.text` and `.as_image()` (an object with
+  `image_bytes`, or None)
+- optionally `client.models.generate_content_stream(...)`, yielding such
+  responses chunk by chunk
+- failures raising exceptions with an HTTP `code` when there is one, so the
+  scheduler can tell retryable errors apart
+- optionally `client.close()`
+
+A backend is a name mapped to a factory building such a client. "gemini"
+is the real API; "fake" is the offline FakeClient, which returns
+deterministic images after a configurable delay and failure rate.
+"""
+from collections import namedtuple
+
+DEFAULT_BACKEND = "gemini"
+
+# Options for the fake backend
+FakeOptions = namedtuple('FakeOptions', ['delay', 'failure_rate', 'seed'])
+DEFAULT_FAKE_OPTIONS = FakeOptions(delay=1.0, failure_rate=0.0, seed=0)
+
+
+def _gemini_factory(fake_options):
+    from furnishing.client_pool import create_client
+    return create_client
+
+
+def _fake_factory(fake_options):
+    from furnishing.fake_gemini import FakeClient
+
+    def create_fake_client(api_key, timings):
+        return FakeClient(delay=fake_options.delay, failure_rate=fake_options.failure_rate, seed=fake_options.seed)
+    return create_fake_client
+
+
+# name -> (needs an API key, factory builder)
+BACKENDS = {
+    "gemini": (True, _gemini_factory),
+    "fake": (False, _fake_factory),
+}
+
+
+def requires_api_key(backend):
+    """Whether clients of this backend need a real API key"""
+    return _backend(backend)[0]
+
+
+def client_factory(backend, fake_options=DEFAULT_FAKE_OPTIONS):
+    """ClientPool-compatible factory: (api_key, ConnectionTimings) -> client"""
+    return _backend(backend)[1](fake_options)
+
+
+def create_client(backend, api_key=None, fake_options=DEFAULT_FAKE_OPTIONS):
+    """Build one client of the given backend outside a ClientPool"""
+    timings = None
+    if requires_api_key(backend):
+        # Only real clients report connection timings; importing the pool loads the SDK
+        from furnishing.client_pool import ConnectionTimings
+        timings = ConnectionTimings()
+    return client_factory(backend, fake_options)(api_key, timings)
+
+
+def _backend(backend):
+    try:
+        return BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown model backend {backend!r}; choose one of {', '.join(BACKENDS)}") from None
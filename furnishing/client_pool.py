@@ -0,0 +1,252 @@
+"""Process-wide pool of Gemini clients, one per API key
+
+Building a genai.Client also builds its HTTP connection pool, so recreating it
+on every Streamlit rerun throws away warm keep-alive connections. The pool
+keeps one client per API key hash, shares it between sessions using the same
+key and closes it once no session holds it any more and none of its requests
+are still running (a background job or prefetch can outlive the session that
+started it, or its switch to another key).
+"""
+import contextlib
+import hashlib
+import threading
+import time
+import weakref
+
+import httpx
+from google import genai
+from google.genai import types
+
+# Keep idle connections around long enough to span a user's think time
+KEEPALIVE_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=300)
+
+
+def api_key_digest(api_key):
+    """Hash an API key so the raw key is never used as a cache key"""
+    return hashlib.sha256(api_key.strip().encode("utf-8")).hexdigest()
+
+
+class ConnectionTimings:
+    """Connection setup cost vs request cost for one client"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.client_setup_seconds = 0.0
+        self.connections = 0
+        self.connect_seconds = 0.0
+        self.requests = 0
+        self.request_seconds = 0.0
+
+    def record_connect(self, seconds):
+        with self._lock:
+            self.connections += 1
+            self.connect_seconds += seconds
+
+    def record_request(self, seconds):
+        with self._lock:
+            self.requests += 1
+            self.request_seconds += seconds
+
+    def snapshot(self):
+        """Return the current counters as a dict"""
+        with self._lock:
+            return {
+                'client_setup_seconds': self.client_setup_seconds,
+                'connections': self.connections,
+                'connect_seconds': self.connect_seconds,
+                'requests': self.requests,
+                'request_seconds': self.request_seconds,
+                'reused_connections': max(0, self.requests - self.connections),
+            }
+
+
+class TimingTransport(httpx.HTTPTransport):
+    """HTTP transport that reports TCP+TLS setup time and time to response headers"""
+
+    # httpcore trace events that make up a new connection
+    _CONNECT_STEPS = ("connection.connect_tcp", "connection.start_tls")
+
+    def __init__(self, timings, **kwargs):
+        super().__init__(**kwargs)
+        self.timings = timings
+
+    def handle_request(self, request):
+        started = {}
+        connect_seconds = [0.0]
+
+        def trace(event, info):
+            step, _, phase = event.rpartition(".")
+            if step not in self._CONNECT_STEPS:
+                return
+            if phase == "started":
+                started[step] = time.perf_counter()
+            elif phase == "complete" and step in started:
+                connect_seconds[0] += time.perf_counter() - started.pop(step)
+
+        request.extensions["trace"] = trace
+        request_started = time.perf_counter()
+        response = super().handle_request(request)
+        self.timings.record_request(time.perf_counter() - request_started)
+        if connect_seconds[0]:
+            self.timings.record_connect(connect_seconds[0])
+        return response
+
+
+def create_client(api_key, timings):
+    """Build a genai.Client whose HTTP transport keeps connections alive and reports timings"""
+    started = time.perf_counter()
+    transport = TimingTransport(timings, limits=KEEPALIVE_LIMITS)
+    client = genai.Client(
+        api_key=api_key,
+        http_options=types.HttpOptions(client_args={'transport': transport})
+    )
+    timings.client_setup_seconds = time.perf_counter() - started
+    return client
+
+
+def close_client(client):
+    """Close a client's HTTP connections, ignoring clients that cannot be closed"""
+    close = getattr(client, "close", None)
+    if close:
+        try:
+            close()
+        except Exception:
+            pass
+
+
+class _PooledModels:
+    """`client.models` of a pooled client, counting requests while they run"""
+
+    def __init__(self, pool, entry):
+        self._pool = pool
+        self._entry = entry
+
+    def generate_content(self, *args, **kwargs):
+        with self._pool._in_flight(self._entry):
+            return self._entry.client.models.generate_content(*args, **kwargs)
+
+    def __getattr__(self, name):
+        attribute = getattr(self._entry.client.models, name)
+        if name == "generate_content_stream":
+            return self._stream(attribute)
+        return attribute
+
+    def _stream(self, generate_content_stream):
+        def stream(*args, **kwargs):
+            # The request runs until the stream is used up or closed
+            with self._pool._in_flight(self._entry):
+                yield from generate_content_stream(*args, **kwargs)
+        return stream
+
+
+class PooledClient:
+    """Handle on a pooled client; its requests keep the client open while they run"""
+
+    def __init__(self, pool, entry):
+        self.models = _PooledModels(pool, entry)
+        self._entry = entry
+
+    def __getattr__(self, name):
+        return getattr(self._entry.client, name)
+
+
+class _Lease:
+    """Kept in a holder's own state; releases the holder when garbage collected"""
+
+
+class _Entry:
+    def __init__(self, digest, client, timings):
+        self.digest = digest
+        self.client = client
+        self.timings = timings
+        self.holders = set()
+        self.in_flight = 0
+
+
+class ClientPool:
+    """One shared client per API key hash, reference-counted by holder (session) id
+
+    Holders call release() when they go away (the app ties it to session
+    teardown). A client is closed once it has no holders and no request in
+    flight.
+    """
+
+    def __init__(self, client_factory=create_client):
+        self._client_factory = client_factory
+        self._lock = threading.Lock()
+        self._entries = {}   # key digest -> _Entry
+        self._handles = {}   # key digest -> PooledClient
+        self._held = {}      # holder id -> key digest
+
+    def acquire(self, api_key, holder):
+        """Return the client for `api_key`, switching `holder` away from any previous key"""
+        digest = api_key_digest(api_key)
+        stale_client = None
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                timings = ConnectionTimings()
+                entry = _Entry(digest, self._client_factory(api_key, timings), timings)
+                self._entries[digest] = entry
+                self._handles[digest] = PooledClient(self, entry)
+            if self._held.get(holder) != digest:
+                stale_client = self._release_locked(holder)
+                self._held[holder] = digest
+                entry.holders.add(holder)
+            handle = self._handles[digest]
+
+        if stale_client is not None:
+            close_client(stale_client)
+        return handle
+
+    def release(self, holder):
+        """Drop `holder`'s reference, closing the client if nobody else uses it"""
+        with self._lock:
+            stale_client = self._release_locked(holder)
+        if stale_client is not None:
+            close_client(stale_client)
+
+    def _release_locked(self, holder):
+        digest = self._held.pop(holder, None)
+        if digest is None:
+            return None
+        entry = self._entries[digest]
+        entry.holders.discard(holder)
+        return self._close_if_unused_locked(entry)
+
+    def _close_if_unused_locked(self, entry):
+        """Forget `entry` and return its client for closing if nothing uses it, else None"""
+        if entry.holders or entry.in_flight or self._entries.get(entry.digest) is not entry:
+            return None
+        del self._entries[entry.digest]
+        del self._handles[entry.digest]
+        return entry.client
+
+    @contextlib.contextmanager
+    def _in_flight(self, entry):
+        with self._lock:
+            entry.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                entry.in_flight -= 1
+                stale_client = self._close_if_unused_locked(entry)
+            if stale_client is not None:
+                close_client(stale_client)
+
+    def lease(self, holder):
+        """Object that calls release(`holder`) once it is garbage collected
+
+        Keep it in state that lives exactly as long as the holder, such as a
+        Streamlit session's session_state.
+        """
+        lease = _Lease()
+        weakref.finalize(lease, self.release, holder)
+        return lease
+
+    def timings(self, api_key):
+        """Connection timing snapshot for the client of `api_key`, if one exists"""
+        with self._lock:
+            entry = self._entries.get(api_key_digest(api_key))
+        return entry.timings.snapshot() if entry else None
@@ -0,0 +1,318 @@
+"""UI-free furnishing engine
+
+FurnishingEngine owns the model client, upload preprocessing, the response
+cache and the one code path that turns a room, furniture and preferences
+into a generate_content call. The Streamlit app and the batch CLI both go
+through it. This module must not import Streamlit.
+"""
+import contextlib
+from collections import namedtuple
+
+from furnishing.generation import (
+    image_parts, response_image_bytes, response_text, stream_model, supports_streaming, timed_call_model
+)
+from furnishing.image_preprocessing import DEFAULT_SETTINGS, PreprocessCache, draft_settings
+from furnishing.metrics import NULL_METRICS
+from furnishing.prompts import (
+    DEFAULT_PROMPT_TOKEN_BUDGET, create_edit_prompt, create_preview_prompt, estimate_image_tokens,
+    fit_room_prompt
+)
+from furnishing.response_cache import content_digest, make_cache_key
+from furnishing.structure import analyze_structure
+from furnishing.variations import DEFAULT_MAX_CONCURRENCY, run_variations, variation_preferences
+
+DEFAULT_MODEL = "gemini-2.5-flash-image-preview"
+
+# One finished generation. `response` keeps the raw (or cached) response for
+# callers that render its parts; `payload` holds the image bytes before and
+# after preprocessing; `timing` is a RequestTiming, or None for cache hits.
+# `structure` is a StructureReport for room generations checked against
+# the empty room, otherwise None.
+GenerationResult = namedtuple(
+    'GenerationResult',
+    ['image_bytes', 'text', 'preferences', 'cached', 'payload', 'response', 'timing', 'structure'],
+    defaults=(None,)
+)
+
+# Approximate size of a room request before it is sent; `trimmed` tells
+# whether the prompt had to be cut to fit the token budget
+RequestEstimate = namedtuple(
+    'RequestEstimate', ['prompt_tokens', 'image_tokens', 'upload_bytes', 'token_budget', 'trimmed']
+)
+
+
+def furniture_cache_items(furniture):
+    """(image digest, description) pairs used in response cache keys"""
+    return [(item['digest'], item['description']) for item in furniture or []]
+
+
+class FurnishingEngine:
+    """Generates furnished rooms from raw upload bytes
+
+    `furniture` arguments are lists of dicts with 'data' (encoded image bytes),
+    'digest' and 'description' keys, and optionally a 'prepared' dict in
+    which model-ready images are memoized per preprocessing settings.
+
+    Requests that actually reach the model (cache hits do not) go through
+    `scheduler`, a RequestScheduler, under `request_key` when one is given:
+    it applies the key's rate limit, retries transient errors and enforces
+    `deadline` seconds per request. Before that, they wait for a slot from
+    `admission`, an AdmissionController shared by all sessions, as
+    `session_key` with `admission_weight` (lower for background work such as
+    prefetching); the wait counts against the deadline and is recorded as
+    queue_wait_seconds.
+
+    `metrics`, a Metrics object, receives stage timings (preprocess_seconds,
+    prompt_seconds, request_seconds, model_seconds, ttfb_seconds,
+    decode_seconds, structure_seconds), payload sizes, estimated prompt
+    tokens, edge preservation ratios and cache hit/miss counts.
+
+    `draft` generations preprocess images with draft_settings() and use the
+    compact draft prompt: a quick, cheap look at a set of preferences that
+    can later be rendered again in full with the same preferences.
+
+    With a `structure_threshold` (minimum edge preservation, see
+    furnishing.structure), room generations are compared with the empty
+    room and their results carry a StructureReport; with `retry_drifted`,
+    a result whose structure drifted is generated once more with a
+    reminder to keep the architecture, and the better of the two is kept.
+
+    Room prompts are fitted to `prompt_token_budget` estimated tokens (None
+    for no limit) by summarizing furniture lines and, if needed, shortening
+    the special instructions; see fit_room_prompt().
+
+    With `stream` set, requests use generate_content_stream when the client
+    supports it and `on_update` callbacks see the response while it is
+    still arriving; otherwise the blocking call is used and `on_update` is
+    called once with the complete response.
+    """
+
+    def __init__(self, client, model_id=DEFAULT_MODEL, preprocess_settings=DEFAULT_SETTINGS,
+                 response_cache=None, preprocess_cache=None, scheduler=None, request_key=None,
+                 deadline=None, stream=True, metrics=None, prompt_token_budget=DEFAULT_PROMPT_TOKEN_BUDGET,
+                 admission=None, session_key=None, admission_weight=1.0, structure_threshold=None,
+                 retry_drifted=False):
+        self.client = client
+        self.model_id = model_id
+        self.preprocess_settings = preprocess_settings
+        self.response_cache = response_cache
+        self.preprocess_cache = preprocess_cache or PreprocessCache()
+        self.scheduler = scheduler
+        self.request_key = request_key
+        self.deadline = deadline
+        self.stream = stream
+        self.metrics = metrics or NULL_METRICS
+        self.prompt_token_budget = prompt_token_budget
+        self.admission = admission
+        self.session_key = session_key
+        self.admission_weight = admission_weight
+        self.structure_threshold = structure_threshold
+        self.retry_drifted = retry_drifted
+
+    def _settings(self, draft=False):
+        """PreprocessSettings images are sent with; part of every cache key"""
+        return draft_settings(self.preprocess_settings) if draft else self.preprocess_settings
+
+    def prepare_images(self, room_bytes, furniture=None, room_digest=None, draft=False):
+        """Preprocess the room and furniture images into model parts
+
+        Returns (parts, payload) where payload records the bytes before and
+        after preprocessing.
+        """
+        settings = self._settings(draft)
+        with self.metrics.timer("preprocess_seconds"):
+            prepared = [self._prepare(room_bytes, room_digest or content_digest(room_bytes), settings=settings)]
+            prepared += [
+                self._prepare(item['data'], item['digest'], item.get('prepared'), settings) for item in furniture or []
+            ]
+        payload = {
+            'original_bytes': sum(image.original_bytes for image in prepared),
+            'encoded_bytes': sum(len(image.data) for image in prepared),
+        }
+        self.metrics.observe("original_bytes", payload['original_bytes'])
+        self.metrics.observe("upload_bytes", payload['encoded_bytes'])
+        return image_parts(prepared), payload
+
+    def estimate_request(self, room_bytes, preferences, furniture=None, room_digest=None, draft=False):
+        """RequestEstimate for generating this room, without sending anything
+
+        Images are preprocessed into the same caches generate() uses, so the
+        work is not repeated when the request follows.
+        """
+        settings = self._settings(draft)
+        prepared = [self._prepare(room_bytes, room_digest or content_digest(room_bytes), settings=settings)]
+        prepared += [
+            self._prepare(item['data'], item['digest'], item.get('prepared'), settings) for item in furniture or []
+        ]
+        prompt = fit_room_prompt(preferences, furniture or None, self.prompt_token_budget, draft)
+        return RequestEstimate(
+            prompt_tokens=prompt.tokens,
+            image_tokens=sum(estimate_image_tokens(image.size) for image in prepared),
+            upload_bytes=sum(len(image.data) for image in prepared),
+            token_budget=self.prompt_token_budget,
+            trimmed=prompt.trimmed
+        )
+
+    def _prepare(self, data, digest, memo=None, settings=None):
+        """PreparedImage for one image, memoized in `memo` when the caller keeps one"""
+        settings = settings or self.preprocess_settings
+        prepared = memo.get(settings) if memo is not None else None
+        if prepared is None:
+            prepared = self.preprocess_cache.prepare(data, settings, digest)
+            if memo is not None:
+                memo[settings] = prepared
+        return prepared
+
+    def _call_model(self, prompt, parts, on_update, timeout=None):
+        """One attempt at the request, streamed when possible: (response, RequestTiming)"""
+        if self.stream and supports_streaming(self.client):
+            return stream_model(self.client, self.model_id, [prompt] + parts, on_update, timeout)
+        return timed_call_model(self.client, self.model_id, [prompt] + parts, timeout)
+
+    def _admitted(self):
+        """Admission slot for one model request; yields the seconds spent waiting for it"""
+        if self.admission is None:
+            return contextlib.nullcontext(0.0)
+        return self.admission.admit(self.session_key, self.admission_weight, self.deadline)
+
+    def _generate(self, prompt, parts, payload, cache_key, preferences, on_update=None):
+        """The single path from a prompt and image parts to a GenerationResult"""
+        metrics = self.metrics
+        response = self.response_cache.get(cache_key) if self.response_cache else None
+        cached = response is not None
+        timing = None
+        if not cached:
+            metrics.increment("cache_misses")
+            with self._admitted() as queue_wait:
+                metrics.observe("queue_wait_seconds", queue_wait)
+                deadline = None if self.deadline is None else self.deadline - queue_wait
+                # request_seconds includes rate-limit waits and retries, model_seconds is the last attempt
+                with metrics.timer("request_seconds"):
+                    if self.scheduler:
+                        response, timing = self.scheduler.run(
+                            self.request_key, lambda timeout: self._call_model(prompt, parts, on_update, timeout),
+                            deadline
+                        )
+                    else:
+                        response, timing = self._call_model(prompt, parts, on_update, deadline)
+            metrics.observe("model_seconds", timing.total)
+            metrics.observe("ttfb_seconds", timing.ttfb)
+            if self.response_cache:
+                response = self.response_cache.put(cache_key, response)
+        else:
+            metrics.increment("cache_hits")
+
+        if on_update and (timing is None or not timing.streamed):
+            on_update(response)
+
+        with metrics.timer("decode_seconds"):
+            image_bytes = response_image_bytes(response)
+            text = response_text(response)
+        if image_bytes:
+            metrics.observe("response_bytes", len(image_bytes))
+
+        return GenerationResult(
+            image_bytes=image_bytes,
+            text=text,
+            preferences=preferences,
+            cached=cached,
+            payload=payload,
+            response=response,
+            timing=timing
+        )
+
+    def generate(self, room_bytes, preferences, furniture=None, room_digest=None, on_update=None, draft=False):
+        """Furnish a room with the given preferences"""
+        room_digest = room_digest or content_digest(room_bytes)
+        parts, payload = self.prepare_images(room_bytes, furniture, room_digest, draft)
+        return self._furnish(room_bytes, room_digest, preferences, furniture, parts, payload, on_update, draft)
+
+    def _furnish(self, room_bytes, room_digest, preferences, furniture, parts, payload, on_update=None, draft=False):
+        """Generate a room, then check its structure against the empty room when that is enabled"""
+        result = self._generate_room(room_digest, preferences, furniture, parts, payload, on_update, draft)
+        if self.structure_threshold is None or not result.image_bytes:
+            return result
+        result = result._replace(structure=self._check_structure(room_bytes, result.image_bytes))
+        if not (result.structure.drifted and self.retry_drifted):
+            return result
+
+        # The reminder changes the prompt, so this is a new request rather than a cache hit
+        self.metrics.increment("structure_retries")
+        retry = self._generate_room(
+            room_digest, preferences, furniture, parts, payload, on_update, draft, structure_reminder=True
+        )
+        if not retry.image_bytes:
+            return result
+        retry = retry._replace(structure=self._check_structure(room_bytes, retry.image_bytes))
+        return retry if retry.structure.edge_preservation > result.structure.edge_preservation else result
+
+    def _check_structure(self, room_bytes, image_bytes):
+        with self.metrics.timer("structure_seconds"):
+            report = analyze_structure(room_bytes, image_bytes, self.structure_threshold)
+        self.metrics.observe("edge_preservation_ratio", report.edge_preservation)
+        if report.drifted:
+            self.metrics.increment("structure_drifts")
+        return report
+
+    def _generate_room(self, room_digest, preferences, furniture, parts, payload, on_update=None, draft=False,
+                       structure_reminder=False):
+        """Build the room prompt and cache key for preferences, then generate"""
+        with self.metrics.timer("prompt_seconds"):
+            prompt = fit_room_prompt(
+                preferences, furniture or None, self.prompt_token_budget, draft, structure_reminder
+            )
+            cache_key = make_cache_key(
+                room_digest, furniture_cache_items(furniture), prompt.base, prompt.special_instructions, self.model_id,
+                self._settings(draft)
+            )
+        self.metrics.observe("prompt_tokens", prompt.tokens)
+        if prompt.trimmed:
+            self.metrics.increment("prompt_trims")
+        return self._generate(prompt.text, parts, payload, cache_key, preferences, on_update)
+
+    def generate_variations(self, room_bytes, preferences, variations, furniture=None, room_digest=None,
+                            max_concurrency=DEFAULT_MAX_CONCURRENCY, draft=False):
+        """Generate style variations concurrently, yielding VariationResults as they finish
+
+        Images are preprocessed once and shared by every variation; a failing
+        variation is yielded with its error and does not stop the others.
+        Variations run on worker threads, so there is no `on_update` here.
+        """
+        room_digest = room_digest or content_digest(room_bytes)
+        parts, payload = self.prepare_images(room_bytes, furniture, room_digest, draft)
+
+        def generate_variation(variation):
+            return self._furnish(
+                room_bytes, room_digest, variation_preferences(preferences, variation), furniture, parts, payload,
+                draft=draft
+            )
+
+        return run_variations(generate_variation, variations, max_concurrency)
+
+    def preview(self, room_bytes, room_type, style, furniture, room_digest=None, on_update=None):
+        """Show the uploaded furniture in a quick room of the given type and style"""
+        room_digest = room_digest or content_digest(room_bytes)
+        parts, payload = self.prepare_images(room_bytes, furniture, room_digest)
+        prompt = create_preview_prompt(room_type, style)
+        cache_key = make_cache_key(
+            room_digest, furniture_cache_items(furniture), prompt, "", self.model_id, self._settings()
+        )
+        return self._generate(
+            prompt, parts, payload, cache_key, {'room_type': room_type, 'style': style}, on_update
+        )
+
+    def edit(self, furnished_bytes, instruction, preferences, furnished_digest=None, on_update=None):
+        """Refine an already furnished room with a short delta instruction
+
+        Only the furnished image and the instruction are sent; the empty room
+        and furniture images are not. The result's preferences are
+        `preferences` plus the 'edit_instruction'.
+        """
+        furnished_digest = furnished_digest or content_digest(furnished_bytes)
+        parts, payload = self.prepare_images(furnished_bytes, room_digest=furnished_digest)
+        with self.metrics.timer("prompt_seconds"):
+            prompt = create_edit_prompt(instruction)
+            cache_key = make_cache_key(furnished_digest, [], prompt, "", self.model_id, self._settings())
+        return self._generate(
+            prompt, parts, payload, cache_key, dict(preferences, edit_instruction=instruction), on_update
+        )
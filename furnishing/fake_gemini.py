@@ -0,0 +1,176 @@
+"""Local stand-in for genai.Client used by benchmarks and offline runs"""
+import hashlib
+import io
+import random
+import threading
+import time
+
+from PIL import Image as PILImage
+
+
+class FakeAPIError(Exception):
+    """Mirrors the `code` and `status` attributes of genai.errors.APIError"""
+
+    STATUSES = {429: "RESOURCE_EXHAUSTED", 500: "INTERNAL", 503: "UNAVAILABLE", 400: "INVALID_ARGUMENT"}
+
+    def __init__(self, code):
+        self.code = code
+        self.status = self.STATUSES.get(code, "UNKNOWN")
+        super().__init__(f"{code} {self.status}. Fake backend injected failure")
+
+
+class FakeImage:
+    """Mirrors the `image_bytes` attribute of the SDK's image type"""
+
+    def __init__(self, image_bytes, mime_type="image/png"):
+        self.image_bytes = image_bytes
+        self.mime_type = mime_type
+
+
+class FakePart:
+    """Response part with either text or image bytes"""
+
+    def __init__(self, text=None, image_bytes=None):
+        self.text = text
+        self.image_bytes = image_bytes
+
+    def as_image(self):
+        if self.image_bytes is None:
+            return None
+        return FakeImage(self.image_bytes)
+
+
+class FakeResponse:
+    """Response object exposing `parts` like GenerateContentResponse"""
+
+    def __init__(self, parts):
+        self.parts = parts
+
+    @property
+    def text(self):
+        texts = [part.text for part in self.parts if part.text]
+        return "".join(texts) if texts else None
+
+
+def _prompt_text(contents):
+    """Join the text items of a contents list"""
+    if isinstance(contents, str):
+        return contents
+    return "\n".join(item for item in contents if isinstance(item, str))
+
+
+def _timeout(config):
+    """Request timeout in seconds from a config's http_options, or None"""
+    milliseconds = getattr(getattr(config, "http_options", None), "timeout", None)
+    return None if milliseconds is None else milliseconds / 1000
+
+
+class _Timer:
+    """Sleeps like the real request would, raising TimeoutError once its timeout is used up"""
+
+    def __init__(self, timeout):
+        self._deadline = None if timeout is None else time.monotonic() + timeout
+
+    def sleep(self, seconds):
+        if self._deadline is not None and time.monotonic() + seconds > self._deadline:
+            time.sleep(max(0.0, self._deadline - time.monotonic()))
+            raise TimeoutError("Fake backend request timed out")
+        time.sleep(seconds)
+
+
+def render_fake_room(prompt, size=(512, 384)):
+    """Render a deterministic PNG whose colors depend on the prompt"""
+    digest = hashlib.sha256(prompt.encode("utf-8")).digest()
+    image = PILImage.new("RGB", size, tuple(digest[:3]))
+    width, height = size
+    # A floor band and a "sofa" block so the output is not a flat color
+    image.paste(tuple(digest[3:6]), (0, height * 2 // 3, width, height))
+    image.paste(tuple(digest[6:9]), (width // 4, height // 2, width * 3 // 4, height * 3 // 4))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class _FakeModels:
+    def __init__(self, client):
+        self._client = client
+
+    def generate_content(self, model, contents, config=None):
+        client = self._client
+        client._record_call()
+        _Timer(_timeout(config)).sleep(client.delay)
+        client._maybe_fail()
+
+        prompt = _prompt_text(contents)
+        return FakeResponse([
+            FakePart(text=f"Here is your furnished room ({model})."),
+            FakePart(image_bytes=render_fake_room(prompt, client.image_size)),
+        ])
+
+    def generate_content_stream(self, model, contents, config=None):
+        """Yield the same response as generate_content in chunks spread over `delay`
+
+        Text arrives word by word in the first fifth of the delay, the image
+        at the end, followed by a short closing remark.
+        """
+        client = self._client
+        client._record_call()
+        timer = _Timer(_timeout(config))
+        timer.sleep(client.delay * 0.1)
+        client._maybe_fail()
+
+        words = f"Here is your furnished room ({model}).".split(" ")
+        for i, word in enumerate(words):
+            timer.sleep(client.delay * 0.1 / len(words))
+            yield FakeResponse([FakePart(text=word if i == 0 else " " + word)])
+        timer.sleep(client.delay * 0.8)
+        prompt = _prompt_text(contents)
+        yield FakeResponse([FakePart(image_bytes=render_fake_room(prompt, client.image_size))])
+        yield FakeResponse([FakePart(text="Let me know if you want any changes.")])
+
+
+class FakeClient:
+    """Offline replacement for genai.Client with a fixed delay per request
+
+    Only `client.models.generate_content` and `generate_content_stream` are
+    implemented. Responses are deterministic for a given prompt. A request
+    whose config sets an http_options timeout shorter than `delay` raises
+    TimeoutError once the timeout has passed, like the real client.
+    `failure_rate` makes that share of requests fail with a FakeAPIError
+    whose code is drawn from `fault_codes`; `inject_faults` queues failures
+    for the next requests in order.
+    """
+
+    def __init__(self, delay=1.0, failure_rate=0.0, seed=0, image_size=(512, 384), fault_codes=(429, 503)):
+        self.delay = delay
+        self.failure_rate = failure_rate
+        self.image_size = image_size
+        self.fault_codes = tuple(fault_codes)
+        self.calls = 0
+        self.faults = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._queued_faults = []
+        self.models = _FakeModels(self)
+
+    def inject_faults(self, *codes):
+        """Fail the next len(codes) requests with these status codes (None lets one through)"""
+        with self._lock:
+            self._queued_faults.extend(codes)
+
+    def _record_call(self):
+        with self._lock:
+            self.calls += 1
+
+    def _maybe_fail(self):
+        with self._lock:
+            if self._queued_faults:
+                code = self._queued_faults.pop(0)
+            elif self._random.random() < self.failure_rate:
+                code = self._random.choice(self.fault_codes)
+            else:
+                code = None
+            if code is not None:
+                self.faults += 1
+        if code is not None:
+            raise FakeAPIError(code)
@@ -0,0 +1,116 @@
+"""Uploaded furniture images kept across Streamlit reruns
+
+Streamlit hands the same uploaded files back on every rerun, so decoding,
+hashing and re-encoding them each time made typing one character into a
+description box cost as much as uploading every furniture image again.
+FurnitureRegistry keeps one FurnitureAsset per upload, keyed by the
+upload's file id and by content hash; a rerun with unchanged uploads is a
+handful of dictionary lookups.
+"""
+import io
+
+from PIL import Image as PILImage
+from PIL import ImageOps
+
+from furnishing.response_cache import content_digest
+
+# Longest edge of the thumbnail shown next to each description box
+THUMBNAIL_EDGE = 320
+
+
+def make_preview_thumbnail(data, edge=THUMBNAIL_EDGE, quality=85):
+    """Return (JPEG thumbnail bytes, original size) keeping the aspect ratio"""
+    image = PILImage.open(io.BytesIO(data))
+    size = image.size
+    image.draft("RGB", (edge, edge))
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = PILImage.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+    else:
+        image = image.convert("RGB")
+    image.thumbnail((edge, edge), PILImage.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue(), size
+
+
+class FurnitureAsset:
+    """One uploaded furniture image with everything derived from it
+
+    The thumbnail is built when the asset is registered; the full decoded
+    image is only built if something asks for it. `prepared` is where the
+    engine memoizes model-ready images per PreprocessSettings.
+    """
+
+    def __init__(self, data, filename, digest=None):
+        self.data = data
+        self.filename = filename
+        self.digest = digest or content_digest(data)
+        self.thumbnail, self.size = make_preview_thumbnail(data)
+        self.prepared = {}
+        self._image = None
+
+    @property
+    def image(self):
+        """Decoded PIL image, loaded on first use"""
+        if self._image is None:
+            image = PILImage.open(io.BytesIO(self.data))
+            image.load()
+            self._image = image
+        return self._image
+
+    def as_furniture(self, description):
+        """Furniture dict in the shape the engine, prompts and gallery expect"""
+        return {
+            'description': description,
+            'filename': self.filename,
+            'data': self.data,
+            'digest': self.digest,
+            'thumbnail': self.thumbnail,
+            'prepared': self.prepared
+        }
+
+
+class FurnitureRegistry:
+    """Per-session map from uploaded files to FurnitureAssets
+
+    Assets for files that are no longer uploaded are dropped on the next
+    sync. Re-uploading identical bytes under a new file id reuses the
+    existing asset.
+    """
+
+    def __init__(self):
+        self._by_file_id = {}
+        self._by_digest = {}
+        self.registered = 0
+
+    def sync(self, uploaded_files):
+        """Return the assets for `uploaded_files` in order, building only new ones"""
+        by_file_id = {}
+        by_digest = {}
+        assets = []
+        for uploaded in uploaded_files or []:
+            file_id = getattr(uploaded, "file_id", None)
+            asset = self._by_file_id.get(file_id) if file_id is not None else None
+            if asset is None:
+                data = uploaded.getvalue()
+                digest = content_digest(data)
+                asset = by_digest.get(digest) or self._by_digest.get(digest)
+                if asset is None:
+                    asset = FurnitureAsset(data, uploaded.name, digest)
+                    self.registered += 1
+
+            if file_id is not None:
+                by_file_id[file_id] = asset
+            by_digest[asset.digest] = asset
+            assets.append(asset)
+
+        self._by_file_id = by_file_id
+        self._by_digest = by_digest
+        return assets
+
+    def __len__(self):
+        return len(self._by_digest)
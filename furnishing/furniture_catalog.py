@@ -0,0 +1,230 @@
+"""Persistent furniture catalog shared across sessions
+
+Furniture photos are stored once by content hash under `images/`, with a
+thumbnail built when they are added under `thumbs/`. Descriptions, styles
+and tags live in a SQLite index with an FTS5 table, so searching tens of
+thousands of items takes a few milliseconds and never touches the images.
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from furnishing.furniture_assets import make_preview_thumbnail
+from furnishing.gallery_store import _atomic_write
+from furnishing.response_cache import content_digest
+
+DEFAULT_PAGE_SIZE = 24
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    digest TEXT NOT NULL UNIQUE,
+    description TEXT NOT NULL,
+    style TEXT NOT NULL DEFAULT '',
+    tags TEXT NOT NULL DEFAULT '',
+    filename TEXT,
+    width INTEGER,
+    height INTEGER,
+    size_bytes INTEGER,
+    added REAL NOT NULL,
+    last_used REAL,
+    uses INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS items_recent ON items (last_used, added);
+CREATE INDEX IF NOT EXISTS items_style_recent ON items (style, last_used, added);
+CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+    description, style, tags, content='items', content_rowid='id', prefix='2 3'
+);
+CREATE TRIGGER IF NOT EXISTS items_ai AFTER INSERT ON items BEGIN
+    INSERT INTO items_fts (rowid, description, style, tags)
+    VALUES (new.id, new.description, new.style, new.tags);
+END;
+CREATE TRIGGER IF NOT EXISTS items_ad AFTER DELETE ON items BEGIN
+    INSERT INTO items_fts (items_fts, rowid, description, style, tags)
+    VALUES ('delete', old.id, old.description, old.style, old.tags);
+END;
+CREATE TRIGGER IF NOT EXISTS items_au AFTER UPDATE OF description, style, tags ON items BEGIN
+    INSERT INTO items_fts (items_fts, rowid, description, style, tags)
+    VALUES ('delete', old.id, old.description, old.style, old.tags);
+    INSERT INTO items_fts (rowid, description, style, tags)
+    VALUES (new.id, new.description, new.style, new.tags);
+END;
+"""
+
+ITEM_COLUMNS = "digest, description, style, tags, filename, width, height, size_bytes, added, last_used, uses"
+QUALIFIED_COLUMNS = ", ".join(f"items.{column}" for column in ITEM_COLUMNS.split(", "))
+
+
+def normalize_tags(tags):
+    """Lower-case, de-duplicated tags from a comma-separated string or a list"""
+    if isinstance(tags, str):
+        tags = tags.split(",")
+    seen = []
+    for tag in tags or []:
+        tag = tag.strip().lower()
+        if tag and tag not in seen:
+            seen.append(tag)
+    return seen
+
+
+def match_expression(query):
+    """FTS5 query matching every word of `query` as a prefix"""
+    words = re.findall(r"\w+", query.lower())
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def _row_to_item(row):
+    digest, description, style, tags, filename, width, height, size_bytes, added, last_used, uses = row
+    return {
+        'digest': digest,
+        'description': description,
+        'style': style,
+        'tags': tags.split(",") if tags else [],
+        'filename': filename,
+        'size': (width, height),
+        'bytes': size_bytes,
+        'added': added,
+        'last_used': last_used,
+        'uses': uses,
+    }
+
+
+class FurnitureCatalog:
+    """SQLite-indexed, content-addressed store of furniture images"""
+
+    def __init__(self, root):
+        self.root = root
+        self.image_dir = os.path.join(root, "images")
+        self.thumb_dir = os.path.join(root, "thumbs")
+        os.makedirs(self.image_dir, exist_ok=True)
+        os.makedirs(self.thumb_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(root, "catalog.sqlite3"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    # Images
+
+    def image_path(self, digest):
+        return os.path.join(self.image_dir, digest[:2], digest)
+
+    def thumbnail_path(self, digest):
+        return os.path.join(self.thumb_dir, f"{digest}.jpg")
+
+    def get_bytes(self, digest):
+        """Return the stored image bytes for a digest"""
+        with open(self.image_path(digest), "rb") as f:
+            return f.read()
+
+    def thumbnail(self, digest):
+        """Return the prebuilt JPEG thumbnail of an item"""
+        with open(self.thumbnail_path(digest), "rb") as f:
+            return f.read()
+
+    # Index
+
+    def add(self, data, description, style="", tags=(), filename=None, digest=None):
+        """Add an image to the catalog, or update the entry if the same image is already there
+
+        Returns the item's digest. Adding the same photo again refreshes its
+        description and style and merges the tags instead of storing a copy.
+        """
+        digest = digest or content_digest(data)
+        path = self.image_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            _atomic_write(path, data)
+
+        existing = self.get(digest)
+        if existing:
+            merged = normalize_tags(existing['tags'] + normalize_tags(tags))
+            with self._lock, self._db:
+                self._db.execute(
+                    "UPDATE items SET description = ?, style = ?, tags = ? WHERE digest = ?",
+                    (description.strip(), (style or existing['style']).lower(), ",".join(merged), digest)
+                )
+            return digest
+
+        thumbnail, size = make_preview_thumbnail(data)
+        _atomic_write(self.thumbnail_path(digest), thumbnail)
+        self._index(digest, description, style, tags, filename, size, len(data))
+        return digest
+
+    def _index(self, digest, description, style, tags, filename, size, size_bytes, added=None):
+        """Insert one row into the index (the image files must already exist)"""
+        width, height = size or (None, None)
+        with self._lock, self._db:
+            self._db.execute(
+                f"INSERT OR IGNORE INTO items ({ITEM_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, NULL, 0)",
+                (digest, description.strip(), (style or "").lower(), ",".join(normalize_tags(tags)),
+                 filename, width, height, size_bytes, time.time() if added is None else added)
+            )
+
+    def get(self, digest):
+        """Return one item dict, or None"""
+        with self._lock:
+            row = self._db.execute(f"SELECT {ITEM_COLUMNS} FROM items WHERE digest = ?", (digest,)).fetchone()
+        return _row_to_item(row) if row else None
+
+    def remove(self, digest):
+        """Drop an item from the index and delete its files"""
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM items WHERE digest = ?", (digest,))
+        for path in (self.image_path(digest), self.thumbnail_path(digest)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def search(self, query="", style=None, limit=DEFAULT_PAGE_SIZE, offset=0):
+        """Items whose description, style or tags match every word of `query`
+
+        Words match as prefixes ("sof" finds "sofa"). With a query the newest
+        matches come first, which lets FTS5 stop after `limit` hits; without
+        one, recently used items come first, then recently added ones.
+        `style` restricts results to one style.
+        """
+        conditions, params = [], []
+        expression = match_expression(query or "")
+        if expression:
+            sql = f"SELECT {QUALIFIED_COLUMNS} FROM items_fts JOIN items ON items.id = items_fts.rowid"
+            conditions.append("items_fts MATCH ?")
+            params.append(expression)
+            order = "items_fts.rowid DESC"
+        else:
+            sql = f"SELECT {QUALIFIED_COLUMNS} FROM items"
+            # NULLs sort last in descending order, so never-used items follow used ones
+            order = "items.last_used DESC, items.added DESC"
+        if style:
+            conditions.append("items.style = ?")
+            params.append(style.lower())
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += f" ORDER BY {order} LIMIT ? OFFSET ?"
+        params += [limit, offset]
+
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        return [_row_to_item(row) for row in rows]
+
+    def styles(self):
+        """Distinct styles present in the catalog"""
+        with self._lock:
+            rows = self._db.execute("SELECT DISTINCT style FROM items WHERE style != '' ORDER BY style").fetchall()
+        return [row[0] for row in rows]
+
+    def mark_used(self, digests):
+        """Record that items were used in a generation (they then sort first)"""
+        now = time.time()
+        with self._lock, self._db:
+            self._db.executemany(
+                "UPDATE items SET uses = uses + 1, last_used = ? WHERE digest = ?",
+                [(now, digest) for digest in digests]
+            )
@@ -0,0 +1,130 @@
+"""Streamed ZIP export of a session's gallery
+
+The archive is written entry by entry: the JSON manifest is streamed first,
+then each blob is copied from the store into the archive in chunks, so
+writing it to a file never holds more than one chunk of image data. Memory
+stays bounded only if the caller also consumes the archive as a file: a
+caller that reads it back into bytes (as the app must, because Streamlit
+download buttons serve bytes) holds the whole archive in memory once.
+Images that are already compressed (PNG, JPEG, WebP) are stored without
+recompression. Images the expiry sweep has already removed from the store
+are left out, with a null path in the manifest.
+"""
+import io
+import json
+import os
+import shutil
+import zipfile
+from datetime import datetime
+
+from PIL import Image as PILImage
+
+# Formats that gain nothing from another round of deflate
+COMPRESSED_FORMATS = {"PNG": "png", "JPEG": "jpg", "WEBP": "webp", "GIF": "gif"}
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def _blob_extension(store, digest):
+    """Return (extension, already_compressed) for a stored blob from its header"""
+    try:
+        with PILImage.open(store.blob_path(digest)) as image:
+            image_format = image.format
+    except Exception:
+        return "bin", False
+    if image_format in COMPRESSED_FORMATS:
+        return COMPRESSED_FORMATS[image_format], True
+    return (image_format or "bin").lower(), False
+
+
+def _zip_info(name, compressed):
+    info = zipfile.ZipInfo(name, date_time=datetime.now().timetuple()[:6])
+    info.compress_type = zipfile.ZIP_STORED if compressed else zipfile.ZIP_DEFLATED
+    return info
+
+
+def _gallery_layout(store, entries):
+    """Yield (manifest record, [(digest, archive path, compressed)]) per entry
+
+    Original rooms and furniture images are usually shared by several
+    entries, so they are listed once under `originals/` and `furniture/`;
+    each entry gets a folder with its furnished image. Blobs missing from
+    the store get a None path and no archive member.
+    """
+    shared_paths = {}
+    for i, entry in enumerate(entries, start=1):
+        folder = f"room_{i:03d}_{os.path.splitext(entry['filename'])[0]}"
+        blobs = []
+
+        def place(digest, stem):
+            if not os.path.exists(store.blob_path(digest)):
+                return None
+            extension, compressed = _blob_extension(store, digest)
+            path = f"{stem}.{extension}"
+            blobs.append((digest, path, compressed))
+            return path
+
+        def place_shared(digest, folder_name):
+            if digest not in shared_paths:
+                shared_paths[digest] = place(digest, f"{folder_name}/{digest[:16]}")
+            return shared_paths[digest]
+
+        record = {
+            'id': entry.get('id'),
+            'filename': entry['filename'],
+            'timestamp': entry['timestamp'],
+            'preferences': entry['preferences'],
+            'render': entry.get('render', "final"),
+            'original': place_shared(entry['original'], "originals"),
+            'furnished': place(entry['furnished'], f"{folder}/furnished"),
+            'uploaded_furniture': [
+                {
+                    'description': furniture['description'],
+                    'filename': furniture.get('filename'),
+                    'path': place_shared(furniture['digest'], "furniture"),
+                }
+                for furniture in entry.get('uploaded_furniture') or []
+            ],
+        }
+        if entry.get('palette'):
+            record['palette'] = entry['palette']
+        if entry.get('structure'):
+            # Structure check scores against the empty room; the change mask image is not exported
+            record['structure'] = {
+                key: value for key, value in entry['structure'].items() if key != 'change_mask'
+            }
+        if entry.get('edit_of'):
+            # Refinements record which entry they edited; `original` is that entry's furnished image
+            record.update(edit_of=entry['edit_of'], root=entry['root'], version=entry['version'])
+        yield record, blobs
+
+
+def write_gallery_zip(store, entries, fileobj):
+    """Write every gallery entry and a manifest.json into a ZIP on `fileobj`"""
+    # Every blob's header is read once, here; the layout itself is small
+    layout = list(_gallery_layout(store, entries))
+    with zipfile.ZipFile(fileobj, "w") as archive:
+        # The archive allows one open member at a time: stream the manifest
+        # first, then copy the images.
+        with archive.open(_zip_info("manifest.json", compressed=False), "w") as target:
+            manifest = io.TextIOWrapper(target, encoding="utf-8")
+            manifest.write("[")
+            for k, (record, _) in enumerate(layout):
+                manifest.write(("," if k else "") + "\n  " + json.dumps(record))
+            manifest.write("\n]\n")
+            manifest.flush()
+            manifest.detach()
+
+        for _, blobs in layout:
+            for digest, path, compressed in blobs:
+                try:
+                    source = open(store.blob_path(digest), "rb")
+                except FileNotFoundError:
+                    # Swept since the layout was made; the rest of the export is still useful
+                    continue
+                with source:
+                    info = _zip_info(path, compressed)
+                    info.file_size = os.fstat(source.fileno()).st_size
+                    with archive.open(info, "w") as target:
+                        shutil.copyfileobj(source, target, COPY_CHUNK_SIZE)
+    return fileobj
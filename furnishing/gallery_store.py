@@ -0,0 +1,283 @@
+"""Disk-backed gallery storage
+
+Images are written once to a content-addressed blob store, so the original
+room shared by several style variations is stored a single time. Session
+state only keeps small handles (digests) and thumbnails; other thumbnails
+and download encodings are built once on demand and cached next to the blobs. Each session has a
+manifest on disk listing the blobs it references; an expiry sweep removes
+manifests of sessions that have gone quiet and then deletes blobs no
+manifest references any more.
+"""
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+
+from PIL import Image as PILImage
+from PIL import ImageOps
+
+from furnishing.response_cache import content_digest
+
+DEFAULT_MAX_SESSION_ENTRIES = 50
+DEFAULT_MAX_SESSION_BYTES = 200 * 1024 * 1024
+DEFAULT_SESSION_TTL = 24 * 60 * 60
+DEFAULT_SWEEP_INTERVAL = 10 * 60
+THUMBNAIL_SIZE = (320, 240)
+
+# Download formats: name -> (MIME type, file extension)
+EXPORT_FORMATS = {
+    "PNG": ("image/png", "png"),
+    "WEBP": ("image/webp", "webp"),
+    "JPEG": ("image/jpeg", "jpg"),
+}
+DEFAULT_PNG_COMPRESS_LEVEL = 6
+DEFAULT_EXPORT_QUALITY = 90
+
+
+def make_thumbnail(data, size=THUMBNAIL_SIZE, quality=80):
+    """Return JPEG bytes of an image center-cropped to exactly `size`"""
+    image = PILImage.open(io.BytesIO(data))
+    image.draft("RGB", size)
+    image = ImageOps.fit(image.convert("RGB"), size, PILImage.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def _atomic_write(path, data):
+    """Write bytes through a temp file so readers never see a partial file"""
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class GalleryStore:
+    """Content-addressed image blobs plus one manifest of gallery entries per session"""
+
+    def __init__(self, root, max_session_entries=DEFAULT_MAX_SESSION_ENTRIES,
+                 max_session_bytes=DEFAULT_MAX_SESSION_BYTES, session_ttl=DEFAULT_SESSION_TTL,
+                 sweep_interval=DEFAULT_SWEEP_INTERVAL):
+        self.root = root
+        self.blob_dir = os.path.join(root, "blobs")
+        self.thumb_dir = os.path.join(root, "thumbs")
+        self.export_dir = os.path.join(root, "exports")
+        self.session_dir = os.path.join(root, "sessions")
+        self.max_session_entries = max_session_entries
+        self.max_session_bytes = max_session_bytes
+        self.session_ttl = session_ttl
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.thumb_dir, exist_ok=True)
+        os.makedirs(self.export_dir, exist_ok=True)
+        os.makedirs(self.session_dir, exist_ok=True)
+
+    # Blobs
+
+    def blob_path(self, digest):
+        return os.path.join(self.blob_dir, digest[:2], digest)
+
+    def put_bytes(self, data):
+        """Store encoded image bytes and return their digest"""
+        digest = content_digest(data)
+        path = self.blob_path(digest)
+        if os.path.exists(path):
+            # Refresh the mtime so a sweep in progress does not treat it as stale
+            os.utime(path)
+            return digest
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _atomic_write(path, data)
+        return digest
+
+    def get_bytes(self, digest):
+        """Return the stored bytes for a digest"""
+        with open(self.blob_path(digest), "rb") as f:
+            return f.read()
+
+    def open_image(self, digest):
+        """Open a stored blob as a PIL image"""
+        return PILImage.open(self.blob_path(digest))
+
+    def thumbnail(self, digest, size=THUMBNAIL_SIZE):
+        """Return a fixed-size JPEG thumbnail of a blob, building it on first use"""
+        path = os.path.join(self.thumb_dir, f"{digest}_{size[0]}x{size[1]}.jpg")
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            pass
+        data = make_thumbnail(self.get_bytes(digest), size)
+        _atomic_write(path, data)
+        return data
+
+    def export_bytes(self, digest, format="PNG", compress_level=DEFAULT_PNG_COMPRESS_LEVEL,
+                     quality=DEFAULT_EXPORT_QUALITY):
+        """Return a blob encoded for download, encoding it only the first time
+
+        PNG uses `compress_level` (0-9); WEBP and JPEG use `quality`.
+        """
+        if format not in EXPORT_FORMATS:
+            raise ValueError(f"Unsupported download format: {format}")
+        option = f"c{compress_level}" if format == "PNG" else f"q{quality}"
+        path = os.path.join(self.export_dir, f"{digest}_{option}.{EXPORT_FORMATS[format][1]}")
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            pass
+
+        image = self.open_image(digest)
+        if format == "PNG":
+            save_options = {"compress_level": compress_level}
+        else:
+            save_options = {"quality": quality}
+            if image.mode not in ("RGB", "L") and format == "JPEG":
+                image = image.convert("RGB")
+        buffer = io.BytesIO()
+        image.save(buffer, format=format, **save_options)
+        data = buffer.getvalue()
+        _atomic_write(path, data)
+        return data
+
+    def blob_size(self, digest):
+        try:
+            return os.path.getsize(self.blob_path(digest))
+        except OSError:
+            return 0
+
+    # Session manifests
+
+    def _manifest_path(self, session_id):
+        return os.path.join(self.session_dir, f"{session_id}.json")
+
+    def load_entries(self, session_id):
+        """Return the gallery entries recorded for a session"""
+        try:
+            with open(self._manifest_path(session_id), "r", encoding="utf-8") as f:
+                return json.load(f)["entries"]
+        except (OSError, ValueError, KeyError):
+            return []
+
+    def _write_entries(self, session_id, entries):
+        data = json.dumps({"updated": time.time(), "entries": entries}).encode("utf-8")
+        _atomic_write(self._manifest_path(session_id), data)
+
+    def touch_session(self, session_id):
+        """Mark a session as active so the expiry sweep keeps its images"""
+        try:
+            os.utime(self._manifest_path(session_id))
+        except OSError:
+            pass
+
+    @staticmethod
+    def entry_digests(entry):
+        """All blob digests referenced by one gallery entry"""
+        digests = [entry["original"], entry["furnished"]]
+        digests += [furniture["digest"] for furniture in entry.get("uploaded_furniture") or []]
+        if entry.get("structure"):
+            digests.append(entry["structure"]["change_mask"])
+        return digests
+
+    def session_bytes(self, entries):
+        """Bytes on disk used by a list of entries, counting shared blobs once"""
+        unique = {digest for entry in entries for digest in self.entry_digests(entry)}
+        return sum(self.blob_size(digest) for digest in unique)
+
+    def add_entry(self, session_id, entry):
+        """Record a gallery entry for a session, enforcing the session quota
+
+        The session's oldest entries are dropped until the new entry fits.
+        Returns the list of dropped entries.
+        """
+        with self._lock:
+            entries = self.load_entries(session_id)
+            entries.append(entry)
+            dropped = []
+            while len(entries) > 1 and (
+                len(entries) > self.max_session_entries
+                or self.session_bytes(entries) > self.max_session_bytes
+            ):
+                dropped.append(entries.pop(0))
+            self._write_entries(session_id, entries)
+        return dropped
+
+    def remove_session(self, session_id):
+        """Forget a session's manifest; its blobs go on the next sweep"""
+        try:
+            os.remove(self._manifest_path(session_id))
+        except OSError:
+            pass
+
+    # Expiry
+
+    def maybe_sweep(self):
+        """Run sweep() if the sweep interval has passed"""
+        now = time.time()
+        with self._lock:
+            if now - self._last_sweep < self.sweep_interval:
+                return None
+            self._last_sweep = now
+        return self.sweep(now)
+
+    def sweep(self, now=None):
+        """Remove expired session manifests and blobs no manifest references
+
+        Blobs younger than the sweep interval are kept even if unreferenced,
+        since a generation may have written them just before its manifest.
+        Returns (expired_sessions, removed_blobs).
+        """
+        now = now or time.time()
+        expired_sessions = 0
+        referenced = set()
+        with self._lock:
+            for name in os.listdir(self.session_dir):
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(self.session_dir, name)
+                try:
+                    if now - os.path.getmtime(path) > self.session_ttl:
+                        os.remove(path)
+                        expired_sessions += 1
+                        continue
+                except OSError:
+                    continue
+                for entry in self.load_entries(name[:-5]):
+                    referenced.update(self.entry_digests(entry))
+
+            removed_blobs = 0
+            for prefix in os.listdir(self.blob_dir):
+                prefix_dir = os.path.join(self.blob_dir, prefix)
+                if not os.path.isdir(prefix_dir):
+                    continue
+                for digest in os.listdir(prefix_dir):
+                    path = os.path.join(prefix_dir, digest)
+                    if digest in referenced:
+                        continue
+                    try:
+                        if now - os.path.getmtime(path) > self.sweep_interval:
+                            os.remove(path)
+                            removed_blobs += 1
+                    except OSError:
+                        continue
+
+            # Derived files are named "<digest>_<options>.<ext>"; skip in-progress temp files
+            for derived_dir in (self.thumb_dir, self.export_dir):
+                for name in os.listdir(derived_dir):
+                    if not name.startswith(".") and name.split("_", 1)[0] not in referenced:
+                        try:
+                            os.remove(os.path.join(derived_dir, name))
+                        except OSError:
+                            continue
+        return expired_sessions, removed_blobs
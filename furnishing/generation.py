@@ -0,0 +1,121 @@
+"""Model calls shared by the Streamlit app and the batch CLI
+
+google.genai is imported on first use; it takes most of a second to import
+and is not needed to build prompts, read caches or run the fake backend.
+"""
+import math
+import time
+from collections import namedtuple
+
+from furnishing.response_cache import CachedImage, CachedPart
+
+# Seconds from sending a request to its first response part and to the end
+# of the response. Blocking calls deliver everything at once, so both match.
+RequestTiming = namedtuple('RequestTiming', ['ttfb', 'total', 'streamed'])
+
+
+def image_parts(prepared_images):
+    """Turn PreparedImage tuples into model content parts"""
+    from google.genai import types
+    return [types.Part.from_bytes(data=image.data, mime_type=image.mime_type) for image in prepared_images]
+
+
+def _generation_config(timeout=None):
+    from google.genai import types
+    return types.GenerateContentConfig(
+        response_modalities=['Text', 'Image'],
+        # HttpOptions timeouts are in whole milliseconds
+        http_options=None if timeout is None else types.HttpOptions(timeout=max(1, math.ceil(timeout * 1000)))
+    )
+
+
+def call_model(client, model_id, content_list, timeout=None):
+    """Send one image-generation request to the model, giving up after `timeout` seconds"""
+    return client.models.generate_content(
+        model=model_id,
+        contents=content_list,
+        config=_generation_config(timeout)
+    )
+
+
+def supports_streaming(client):
+    """Whether the client can stream responses"""
+    return hasattr(client.models, "generate_content_stream")
+
+
+class StreamedResponse:
+    """Response assembled from streamed chunks, with the same `parts` interface
+
+    Consecutive text fragments are merged into one part; each image becomes
+    its own part as soon as the chunk carrying it arrives.
+    """
+
+    def __init__(self):
+        self.parts = []
+
+    def add_text(self, text):
+        if self.parts and self.parts[-1].text is not None:
+            self.parts[-1].text += text
+        else:
+            self.parts.append(CachedPart(text=text))
+
+    def add_image(self, image_bytes, mime_type=None):
+        self.parts.append(CachedPart(image=CachedImage(image_bytes, mime_type or "image/png")))
+
+
+def stream_model(client, model_id, content_list, on_update=None, timeout=None):
+    """Stream one image-generation request and return (response, RequestTiming)
+
+    `on_update`, if given, is called with the partially assembled response
+    after every chunk that added text or an image. With a `timeout`, a
+    stream still running after that many seconds raises TimeoutError; the
+    HTTP timeout alone only bounds the wait for each chunk.
+    """
+    started = time.perf_counter()
+    ttfb = None
+    response = StreamedResponse()
+    chunks = client.models.generate_content_stream(
+        model=model_id,
+        contents=content_list,
+        config=_generation_config(timeout)
+    )
+    for chunk in chunks:
+        if timeout is not None and time.perf_counter() - started > timeout:
+            raise TimeoutError(f"Streamed response took longer than {timeout:.1f}s")
+        if ttfb is None:
+            ttfb = time.perf_counter() - started
+        updated = False
+        for part in chunk.parts or []:
+            if part.text:
+                response.add_text(part.text)
+            elif image := part.as_image():
+                response.add_image(image.image_bytes, getattr(image, "mime_type", None))
+            else:
+                continue
+            updated = True
+        if updated and on_update:
+            on_update(response)
+
+    total = time.perf_counter() - started
+    return response, RequestTiming(total if ttfb is None else ttfb, total, True)
+
+
+def timed_call_model(client, model_id, content_list, timeout=None):
+    """Blocking call_model returning (response, RequestTiming)"""
+    started = time.perf_counter()
+    response = call_model(client, model_id, content_list, timeout)
+    total = time.perf_counter() - started
+    return response, RequestTiming(total, total, False)
+
+
+def response_image_bytes(response):
+    """Return the bytes of the first image in a response"""
+    for part in response.parts or []:
+        if image := part.as_image():
+            return image.image_bytes
+    return None
+
+
+def response_text(response):
+    """Join the text parts of a response"""
+    return "\n\n".join(part.text for part in response.parts or [] if part.text)
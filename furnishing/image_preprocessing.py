@@ -0,0 +1,99 @@
+"""Downscale and re-encode uploaded images before they are sent to the model
+
+Phone photos are often 12 MP or more. The model does not need that much
+detail, so images are oriented from their EXIF data, shrunk to a maximum
+edge, stripped of metadata and re-encoded as JPEG or WebP. Encoded results
+are cached by content hash and settings, so repeated generations from the
+same uploads reuse the same bytes.
+"""
+import io
+import threading
+from collections import OrderedDict, namedtuple
+
+from PIL import Image as PILImage
+from PIL import ImageOps
+
+from furnishing.response_cache import content_digest
+
+DEFAULT_MAX_EDGE = 1536
+DEFAULT_FORMAT = "JPEG"
+DEFAULT_QUALITY = 85
+
+# Output formats and their MIME types
+OUTPUT_FORMATS = {
+    "JPEG": "image/jpeg",
+    "WEBP": "image/webp",
+}
+
+PreprocessSettings = namedtuple('PreprocessSettings', ['max_edge', 'format', 'quality'])
+PreparedImage = namedtuple('PreparedImage', ['data', 'mime_type', 'size', 'original_bytes'])
+
+DEFAULT_SETTINGS = PreprocessSettings(DEFAULT_MAX_EDGE, DEFAULT_FORMAT, DEFAULT_QUALITY)
+
+# Draft renders only need enough detail for the model to see the room's layout
+DRAFT_MAX_EDGE = 512
+DRAFT_QUALITY = 70
+
+
+def draft_settings(settings):
+    """Heavily downscaled, lower-quality variant of `settings` for draft renders"""
+    return settings._replace(
+        max_edge=min(settings.max_edge, DRAFT_MAX_EDGE),
+        quality=min(settings.quality, DRAFT_QUALITY)
+    )
+
+
+def prepare_image(data, settings=DEFAULT_SETTINGS):
+    """Orient, downscale, strip metadata and re-encode one image
+
+    Returns a PreparedImage with the encoded bytes, their MIME type, the
+    output size and the size of the original upload.
+    """
+    if settings.format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unsupported output format: {settings.format}")
+
+    image = PILImage.open(io.BytesIO(data))
+    # Let the JPEG decoder skip detail we are about to throw away
+    image.draft("RGB", (settings.max_edge, settings.max_edge))
+    image = ImageOps.exif_transpose(image)
+
+    if image.mode in ("RGBA", "LA", "P"):
+        # Flatten transparency onto white; neither output needs an alpha channel
+        image = image.convert("RGBA")
+        background = PILImage.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+    elif image.mode != "RGB":
+        image = image.convert("RGB")
+
+    image.thumbnail((settings.max_edge, settings.max_edge), PILImage.LANCZOS)
+
+    # Saving without exif/icc arguments drops all metadata
+    buffer = io.BytesIO()
+    image.save(buffer, format=settings.format, quality=settings.quality, optimize=True)
+    return PreparedImage(buffer.getvalue(), OUTPUT_FORMATS[settings.format], image.size, len(data))
+
+
+class PreprocessCache:
+    """Thread-safe LRU of prepared images keyed by content hash and settings"""
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def prepare(self, data, settings=DEFAULT_SETTINGS, digest=None):
+        """Return the PreparedImage for `data`, encoding it only on the first request"""
+        key = (digest or content_digest(data), settings)
+        with self._lock:
+            prepared = self._entries.get(key)
+            if prepared is not None:
+                self._entries.move_to_end(key)
+                return prepared
+
+        prepared = prepare_image(data, settings)
+        with self._lock:
+            self._entries[key] = prepared
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return prepared
@@ -0,0 +1,139 @@
+"""Background job queue for generations
+
+A JobQueue runs submitted functions on a bounded worker pool, outside the
+Streamlit script thread, so a rerun (any click while a generation is in
+flight) neither cancels a request that is already paid for nor holds a
+script thread for the length of a model call. Callers keep the job id and
+poll `get()` for its status, latest progress and result.
+
+A job function is called with one keyword argument, `on_update`: whatever
+it passes to that callable becomes the job's `progress`, e.g. a streamed
+response as it grows or the variations finished so far. The engine's
+generate(), preview() and edit() fit this directly through
+functools.partial.
+
+Submitting with the idempotency `key` of a job that is still queued or
+running returns that job's id instead of starting another one, so a double
+click starts a single generation.
+"""
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+DEFAULT_WORKERS = 8
+# Finished jobs nobody collected (e.g. the browser tab was closed) are dropped after this long
+DEFAULT_RETENTION_SECONDS = 30 * 60
+
+
+class Job:
+    """One submitted job; fields are written by the worker and read by pollers"""
+
+    __slots__ = ("id", "key", "label", "status", "submitted", "started", "finished", "progress", "result", "error")
+
+    def __init__(self, job_id, key, label, submitted):
+        self.id = job_id
+        self.key = key
+        self.label = label
+        self.status = QUEUED
+        self.submitted = submitted
+        self.started = None
+        self.finished = None
+        self.progress = None
+        self.result = None
+        self.error = None
+
+    @property
+    def done(self):
+        return self.status in (DONE, FAILED)
+
+
+class JobQueue:
+    """Thread-safe job registry in front of a ThreadPoolExecutor"""
+
+    def __init__(self, max_workers=DEFAULT_WORKERS, retention=DEFAULT_RETENTION_SECONDS, clock=time.time):
+        self.max_workers = max_workers
+        self.retention = retention
+        self._clock = clock
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="furnishing-job")
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._active_keys = {}
+
+    def submit(self, fn, key=None, label=""):
+        """Run `fn(on_update=...)` on a worker and return the job id
+
+        With a `key` matching a queued or running job, nothing new is
+        started and that job's id is returned.
+        """
+        with self._lock:
+            self._prune()
+            if key is not None and key in self._active_keys:
+                return self._active_keys[key]
+            job = Job(uuid.uuid4().hex, key, label, self._clock())
+            self._jobs[job.id] = job
+            if key is not None:
+                self._active_keys[key] = job.id
+        self._executor.submit(self._run, job, fn)
+        return job.id
+
+    def _run(self, job, fn):
+        with self._lock:
+            job.status = RUNNING
+            job.started = self._clock()
+
+        def report(progress):
+            job.progress = progress
+
+        result = error = None
+        try:
+            result = fn(on_update=report)
+        except Exception as e:
+            error = e
+        except BaseException as e:
+            # KeyboardInterrupt, SystemExit, Streamlit's StopException: the job still
+            # has to end, or its key would hand every resubmit a job that never finishes
+            error = e
+            raise
+        finally:
+            with self._lock:
+                job.result = result
+                job.error = error
+                job.status = FAILED if error is not None else DONE
+                job.finished = self._clock()
+                if job.key is not None and self._active_keys.get(job.key) == job.id:
+                    del self._active_keys[job.key]
+
+    def get(self, job_id):
+        """The Job with this id, or None once it was forgotten or pruned"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def forget(self, job_id):
+        """Drop a job whose result was collected, freeing its result"""
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+            if job is not None and job.key is not None and self._active_keys.get(job.key) == job_id:
+                del self._active_keys[job.key]
+
+    def stats(self):
+        """Counts of known jobs by status"""
+        with self._lock:
+            counts = dict.fromkeys((QUEUED, RUNNING, DONE, FAILED), 0)
+            for job in self._jobs.values():
+                counts[job.status] += 1
+        return counts
+
+    def _prune(self):
+        cutoff = self._clock() - self.retention
+        expired = [job_id for job_id, job in self._jobs.items() if job.done and job.finished < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,159 @@
+"""Lightweight stage timings, payload sizes and counters
+
+A Metrics object keeps the last `window` samples of every named
+observation (stage durations in seconds, payload sizes in bytes) for
+percentiles, running totals for export, and plain counters. Names carry
+their unit, Prometheus-style: `model_seconds`, `upload_bytes`.
+
+When `enabled` is False, `timer()` hands back a shared no-op context
+manager and `observe()`/`increment()` return at once, so instrumented
+code pays one attribute check per call site.
+"""
+import json
+import threading
+import time
+from collections import deque, namedtuple
+
+DEFAULT_WINDOW = 500
+
+Summary = namedtuple('Summary', ['count', 'total', 'p50', 'p95', 'max'])
+
+
+def percentile(sorted_values, fraction):
+    """Linearly interpolated percentile of an already sorted, non-empty list"""
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ("_metrics", "_name", "_started")
+
+    def __init__(self, metrics, name):
+        self._metrics = metrics
+        self._name = name
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._metrics.observe(self._name, time.perf_counter() - self._started)
+        return False
+
+
+class _Series:
+    __slots__ = ("samples", "count", "total")
+
+    def __init__(self, window):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+
+class Metrics:
+    """Thread-safe metrics registry; `event_log` appends every observation as a JSON line"""
+
+    def __init__(self, enabled=True, window=DEFAULT_WINDOW, event_log=None):
+        self.enabled = enabled
+        self.window = window
+        self._lock = threading.Lock()
+        self._series = {}
+        self._counters = {}
+        self._event_log = open(event_log, "a", encoding="utf-8", buffering=1) if event_log else None
+
+    def timer(self, name):
+        """Context manager recording the duration of its block as `name`"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def observe(self, name, value):
+        """Record one sample, e.g. a duration in seconds or a size in bytes"""
+        if not self.enabled:
+            return
+        with self._lock:
+            series = self._series.get(name)
+            if series is None:
+                series = self._series[name] = _Series(self.window)
+            series.samples.append(value)
+            series.count += 1
+            series.total += value
+            if self._event_log:
+                self._event_log.write(json.dumps({'time': time.time(), 'name': name, 'value': value}) + "\n")
+
+    def increment(self, name, amount=1):
+        """Add to a counter, e.g. cache hits"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def counters(self):
+        with self._lock:
+            return dict(self._counters)
+
+    def summary(self):
+        """{name: Summary} with percentiles over the last `window` samples, sorted by name"""
+        with self._lock:
+            snapshot = [(name, series.count, series.total, sorted(series.samples))
+                        for name, series in sorted(self._series.items())]
+        return {
+            name: Summary(count, total, percentile(samples, 0.5), percentile(samples, 0.95), samples[-1])
+            for name, count, total, samples in snapshot
+        }
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+            self._counters.clear()
+
+    def to_jsonl(self):
+        """Current summaries and counters, one JSON object per line"""
+        now = time.time()
+        lines = [
+            json.dumps({'time': now, 'name': name, **summary._asdict()})
+            for name, summary in self.summary().items()
+        ]
+        lines += [
+            json.dumps({'time': now, 'name': name, 'count': value})
+            for name, value in sorted(self.counters().items())
+        ]
+        return "".join(line + "\n" for line in lines)
+
+    def to_prometheus(self, prefix="room_furnishing"):
+        """Prometheus text exposition format: a summary per observation, a counter per counter"""
+        lines = []
+        for name, summary in self.summary().items():
+            metric = f"{prefix}_{name}"
+            lines.append(f"# TYPE {metric} summary")
+            lines.append(f'{metric}{{quantile="0.5"}} {summary.p50:.6g}')
+            lines.append(f'{metric}{{quantile="0.95"}} {summary.p95:.6g}')
+            lines.append(f"{metric}_sum {summary.total:.6g}")
+            lines.append(f"{metric}_count {summary.count}")
+        for name, value in sorted(self.counters().items()):
+            metric = f"{prefix}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+    def close(self):
+        if self._event_log:
+            self._event_log.close()
+            self._event_log = None
+
+
+# Stand-in for code that was not given a Metrics object
+NULL_METRICS = Metrics(enabled=False)
@@ -0,0 +1,298 @@
+"""Color palettes of furnished rooms and an index for searching rooms by color
+
+extract_palette() decodes a furnished image straight to a thumbnail of
+PALETTE_EDGE pixels (JPEG decoding is scaled down in the decoder),
+converts it to CIE Lab and clusters the pixels: median cut gives the
+starting colors, and a few vectorized k-means steps refine them. The
+palette is its colors, sorted by how much of the image each one covers.
+
+A PaletteIndex keeps every palette in NumPy arrays (Lab colors, coverage
+and integer codes for style, room type and the session that saved the
+room) and appends records to a JSONL file that is loaded on start. A
+search computes the distances of the rooms that pass the filters with a
+few vectorized operations per palette slot, so a query over 50k rooms
+takes a few milliseconds.
+"""
+import io
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+from PIL import Image as PILImage
+
+PALETTE_EDGE = 64
+PALETTE_COLORS = 5
+KMEANS_ITERATIONS = 8
+# Colors covering less of the image than this are left out of searches
+MIN_SHARE = 0.05
+# Added to a color's distance (in Lab units) in proportion to the share of
+# the image it does not cover, so rooms dominated by a color rank first
+SHARE_PENALTY = 10.0
+DEFAULT_SEARCH_RESULTS = 12
+# Record fields stored as integer codes that searches can filter on
+FILTER_FIELDS = ('style', 'room_type', 'session')
+
+# sRGB (D65) to XYZ, and the D65 white point
+_RGB_TO_XYZ = np.array([
+    [0.4124564, 0.3575761, 0.1804375],
+    [0.2126729, 0.7151522, 0.0721750],
+    [0.0193339, 0.1191920, 0.9503041],
+], dtype=np.float32)
+_WHITE = np.array([0.95047, 1.0, 1.08883], dtype=np.float32)
+_channel = np.arange(256, dtype=np.float64) / 255
+# Linear light of every 8-bit sRGB value
+_LINEAR = np.where(_channel <= 0.04045, _channel / 12.92, ((_channel + 0.055) / 1.055) ** 2.4).astype(np.float32)
+
+# `colors` are "#rrggbb" strings, `weights` the share of the image each
+# covers and `lab` a (colors, 3) float32 array, most common color first
+Palette = namedtuple('Palette', ['colors', 'weights', 'lab'])
+
+
+def rgb_to_lab(rgb):
+    """CIE Lab of an (..., 3) uint8 sRGB array, as float32"""
+    xyz = (_LINEAR[np.asarray(rgb, dtype=np.uint8)] @ _RGB_TO_XYZ.T) / _WHITE
+    delta = 6 / 29
+    f = np.where(xyz > delta ** 3, np.cbrt(xyz), xyz / (3 * delta * delta) + 4 / 29)
+    return np.stack([
+        116 * f[..., 1] - 16,
+        500 * (f[..., 0] - f[..., 1]),
+        200 * (f[..., 1] - f[..., 2]),
+    ], axis=-1).astype(np.float32)
+
+
+def hex_to_rgb(color):
+    """(r, g, b) of a "#rrggbb" string"""
+    color = color.lstrip("#")
+    return tuple(int(color[i:i + 2], 16) for i in (0, 2, 4))
+
+
+def _load_pixels(data, edge=PALETTE_EDGE):
+    """(pixels, 3) uint8 RGB array of an image scaled to at most `edge` on its long side"""
+    image = PILImage.open(io.BytesIO(data))
+    image.draft("RGB", (edge, edge))
+    image = image.convert("RGB")
+    image.thumbnail((edge, edge), PILImage.BILINEAR, reducing_gap=2.0)
+    return np.asarray(image, dtype=np.uint8).reshape(-1, 3)
+
+
+def _median_cut(lab, count):
+    """Up to `count` starting colors: split the box with the largest squared error at its median"""
+    boxes = [np.arange(len(lab))]
+    while len(boxes) < count:
+        errors = [((lab[box] - lab[box].mean(axis=0)) ** 2).sum() if len(box) > 1 else 0.0 for box in boxes]
+        largest = int(np.argmax(errors))
+        if errors[largest] == 0:
+            break
+        box = boxes.pop(largest)
+        values = lab[box]
+        axis = int(np.argmax(values.var(axis=0)))
+        order = np.argsort(values[:, axis], kind="stable")
+        middle = len(box) // 2
+        boxes += [box[order[:middle]], box[order[middle:]]]
+    return np.array([lab[box].mean(axis=0) for box in boxes], dtype=np.float32)
+
+
+def _kmeans(lab, centers, iterations=KMEANS_ITERATIONS):
+    """Refine `centers` with Lloyd steps; returns (centers, label of every pixel)"""
+    squared = (lab * lab).sum(axis=1)[:, None]
+    labels = None
+    for _ in range(iterations):
+        # |x - c|^2 = |x|^2 - 2 x.c + |c|^2 as one matrix product
+        distances = squared - 2 * lab @ centers.T + (centers * centers).sum(axis=1)
+        new_labels = distances.argmin(axis=1)
+        if labels is not None and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        counts = np.bincount(labels, minlength=len(centers))
+        sums = np.stack([np.bincount(labels, lab[:, i], len(centers)) for i in range(3)], axis=1)
+        # An emptied cluster keeps its previous center
+        filled = counts > 0
+        centers[filled] = (sums[filled] / counts[filled, None]).astype(np.float32)
+    return centers, labels
+
+
+def extract_palette(data, colors=PALETTE_COLORS):
+    """Palette of the `colors` dominant colors of an encoded image
+
+    Flat images can come out with fewer colors.
+    """
+    rgb = _load_pixels(data)
+    lab = rgb_to_lab(rgb)
+    centers, labels = _kmeans(lab, _median_cut(lab, colors))
+    counts = np.bincount(labels, minlength=len(centers))
+    # Swatches show the mean sRGB of each cluster's pixels
+    mean_rgb = np.stack([np.bincount(labels, rgb[:, i], len(centers)) for i in range(3)], axis=1)
+    order = [i for i in np.argsort(-counts, kind="stable") if counts[i]]
+    return Palette(
+        colors=["#%02x%02x%02x" % tuple(int(round(v)) for v in mean_rgb[i] / counts[i]) for i in order],
+        weights=[float(counts[i] / len(labels)) for i in order],
+        lab=centers[order]
+    )
+
+
+def palette_from_colors(colors, weights=None):
+    """Palette of given "#rrggbb" colors, e.g. a paint sample; equal weights unless given"""
+    weights = weights or [1 / len(colors)] * len(colors)
+    return Palette(list(colors), list(weights), rgb_to_lab(np.array([hex_to_rgb(color) for color in colors])))
+
+
+def _grown(array, capacity):
+    """Copy of `array` with its room axis (the last for 1D and 2D, the middle for 3D) grown to `capacity`"""
+    axis = 1 if array.ndim == 3 else array.ndim - 1
+    shape = list(array.shape)
+    shape[axis] = capacity
+    grown = np.zeros(shape, dtype=array.dtype)
+    grown[(slice(None),) * axis + (slice(0, array.shape[axis]),)] = array
+    return grown
+
+
+class PaletteIndex:
+    """Thread-safe in-memory index of room palettes with style and room type filters, optionally persisted to JSONL"""
+
+    def __init__(self, path=None, colors=PALETTE_COLORS):
+        self.path = path
+        self.colors = colors
+        self._lock = threading.Lock()
+        self._records = []
+        # Stored color-major: [k] holds every room's k-th color, so a search
+        # works on contiguous arrays one palette slot at a time
+        self._lab = np.zeros((colors, 0, 3), dtype=np.float32)
+        self._squared = np.zeros((colors, 0), dtype=np.float32)
+        self._penalty = np.zeros((colors, 0), dtype=np.float32)
+        self._filters = {field: np.zeros(0, dtype=np.int32) for field in FILTER_FIELDS}
+        self._alive = np.zeros(0, dtype=bool)
+        self._codes = {field: {} for field in FILTER_FIELDS}
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._load()
+
+    def __len__(self):
+        return int(np.count_nonzero(self._alive[:len(self._records)]))
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A process killed mid-write can leave a partial last line
+                        continue
+                    self._append(record)
+        except FileNotFoundError:
+            pass
+
+    def _code(self, field, value):
+        codes = self._codes[field]
+        return codes.setdefault(value, len(codes))
+
+    def _append(self, record):
+        """Add a record to the arrays, doubling their capacity when full"""
+        row = len(self._records)
+        if row == len(self._alive):
+            capacity = max(2 * row, 1024)
+            self._lab, self._squared, self._penalty, self._alive = (
+                _grown(array, capacity) for array in (self._lab, self._squared, self._penalty, self._alive)
+            )
+            self._filters = {field: _grown(codes, capacity) for field, codes in self._filters.items()}
+        count = min(len(record['lab']), self.colors)
+        lab = np.zeros((self.colors, 3), dtype=np.float32)
+        lab[:count] = record['lab'][:count]
+        weights = np.zeros(self.colors, dtype=np.float32)
+        weights[:count] = record['weights'][:count]
+        self._lab[:, row] = lab
+        self._squared[:, row] = (lab * lab).sum(axis=1)
+        # Padding and barely visible colors never match
+        self._penalty[:, row] = np.where(weights >= MIN_SHARE, SHARE_PENALTY * (1 - weights), np.inf)
+        for field, codes in self._filters.items():
+            # Records from before sessions were stored belong to no session
+            codes[row] = self._code(field, record.get(field))
+        self._alive[row] = True
+        self._records.append(record)
+
+    def add(self, palette, style, room_type, session, **fields):
+        """Index a palette of a room furnished in `session`; `fields` (e.g. where the result lives) are stored with it"""
+        record = {
+            'colors': palette.colors,
+            'weights': [round(float(weight), 4) for weight in palette.weights],
+            'lab': [[round(float(value), 2) for value in color] for color in palette.lab],
+            'style': style,
+            'room_type': room_type,
+            'session': session,
+            'time': time.time(),
+            **fields
+        }
+        with self._lock:
+            self._append(record)
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record) + "\n")
+        return record
+
+    def _distances(self, rows, query):
+        """Distance of every room in `rows` (a slice or index array) to a query palette
+
+        That is the weighted mean, over the query's colors, of each one's
+        distance to the room's nearest significant color.
+        """
+        lab = np.asarray(query.lab, dtype=np.float32)
+        weights = np.asarray(query.weights, dtype=np.float32)
+        # |c - q|^2 = |c|^2 - 2 c.q + |q|^2, the middle term as a matrix product per palette slot
+        scaled, query_squared = -2 * lab.T, (lab * lab).sum(axis=1)
+        nearest = None
+        for k in range(self.colors):
+            distances = self._lab[k, rows] @ scaled
+            distances += self._squared[k, rows][:, None]
+            distances += query_squared
+            np.sqrt(np.maximum(distances, 0, out=distances), out=distances)
+            distances += self._penalty[k, rows][:, None]
+            nearest = distances if nearest is None else np.minimum(nearest, distances, out=nearest)
+        return nearest @ (weights / weights.sum())
+
+    def search(self, query, style=None, room_type=None, session=None, limit=DEFAULT_SEARCH_RESULTS,
+               is_available=None):
+        """Rooms whose palettes are closest to the `query` Palette, as (distance, record), closest first
+
+        `style`, `room_type` and `session` restrict the results to one value
+        each; callers showing results to a user should pass their session.
+        `is_available(record)`, if given, filters out records whose result
+        is gone (e.g. swept from disk); those are skipped from then on.
+        """
+        with self._lock:
+            count = len(self._records)
+            mask = self._alive[:count].copy()
+            filters = {'style': style, 'room_type': room_type, 'session': session}
+            for field, value in filters.items():
+                if value is not None:
+                    if value not in self._codes[field]:
+                        return []
+                    mask &= self._filters[field][:count] == self._codes[field][value]
+            if all(value is None for value in filters.values()):
+                # Scoring every room through a slice avoids copying the arrays
+                distances = self._distances(slice(0, count), query)
+                rows = np.flatnonzero(mask)
+                distances = distances[rows] if len(rows) < count else distances
+            else:
+                rows = np.flatnonzero(mask)
+                distances = self._distances(rows, query)
+            records = self._records
+
+        results = []
+        while len(results) < limit and len(rows):
+            count = min(limit - len(results), len(rows))
+            nearest = np.argpartition(distances, count - 1)[:count]
+            nearest = nearest[np.argsort(distances[nearest], kind="stable")]
+            for position in nearest:
+                record = records[rows[position]]
+                if is_available and not is_available(record):
+                    with self._lock:
+                        self._alive[rows[position]] = False
+                    continue
+                results.append((float(distances[position]), record))
+            keep = np.ones(len(rows), dtype=bool)
+            keep[nearest] = False
+            rows, distances = rows[keep], distances[keep]
+        return results
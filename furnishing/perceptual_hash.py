@@ -0,0 +1,148 @@
+"""Perceptual hashes of room photos and fast Hamming-distance lookup
+
+aHash, dHash and pHash are 64-bit fingerprints that change little when a
+photo is re-exported, lightly cropped or saved at a different JPEG
+quality, so near-duplicate rooms can be found by Hamming distance.
+MultiIndexHash answers "all hashes within distance r" without scanning
+every stored hash: each hash is split into chunks and, by the pigeonhole
+principle, any hash within r differs from the query in at most r // chunks
+bits of some chunk, so only those chunk buckets need checking.
+"""
+import io
+from collections import namedtuple
+from itertools import combinations
+
+import numpy as np
+from PIL import Image as PILImage
+from PIL import ImageOps
+
+HASH_BITS = 64
+
+RoomHashes = namedtuple('RoomHashes', ['ahash', 'dhash', 'phash'])
+
+
+def _dct_matrix(n):
+    """Orthonormal DCT-II matrix, so the 2-D DCT of X is D @ X @ D.T"""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+_DCT_32 = _dct_matrix(32)
+
+
+def _bits_to_int(bits):
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+
+def _resize(gray, size):
+    return np.asarray(gray.resize(size, PILImage.LANCZOS), dtype=np.float64)
+
+
+def average_hash(gray):
+    """aHash: 8x8 pixels above the mean"""
+    pixels = _resize(gray, (8, 8))
+    return _bits_to_int(pixels > pixels.mean())
+
+
+def difference_hash(gray):
+    """dHash: whether each pixel of a 9x8 image is brighter than its right neighbour"""
+    pixels = _resize(gray, (9, 8))
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+def perceptual_hash(gray):
+    """pHash: low 8x8 DCT coefficients of a 32x32 image above their median"""
+    pixels = _resize(gray, (32, 32))
+    low = (_DCT_32 @ pixels @ _DCT_32.T)[:8, :8]
+    # The DC term only tracks overall brightness; leave it out of the median
+    median = np.median(low.ravel()[1:])
+    return _bits_to_int(low > median)
+
+
+def grayscale(data):
+    """Decode image bytes to a small, EXIF-oriented grayscale PIL image"""
+    image = PILImage.open(io.BytesIO(data))
+    # JPEG decoders can skip straight to a reduced scale
+    image.draft("L", (128, 128))
+    image = ImageOps.exif_transpose(image)
+    image = image.convert("L")
+    image.thumbnail((128, 128), PILImage.BILINEAR)
+    return image
+
+
+def room_hashes(data):
+    """aHash, dHash and pHash of encoded image bytes"""
+    gray = grayscale(data)
+    return RoomHashes(average_hash(gray), difference_hash(gray), perceptual_hash(gray))
+
+
+def hamming(a, b):
+    """Number of differing bits between two integer hashes"""
+    return (a ^ b).bit_count()
+
+
+class MultiIndexHash:
+    """Multi-index hashing over 64-bit integer hashes
+
+    Each hash is split into `chunks` equal slices with one dict per slice.
+    A radius-r search probes, in every slice table, all slice values within
+    r // chunks bits of the query's slice, then verifies full distances.
+    With 4 chunks, radius 8 probes about 550 buckets instead of
+    scanning every stored hash.
+    """
+
+    def __init__(self, chunks=4, bits=HASH_BITS):
+        if bits % chunks:
+            raise ValueError("bits must divide evenly into chunks")
+        self.chunks = chunks
+        self.chunk_bits = bits // chunks
+        self._mask = (1 << self.chunk_bits) - 1
+        self._tables = [{} for _ in range(chunks)]
+        self._hashes = []
+        self._items = []
+        self._masks = {}
+
+    def __len__(self):
+        return len(self._items)
+
+    def _slices(self, value):
+        return [(value >> (i * self.chunk_bits)) & self._mask for i in range(self.chunks)]
+
+    def _flip_masks(self, radius):
+        """XOR masks turning a chunk value into every value within `radius` bits"""
+        masks = self._masks.get(radius)
+        if masks is None:
+            masks = [0]
+            for flips in range(1, radius + 1):
+                for positions in combinations(range(self.chunk_bits), flips):
+                    masks.append(sum(1 << position for position in positions))
+            self._masks[radius] = masks
+        return masks
+
+    def add(self, value, item):
+        """Index `item` under a hash value"""
+        index = len(self._items)
+        self._hashes.append(value)
+        self._items.append(item)
+        for table, chunk_value in zip(self._tables, self._slices(value)):
+            table.setdefault(chunk_value, []).append(index)
+
+    def search(self, value, radius):
+        """Return [(distance, item)] for every stored hash within `radius`, closest first"""
+        masks = self._flip_masks(radius // self.chunks)
+        seen = set()
+        matches = []
+        for table, chunk_value in zip(self._tables, self._slices(value)):
+            for mask in masks:
+                for index in table.get(chunk_value ^ mask, ()):
+                    if index in seen:
+                        continue
+                    seen.add(index)
+                    distance = hamming(value, self._hashes[index])
+                    if distance <= radius:
+                        matches.append((distance, index))
+        matches.sort()
+        return [(distance, self._items[index]) for distance, index in matches]
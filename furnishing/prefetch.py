@@ -0,0 +1,237 @@
+"""Speculative prefetch of the preferences a user is likely to try next
+
+After a single-style generation, users usually try a neighbouring style or
+color scheme with everything else unchanged. TransitionStats counts which
+(style, color_scheme) choice followed which in single-style requests, over
+all sessions; likely_next() ranks the candidates after a choice by those
+counts and falls back to the options next to the current ones in the
+selectbox lists while little has been observed.
+
+A Prefetcher generates the top candidates on its own small worker pool so
+their responses are in the response cache before anyone asks for them.
+Every session has a budget of prefetched model requests; prefetches that
+turn out to be cache hits cost nothing and are refunded. Results are only
+kept in the response cache.
+
+When the user then asks for a prefetched request, claim() returns the
+prefetch's future, so a request whose prefetch is still in flight waits
+for it instead of paying for the same response twice. Once the request
+has its result, consume() counts a hit if the prefetch succeeded and the
+result came from its cached response. The hit rate (hits per prefetch
+that reached the model) tells whether prefetching pays off.
+
+Sessions that have not submitted or claimed anything for `idle_timeout`
+seconds, and have nothing in flight, are forgotten along with their
+budget, so the bookkeeping does not grow with every session ever seen.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_CANDIDATES = 2
+DEFAULT_SESSION_BUDGET = 10
+DEFAULT_WORKERS = 2
+# Prefetches remembered per session for claim(); older ones are still in the response cache
+MAX_REMEMBERED = 16
+# Sessions idle for this long are forgotten; idle sessions are looked for at most this often
+DEFAULT_IDLE_TIMEOUT = 60 * 60
+PRUNE_INTERVAL = 60
+
+
+def neighbours(choice, styles, color_schemes):
+    """Choices one selectbox step away from `choice`: the previous and next style, then color scheme"""
+    style, color_scheme = choice
+    found = []
+    for options, position in ((styles, 0), (color_schemes, 1)):
+        if choice[position] not in options:
+            continue
+        index = options.index(choice[position])
+        for step in (1, -1):
+            if 0 <= index + step < len(options):
+                found.append((options[index + step], color_scheme) if position == 0 else (style, options[index + step]))
+    return found
+
+
+class TransitionStats:
+    """Thread-safe counts of (style, color_scheme) transitions, optionally persisted to JSONL"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._next = {}  # choice -> {following choice: count}
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A process killed mid-write can leave a partial last line
+                        continue
+                    self._count(tuple(record['from']), tuple(record['to']))
+        except FileNotFoundError:
+            pass
+
+    def _count(self, previous, current):
+        following = self._next.setdefault(previous, {})
+        following[current] = following.get(current, 0) + 1
+
+    def record(self, previous, current):
+        """Count one session moving from the `previous` choice to `current`"""
+        if previous == current:
+            return
+        with self._lock:
+            self._count(previous, current)
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({'from': list(previous), 'to': list(current)}) + "\n")
+
+    def likely_next(self, choice, styles, color_schemes, count=DEFAULT_CANDIDATES):
+        """Up to `count` choices most likely to follow `choice`, best first
+
+        Observed transitions rank by how often they happened; the
+        neighbouring options fill in behind them.
+        """
+        with self._lock:
+            candidates = dict(self._next.get(choice, {}))
+        for neighbour in neighbours(choice, styles, color_schemes):
+            candidates.setdefault(neighbour, 0)
+        # sorted() is stable, so equally frequent choices keep the neighbour order
+        ranked = sorted(candidates, key=lambda candidate: -candidates[candidate])
+        return ranked[:count]
+
+
+class Prefetcher:
+    """Low-priority background generations with a per-session budget and hit counting"""
+
+    COUNTERS = ("requested", "over_budget", "generated", "cached", "cancelled", "failed", "hits")
+
+    def __init__(self, max_workers=DEFAULT_WORKERS, session_budget=DEFAULT_SESSION_BUDGET,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT, clock=time.monotonic):
+        self.session_budget = session_budget
+        self.idle_timeout = idle_timeout
+        self._clock = clock
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="furnishing-prefetch")
+        self._lock = threading.Lock()
+        self._spent = {}
+        self._prefetched = {}  # session -> OrderedDict of request key -> Future, oldest first
+        self._last_active = {}
+        self._last_prune = clock()
+        self._counters = dict.fromkeys(self.COUNTERS, 0)
+
+    def session_count(self):
+        """Sessions currently tracked"""
+        with self._lock:
+            return len(self._last_active)
+
+    def _touch_locked(self, session):
+        """Note activity for `session` and forget sessions that have gone idle"""
+        now = self._clock()
+        self._last_active[session] = now
+        if now - self._last_prune < PRUNE_INTERVAL:
+            return
+        self._last_prune = now
+        for idle in [other for other, seen in self._last_active.items() if now - seen > self.idle_timeout]:
+            # A prefetch still running would refund a budget that no longer exists
+            if any(not future.done() for future in self._prefetched.get(idle, {}).values()):
+                continue
+            del self._last_active[idle]
+            self._spent.pop(idle, None)
+            self._prefetched.pop(idle, None)
+
+    def submit(self, session, key, fn):
+        """Run `fn()` (returning a GenerationResult) in the background unless it is known or over budget
+
+        `key` identifies the request the way claim() will be asked for it.
+        Returns whether a prefetch was started.
+        """
+        with self._lock:
+            self._touch_locked(session)
+            prefetched = self._prefetched.setdefault(session, OrderedDict())
+            if key in prefetched:
+                return False
+            if self._spent.get(session, 0) >= self.session_budget:
+                self._counters['over_budget'] += 1
+                return False
+            self._spent[session] = self._spent.get(session, 0) + 1
+            self._counters['requested'] += 1
+            prefetched[key] = self._executor.submit(self._run, session, fn)
+            while len(prefetched) > MAX_REMEMBERED:
+                prefetched.popitem(last=False)
+        return True
+
+    def _run(self, session, fn):
+        try:
+            result = fn()
+        except Exception:
+            with self._lock:
+                self._counters['failed'] += 1
+            raise
+        with self._lock:
+            if result.cached:
+                # Already in the response cache: nothing was spent
+                if session in self._spent:
+                    self._spent[session] -= 1
+                self._counters['cached'] += 1
+            else:
+                self._counters['generated'] += 1
+        return result.cached
+
+    def claim(self, session, key):
+        """The future of this session's prefetch of `key`, or None
+
+        The future resolves to whether the response was already cached.
+        None is also returned for a prefetch that failed or found the
+        response already cached, and for one still waiting for a worker,
+        which is cancelled and refunded: the caller is better off generating
+        it right away. A claimed prefetch is forgotten; pass its future to
+        consume() once the request has its result.
+        """
+        with self._lock:
+            self._touch_locked(session)
+            future = self._prefetched.get(session, {}).pop(key, None)
+            if future is None:
+                return None
+            if future.cancel():
+                self._spent[session] -= 1
+                self._counters['cancelled'] += 1
+                return None
+            if future.done() and (future.exception() or future.result()):
+                return None
+        return future
+
+    def consume(self, future, result):
+        """Count a hit if the claimed prefetch `future` succeeded and `result` was served from its response
+
+        `result` is the GenerationResult of the request that claimed it.
+        Returns whether a hit was counted.
+        """
+        if not future.done() or future.cancelled() or future.exception() or future.result():
+            return False
+        if not result.cached:
+            return False
+        with self._lock:
+            self._counters['hits'] += 1
+        return True
+
+    def remaining(self, session):
+        """Prefetched model requests this session may still start"""
+        with self._lock:
+            return max(self.session_budget - self._spent.get(session, 0), 0)
+
+    def stats(self):
+        """Counters plus the hit rate: hits per prefetch that reached the model"""
+        with self._lock:
+            stats = dict(self._counters)
+        stats['hit_rate'] = stats['hits'] / stats['generated'] if stats['generated'] else 0.0
+        return stats
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
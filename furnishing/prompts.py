@@ -0,0 +1,274 @@
+"""Prompt construction for room furnishing requests
+
+Prompts are assembled from PromptTemplates compiled once at import: their
+indentation and blank-line runs are normalized away up front, so building
+a prompt is a few format calls on already compact text.
+
+Room prompts are fitted to a token budget with the rough estimate of
+estimate_tokens(). Furniture lines that do not fit are summarized in one
+line (the images themselves are still sent), and the special instructions
+are shortened only if the prompt is still too long after that.
+"""
+import math
+import re
+from collections import namedtuple
+
+# Rough Gemini tokenization: about 4 characters of English text per token
+CHARS_PER_TOKEN = 4
+# Images up to 384 px on both sides count as one tile; larger ones are tiled at 768 px
+IMAGE_TOKENS_PER_TILE = 258
+SMALL_IMAGE_EDGE = 384
+IMAGE_TILE_EDGE = 768
+
+DEFAULT_PROMPT_TOKEN_BUDGET = 512
+# Furniture descriptions are cut to this many characters in prompt lines
+MAX_DESCRIPTION_CHARS = 120
+ELLIPSIS = "..."
+
+# A fitted room prompt: `text` is sent; `base` (without the special
+# instructions) and the possibly shortened `special_instructions` go into
+# cache keys. `trimmed` tells whether anything was cut to fit the budget.
+RoomPrompt = namedtuple('RoomPrompt', ['text', 'base', 'special_instructions', 'tokens', 'trimmed'])
+
+
+def normalize_whitespace(text):
+    """Strip every line, collapse runs of spaces and blank lines, trim the ends"""
+    lines = [re.sub(r"[ \t]+", " ", line).strip() for line in text.strip().splitlines()]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines))
+
+
+def clean_text(text):
+    """User-entered text on a single line with single spaces"""
+    return " ".join((text or "").split())
+
+
+def shorten(text, max_chars):
+    """Cut text to at most max_chars on a word boundary, marking the cut with "..."."""
+    if len(text) <= max_chars:
+        return text
+    if max_chars <= len(ELLIPSIS):
+        return ""
+    cut = text[:max_chars - len(ELLIPSIS)]
+    if " " in cut:
+        cut = cut.rsplit(" ", 1)[0]
+    return cut.rstrip(" ,.;:") + ELLIPSIS
+
+
+def estimate_tokens(text):
+    """Approximate number of tokens in text"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def estimate_image_tokens(size):
+    """Approximate number of input tokens for an image of (width, height) pixels"""
+    width, height = size
+    if width <= SMALL_IMAGE_EDGE and height <= SMALL_IMAGE_EDGE:
+        return IMAGE_TOKENS_PER_TILE
+    return math.ceil(width / IMAGE_TILE_EDGE) * math.ceil(height / IMAGE_TILE_EDGE) * IMAGE_TOKENS_PER_TILE
+
+
+class PromptTemplate:
+    """Template text compiled once; `render(**values)` fills in its {fields}"""
+
+    def __init__(self, text):
+        self.text = normalize_whitespace(text)
+
+    def render(self, **values):
+        return self.text.format_map(values)
+
+
+ROOM_TEMPLATE = PromptTemplate("""
+    Transform this room into a beautifully furnished {room_type} with the following specifications:
+
+    Style: {style}
+    Color Scheme: {color_scheme}
+    Furniture Style: {furniture_style}
+    Lighting: {lighting}
+
+    Additional Requirements:
+    - Add appropriate furniture for a {room_type}
+    - Maintain the room's architectural features and layout
+    - Ensure the furniture fits the space proportionally
+    - Create a cohesive design that matches the {style} style
+    - Use {color_scheme} colors throughout
+    - Add {lighting} lighting elements
+    """)
+ADDITIONAL_ITEMS_LINE = PromptTemplate("- Include these specific items: {items}")
+FURNITURE_HEADER = PromptTemplate("""
+    IMPORTANT: The user has uploaded specific furniture/accessory images that they want to see in this room.
+    Please integrate these items naturally into the room design:
+    """)
+FURNITURE_LINE = PromptTemplate("- Furniture Item {number}: {description} (from uploaded image)")
+FURNITURE_SUMMARY_LINE = PromptTemplate(
+    "- Furniture Items {first}-{last}: {count} uploaded items shown in the remaining images"
+)
+FURNITURE_FOOTER = PromptTemplate("""
+    - Make sure these uploaded items are prominently featured and well-integrated into the overall design
+    - Adjust the room's color scheme and other elements to complement these specific furniture pieces
+    """)
+ROOM_CLOSING = PromptTemplate("""
+    Make the room look realistic, lived-in, and professionally designed. Ensure all furniture and decor items
+    are appropriate for the space and create a harmonious, inviting atmosphere.
+    """)
+SPECIAL_INSTRUCTIONS = PromptTemplate("Special Instructions: {instructions}")
+# Added when a result is generated again because the room's architecture drifted
+STRUCTURE_REMINDER = PromptTemplate("""
+    Keep the walls, windows, doors, ceiling and floor exactly where they are in the photo and keep the same
+    camera angle; only add furniture, decor and lighting.
+    """)
+
+DRAFT_TEMPLATE = PromptTemplate(
+    "Furnish this room as a {room_type}: {style} style, {color_scheme} colors, {furniture_style} furniture, "
+    "{lighting} lighting. Keep the room's architecture and layout."
+)
+DRAFT_ITEMS = PromptTemplate("Include: {items}.")
+DRAFT_FURNITURE = PromptTemplate("Feature the uploaded items: {descriptions}.")
+DRAFT_FURNITURE_SUMMARY = PromptTemplate("{count} items shown in the remaining images")
+
+PREVIEW_TEMPLATE = PromptTemplate("""
+    Create a {room_type} in {style} style featuring the uploaded furniture items.
+    Make sure the uploaded furniture is prominently displayed and well-integrated into the room design.
+    The room should showcase how these specific furniture pieces look in a {style} {room_type}.
+    """)
+EDIT_TEMPLATE = PromptTemplate("""
+    Edit this furnished room image: {instruction}
+    Change only what this instruction asks for. Keep the layout, furniture placement, camera angle,
+    lighting and every other detail of the room exactly as they are.
+    """)
+
+
+def _specification(preferences):
+    return {
+        'room_type': preferences.get('room_type', 'living room'),
+        'style': preferences.get('style', 'modern'),
+        'color_scheme': preferences.get('color_scheme', 'neutral'),
+        'furniture_style': preferences.get('furniture_style', 'contemporary'),
+        'lighting': preferences.get('lighting', 'natural'),
+    }
+
+
+def _descriptions(uploaded_furniture_images):
+    return [
+        shorten(clean_text(furniture_data['description']), MAX_DESCRIPTION_CHARS)
+        for furniture_data in uploaded_furniture_images or []
+    ]
+
+
+def _room_prompt(preferences, descriptions, shown):
+    """Full room prompt listing the first `shown` furniture descriptions and summarizing the rest"""
+    specification = ROOM_TEMPLATE.render(**_specification(preferences))
+    additional_items = preferences.get('additional_items', [])
+    if additional_items:
+        specification += "\n" + ADDITIONAL_ITEMS_LINE.render(items=", ".join(additional_items))
+    sections = [specification]
+
+    if descriptions:
+        lines = [FURNITURE_HEADER.text]
+        lines += [
+            FURNITURE_LINE.render(number=i + 1, description=description)
+            for i, description in enumerate(descriptions[:shown])
+        ]
+        if shown < len(descriptions):
+            lines.append(FURNITURE_SUMMARY_LINE.render(
+                first=shown + 1, last=len(descriptions), count=len(descriptions) - shown
+            ))
+        lines.append(FURNITURE_FOOTER.text)
+        sections.append("\n".join(lines))
+
+    sections.append(ROOM_CLOSING.text)
+    return "\n\n".join(sections)
+
+
+def _draft_prompt(preferences, descriptions, shown):
+    """Compact draft prompt listing the first `shown` furniture descriptions"""
+    sentences = [DRAFT_TEMPLATE.render(**_specification(preferences))]
+    additional_items = preferences.get('additional_items', [])
+    if additional_items:
+        sentences.append(DRAFT_ITEMS.render(items=", ".join(additional_items)))
+    if descriptions:
+        listed = descriptions[:shown]
+        if shown < len(descriptions):
+            listed.append(DRAFT_FURNITURE_SUMMARY.render(count=len(descriptions) - shown))
+        sentences.append(DRAFT_FURNITURE.render(descriptions="; ".join(listed)))
+    return " ".join(sentences)
+
+
+def create_room_prompt(preferences, uploaded_furniture_images=None):
+    """Create a detailed prompt based on user preferences and uploaded furniture"""
+    descriptions = _descriptions(uploaded_furniture_images)
+    return _room_prompt(preferences, descriptions, len(descriptions))
+
+
+def create_draft_prompt(preferences, uploaded_furniture_images=None):
+    """Create the compact prompt used for quick, low-resolution draft renders"""
+    descriptions = _descriptions(uploaded_furniture_images)
+    return _draft_prompt(preferences, descriptions, len(descriptions))
+
+
+def add_special_instructions(prompt, special_instructions):
+    """Append the user's special instructions to a prompt"""
+    special_instructions = clean_text(special_instructions)
+    if special_instructions:
+        prompt += "\n\n" + SPECIAL_INSTRUCTIONS.render(instructions=special_instructions)
+    return prompt
+
+
+def fit_room_prompt(preferences, uploaded_furniture_images=None, token_budget=DEFAULT_PROMPT_TOKEN_BUDGET,
+                    draft=False, structure_reminder=False):
+    """Room prompt with the preferences' special instructions, fitted to `token_budget`
+
+    Furniture lines are dropped from the end (and summarized) until the
+    prompt fits; if it still does not, the special instructions are
+    shortened. The room specification itself is never cut, so a very small
+    budget can still be exceeded. A `token_budget` of None disables fitting.
+
+    With `structure_reminder`, STRUCTURE_REMINDER is appended to the room
+    prompt, within the same budget.
+    """
+    build = _draft_prompt if draft else _room_prompt
+    descriptions = _descriptions(uploaded_furniture_images)
+    special_instructions = clean_text(preferences.get('special_instructions'))
+
+    def fitted(shown, instructions):
+        base = build(preferences, descriptions, shown)
+        if structure_reminder:
+            base += "\n\n" + STRUCTURE_REMINDER.text
+        text = add_special_instructions(base, instructions)
+        return RoomPrompt(
+            text, base, instructions, estimate_tokens(text),
+            shown < len(descriptions) or instructions != special_instructions
+        )
+
+    prompt = fitted(len(descriptions), special_instructions)
+    if token_budget is None or prompt.tokens <= token_budget:
+        return prompt
+
+    # Summarize furniture lines first: the model still sees every uploaded image.
+    # Binary search for the most lines that fit (fewer lines, shorter prompt)
+    low, high = 0, len(descriptions) - 1
+    while low < high:
+        middle = (low + high + 1) // 2
+        if fitted(middle, special_instructions).tokens <= token_budget:
+            low = middle
+        else:
+            high = middle - 1
+    prompt = fitted(low, special_instructions)
+    if prompt.tokens <= token_budget:
+        return prompt
+
+    # Then shorten the special instructions to whatever room is left
+    if special_instructions:
+        overhead = len(prompt.text) - len(special_instructions)
+        instructions = shorten(special_instructions, token_budget * CHARS_PER_TOKEN - overhead)
+        prompt = fitted(0, instructions)
+    return prompt
+
+
+def create_preview_prompt(room_type, style):
+    """Create the short prompt used by the furniture preview"""
+    return PREVIEW_TEMPLATE.render(room_type=room_type, style=style)
+
+
+def create_edit_prompt(instruction):
+    """Create the short prompt that refines an already furnished room"""
+    return EDIT_TEMPLATE.render(instruction=clean_text(instruction))
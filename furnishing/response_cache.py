@@ -0,0 +1,204 @@
+"""Persistent, content-addressed cache of generate_content responses
+
+Entries are keyed by a hash of everything that determines the output (room
+image, furniture images and descriptions, prompt, special instructions and
+model) and stored on disk as the returned image bytes plus a small JSON file
+with the response text. The cache is bounded by total size and evicts the
+least recently used entries first.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Default on-disk budget for cached responses
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def content_digest(data):
+    """Return the SHA-256 hex digest of some bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def make_cache_key(room_digest, furniture_items, prompt, special_instructions, model_id, preprocess_settings=None):
+    """Build a cache key for one generation request
+
+    `furniture_items` is a list of (image_digest, description) pairs in the
+    order the images are sent to the model. The digests are of the uploads,
+    so `preprocess_settings` (the PreprocessSettings the images were sent
+    with) must be given for results made from the same uploads at another
+    size, format or quality to be told apart.
+    """
+    h = hashlib.sha256()
+
+    def add(value):
+        data = (value or "").encode("utf-8")
+        # Length-prefix every field so adjacent values cannot run together
+        h.update(len(data).to_bytes(8, "big"))
+        h.update(data)
+
+    add(model_id)
+    add(room_digest)
+    add(str(len(furniture_items)))
+    for image_digest, description in furniture_items:
+        add(image_digest)
+        add(description)
+    add(prompt)
+    add(special_instructions)
+    if preprocess_settings is not None:
+        add(json.dumps(list(preprocess_settings)))
+    return h.hexdigest()
+
+
+class CachedImage:
+    """Mirrors the `image_bytes` attribute of the SDK's image type"""
+
+    def __init__(self, image_bytes, mime_type):
+        self.image_bytes = image_bytes
+        self.mime_type = mime_type
+
+
+class CachedPart:
+    """Response part rebuilt from a cache entry"""
+
+    def __init__(self, text=None, image=None):
+        self.text = text
+        self._image = image
+
+    def as_image(self):
+        return self._image
+
+
+class CachedResponse:
+    """Response object with the same `parts` interface as GenerateContentResponse"""
+
+    def __init__(self, text, image_bytes, mime_type="image/png", from_cache=False):
+        self.parts = []
+        if text:
+            self.parts.append(CachedPart(text=text))
+        if image_bytes:
+            self.parts.append(CachedPart(image=CachedImage(image_bytes, mime_type)))
+        self.from_cache = from_cache
+
+
+def _extract_response(response):
+    """Return (text, image_bytes, mime_type) from a model response"""
+    texts = []
+    image_bytes = None
+    mime_type = "image/png"
+    for part in response.parts or []:
+        if part.text:
+            texts.append(part.text)
+        elif image_bytes is None and (image := part.as_image()):
+            image_bytes = image.image_bytes
+            mime_type = getattr(image, "mime_type", None) or mime_type
+    return "\n\n".join(texts), image_bytes, mime_type
+
+
+class ResponseCache:
+    """Disk-backed LRU cache of model responses, safe to share between threads"""
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> size in bytes, least recently used first
+        self._total_bytes = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _paths(self, key):
+        return (os.path.join(self.directory, f"{key}.bin"),
+                os.path.join(self.directory, f"{key}.json"))
+
+    def _load_index(self):
+        """Rebuild the LRU order from the files left by previous runs"""
+        found = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            key = name[:-5]
+            data_path, meta_path = self._paths(key)
+            try:
+                size = os.path.getsize(data_path) + os.path.getsize(meta_path)
+                found.append((os.path.getmtime(meta_path), key, size))
+            except OSError:
+                continue
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._total_bytes += size
+        self._evict()
+
+    def _remove(self, key):
+        self._total_bytes -= self._entries.pop(key, 0)
+        for path in self._paths(key):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _evict(self):
+        while self._entries and self._total_bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+
+    def get(self, key):
+        """Return a CachedResponse for `key`, or None on a miss"""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            data_path, meta_path = self._paths(key)
+            try:
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                with open(data_path, "rb") as f:
+                    image_bytes = f.read()
+            except (OSError, ValueError):
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            now = time.time()
+            os.utime(meta_path, (now, now))
+            self.hits += 1
+        return CachedResponse(meta.get("text"), image_bytes, meta.get("mime_type", "image/png"), from_cache=True)
+
+    def put(self, key, response):
+        """Store a model response and return it as a CachedResponse
+
+        Responses without an image are returned as-is and not cached, so a
+        refusal or empty answer is retried next time.
+        """
+        text, image_bytes, mime_type = _extract_response(response)
+        if not image_bytes:
+            return response
+
+        data_path, meta_path = self._paths(key)
+        meta = json.dumps({"text": text, "mime_type": mime_type, "created": time.time()})
+        with self._lock:
+            # Write the image first; an entry only exists once its JSON is in place
+            with open(data_path, "wb") as f:
+                f.write(image_bytes)
+            with open(meta_path, "w", encoding="utf-8") as f:
+                f.write(meta)
+            self._total_bytes -= self._entries.pop(key, 0)
+            size = len(image_bytes) + len(meta.encode("utf-8"))
+            self._entries[key] = size
+            self._total_bytes += size
+            self._evict()
+        return CachedResponse(text, image_bytes, mime_type)
+
+    def stats(self):
+        """Return hit/miss counters and current size"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+            }
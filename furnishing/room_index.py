@@ -0,0 +1,107 @@
+"""Index of furnished rooms by perceptual hash, for reusing near-duplicate results
+
+Each record ties a room's hashes and a request fingerprint (preferences,
+furniture and model) to the result produced for it. Records are appended
+to a JSONL file and loaded into a MultiIndexHash on start, so a lookup
+over 100k rooms probes a few hundred buckets rather than every record.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+from furnishing.perceptual_hash import MultiIndexHash, hamming
+
+# pHash radius for candidates, and the dHash distance a candidate must also
+# be within. Re-exports and small crops stay well inside these; unrelated
+# rooms are typically 16+ bits apart on both.
+DEFAULT_MAX_DISTANCE = 8
+DEFAULT_MAX_DHASH_DISTANCE = 10
+
+
+def request_fingerprint(preferences, furniture_items, model_id, draft=False):
+    """Digest of everything besides the room that determines a result
+
+    `furniture_items` are (image digest, description) pairs, as used in
+    response cache keys. Drafts never match full-quality results.
+    """
+    fields = [model_id, preferences, [list(item) for item in furniture_items]]
+    if draft:
+        fields.append("draft")
+    data = json.dumps(fields, sort_keys=True)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+class RoomIndex:
+    """Thread-safe perceptual-hash index of furnished rooms, optionally persisted to JSONL"""
+
+    def __init__(self, path=None, max_distance=DEFAULT_MAX_DISTANCE,
+                 max_dhash_distance=DEFAULT_MAX_DHASH_DISTANCE):
+        self.path = path
+        self.max_distance = max_distance
+        self.max_dhash_distance = max_dhash_distance
+        self._lock = threading.Lock()
+        self._index = MultiIndexHash()
+        self._dead = set()
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._load()
+
+    def __len__(self):
+        return len(self._index) - len(self._dead)
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A process killed mid-write can leave a partial last line
+                        continue
+                    self._index.add(int(record['phash'], 16), record)
+        except FileNotFoundError:
+            pass
+
+    def add(self, hashes, fingerprint, **fields):
+        """Record a furnished room; `fields` (e.g. where the result lives) are stored with it"""
+        record = {
+            'ahash': f"{hashes.ahash:016x}",
+            'dhash': f"{hashes.dhash:016x}",
+            'phash': f"{hashes.phash:016x}",
+            'fingerprint': fingerprint,
+            'time': time.time(),
+            **fields
+        }
+        with self._lock:
+            self._index.add(hashes.phash, record)
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record) + "\n")
+        return record
+
+    def find(self, hashes, fingerprint, is_available=None, session=None):
+        """Closest earlier room with the same fingerprint, as (distance, record), or None
+
+        `is_available(record)`, if given, filters out records whose result
+        is gone (e.g. swept from disk); those are skipped from then on.
+        With a `session`, only records added with that `session` field
+        match; callers showing results to a user should pass their session.
+        """
+        with self._lock:
+            candidates = self._index.search(hashes.phash, self.max_distance)
+        for distance, record in candidates:
+            if record['fingerprint'] != fingerprint or id(record) in self._dead:
+                continue
+            if session is not None and record.get('session') != session:
+                continue
+            if hamming(hashes.dhash, int(record['dhash'], 16)) > self.max_dhash_distance:
+                continue
+            if is_available and not is_available(record):
+                with self._lock:
+                    self._dead.add(id(record))
+                continue
+            return distance, record
+        return None
+
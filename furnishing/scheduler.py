@@ -0,0 +1,287 @@
+"""Shared request scheduler for model calls
+
+Every request for an API key goes through one RequestScheduler, so sessions
+and variation workers using the same key share its rate limit. For each
+request the scheduler:
+
+- waits for a token from the key's token bucket,
+- retries retryable failures (429, 5xx, timeouts, dropped connections) with
+  exponential backoff and full jitter, honouring Retry-After when given,
+- gives each attempt the time left before the request's deadline as its
+  timeout, and gives up once the deadline would be passed, and
+- stops sending requests for a key whose circuit breaker has opened after
+  repeated failures, letting one trial request through after a cool-down.
+"""
+import random
+import sys
+import threading
+import time
+from collections import namedtuple
+
+from furnishing.rate_limit import TokenBucket
+
+DEFAULT_REQUESTS_PER_MINUTE = 30
+DEFAULT_BURST = 4
+
+# HTTP status codes worth retrying
+RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+
+RetryPolicy = namedtuple('RetryPolicy', ['max_attempts', 'base_delay', 'max_delay'])
+DEFAULT_RETRY_POLICY = RetryPolicy(max_attempts=4, base_delay=1.0, max_delay=20.0)
+
+
+class DeadlineExceeded(Exception):
+    """The request could not finish before its deadline"""
+
+
+class CircuitOpenError(Exception):
+    """Requests for this key are paused after repeated failures"""
+
+    def __init__(self, retry_in):
+        super().__init__(f"The model API is failing repeatedly; requests are paused for {retry_in:.0f}s")
+        self.retry_in = retry_in
+
+
+def error_code(error):
+    """HTTP status code of an API error, or None"""
+    code = getattr(error, "code", None)
+    return code if isinstance(code, int) else None
+
+
+def is_retryable(error):
+    """Whether a failed request may succeed if sent again"""
+    if error_code(error) in RETRYABLE_CODES:
+        return True
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    # httpx errors can only exist if httpx has been imported
+    httpx = sys.modules.get("httpx")
+    return bool(httpx) and isinstance(error, (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError))
+
+
+def retry_after(error):
+    """Seconds the server asked us to wait (Retry-After header), or None"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    try:
+        return float(headers.get("retry-after")) if headers else None
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """Closed -> open after `failure_threshold` failures in a row -> half-open after `reset_timeout`
+
+    While open, calls are rejected. In half-open state a single trial call
+    is let through; its success closes the breaker, its failure reopens it.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state_locked()
+
+    def _state_locked(self):
+        if self._opened_at is None:
+            return "closed"
+        if self._clock() - self._opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go ahead now
+
+        Returns whether the call is the half-open trial. A trial that ends
+        without a recorded success or failure must be given back with
+        release_trial(), or the breaker would reject calls from then on.
+        """
+        with self._lock:
+            state = self._state_locked()
+            if state == "closed":
+                return False
+            if state == "half-open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            retry_in = max(0.0, self.reset_timeout - (self._clock() - self._opened_at))
+        raise CircuitOpenError(retry_in)
+
+    def release_trial(self):
+        """Let another call make the half-open trial; this one never reached the API"""
+        with self._lock:
+            self._trial_running = False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.failure_threshold:
+                self._opened_at = self._clock()
+            self._trial_running = False
+
+
+class _KeyState:
+    def __init__(self, bucket, breaker):
+        self.bucket = bucket
+        self.breaker = breaker
+
+
+class RequestScheduler:
+    """Rate limits, retries and circuit breaking for model requests, per API key
+
+    `key` is any hashable identifying the quota (an API key digest, or a
+    fixed name for a single-key batch run). `clock`, `sleep` and `rng` can
+    be replaced to test timing behaviour without waiting.
+    """
+
+    COUNTERS = ("requests", "attempts", "successes", "failures", "retries",
+                "throttled", "throttle_seconds", "deadline_exceeded", "circuit_rejections")
+
+    def __init__(self, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE, burst=DEFAULT_BURST,
+                 retry_policy=DEFAULT_RETRY_POLICY, failure_threshold=5, reset_timeout=30.0,
+                 clock=time.monotonic, sleep=time.sleep, rng=None):
+        self.requests_per_minute = requests_per_minute
+        self.burst = burst
+        self.retry_policy = retry_policy
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._sleep = sleep
+        self._random = rng or random.Random()
+        self._lock = threading.Lock()
+        self._keys = {}
+        self._counters = dict.fromkeys(self.COUNTERS, 0)
+
+    def _state(self, key):
+        with self._lock:
+            state = self._keys.get(key)
+            if state is None:
+                state = _KeyState(
+                    TokenBucket(self.requests_per_minute / 60.0, self.burst, clock=self._clock),
+                    CircuitBreaker(self.failure_threshold, self.reset_timeout, clock=self._clock)
+                )
+                self._keys[key] = state
+            return state
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def backoff(self, attempt, error=None):
+        """Delay before retry number `attempt` (1-based): full jitter, or the server's Retry-After"""
+        requested = retry_after(error) if error is not None else None
+        if requested is not None:
+            return min(requested, self.retry_policy.max_delay)
+        ceiling = min(self.retry_policy.max_delay, self.retry_policy.base_delay * 2 ** (attempt - 1))
+        return self._random.uniform(0, ceiling)
+
+    def _take_token(self, state, deadline_at):
+        """Wait for a rate-limit token without passing the deadline"""
+        if state.bucket.try_acquire():
+            return
+        wait = state.bucket.wait_time()
+        if deadline_at is not None and self._clock() + wait > deadline_at:
+            self._count("deadline_exceeded")
+            raise DeadlineExceeded("Rate limit wait would pass the request deadline")
+        self._count("throttled")
+        self._count("throttle_seconds", wait)
+        while not state.bucket.try_acquire():
+            self._sleep(max(state.bucket.wait_time(), 0.001))
+
+    def _time_left(self, deadline_at):
+        """Seconds an attempt may take, or None; raises DeadlineExceeded when none are left"""
+        if deadline_at is None:
+            return None
+        left = deadline_at - self._clock()
+        if left <= 0:
+            self._count("deadline_exceeded")
+            raise DeadlineExceeded("No time left for another attempt before the request deadline")
+        return left
+
+    def run(self, key, fn, deadline=None):
+        """Call `fn(timeout)` under the key's rate limit, retrying retryable errors
+
+        `deadline` is in seconds from now and covers rate-limit waits, every
+        attempt and the backoff between them: each attempt is passed the
+        seconds left as `timeout` (None without a deadline) and must give up
+        after that long, and an attempt failing once the deadline has passed
+        raises DeadlineExceeded. Non-retryable errors are raised at once;
+        retryable ones after the last attempt.
+        """
+        state = self._state(key)
+        deadline_at = None if deadline is None else self._clock() + deadline
+        self._count("requests")
+
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                trial = state.breaker.before_call()
+            except CircuitOpenError:
+                self._count("circuit_rejections")
+                raise
+            try:
+                self._take_token(state, deadline_at)
+                timeout = self._time_left(deadline_at)
+            except BaseException:
+                if trial:
+                    state.breaker.release_trial()
+                raise
+
+            self._count("attempts")
+            try:
+                result = fn(timeout)
+            except Exception as e:
+                if not is_retryable(e):
+                    # The request was bad, which says nothing about the service either way:
+                    # neither trip the breaker nor let it close or forget earlier failures
+                    if trial:
+                        state.breaker.release_trial()
+                    self._count("failures")
+                    raise
+                state.breaker.record_failure()
+                if deadline_at is not None and self._clock() >= deadline_at:
+                    self._count("failures")
+                    self._count("deadline_exceeded")
+                    raise DeadlineExceeded(f"Attempt {attempt} ran past the request deadline: {e}") from e
+                if attempt >= self.retry_policy.max_attempts:
+                    self._count("failures")
+                    raise
+                delay = self.backoff(attempt, e)
+                if deadline_at is not None and self._clock() + delay >= deadline_at:
+                    self._count("failures")
+                    self._count("deadline_exceeded")
+                    raise DeadlineExceeded(f"Gave up after {attempt} attempts: {e}") from e
+                self._count("retries")
+                self._sleep(delay)
+                continue
+            except BaseException:
+                # Interrupted without an outcome (e.g. KeyboardInterrupt)
+                if trial:
+                    state.breaker.release_trial()
+                raise
+
+            state.breaker.record_success()
+            self._count("successes")
+            return result
+
+    def stats(self):
+        """Counters plus the breaker state of every key"""
+        with self._lock:
+            stats = dict(self._counters)
+            keys = list(self._keys.items())
+        stats['breakers'] = {key: state.breaker.state for key, state in keys}
+        return stats
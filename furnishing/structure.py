@@ -0,0 +1,221 @@
+"""Numeric check that a furnished room kept the empty room's architecture
+
+The room prompt asks the model to maintain the room's architectural
+features and layout. analyze_structure() measures how well it did:
+
+- both images are decoded straight to grayscale at ANALYSIS_EDGE pixels
+  (JPEG decoding is scaled down in the decoder) and brought to the same
+  frame; a small translation between them is found by phase correlation
+  and cropped away
+- SSIM over 7x7 windows at half that resolution, computed with
+  summed-area tables, tells how similar the two images are overall. A
+  window is marked changed when its SSIM is low or its mean brightness
+  moved a lot (SSIM alone barely notices a flat wall turning into a flat
+  sofa of another shade)
+- edge preservation is the share of the empty room's strongest edges
+  (walls, windows, doors, floor lines) that the furnished image still has
+  within a pixel. Furniture covers some of them, so a good result keeps
+  around half or more rather than all of them; a room whose walls moved
+  or whose camera angle changed keeps a quarter or less.
+
+Everything after decoding is vectorized NumPy at the analysis size, so
+the cost barely depends on the input resolution: a 2048 px JPEG pair
+takes about 30 ms. A lossless 2048 px PNG has to be decoded in full,
+which takes longer than the analysis itself.
+"""
+import io
+from collections import namedtuple
+
+import numpy as np
+from PIL import Image as PILImage
+from PIL import ImageOps
+
+ANALYSIS_EDGE = 512
+SSIM_WINDOW = 7
+# SSIM constants for 8-bit images: (0.01 * 255)^2 and (0.03 * 255)^2
+SSIM_C1 = 6.5025
+SSIM_C2 = 58.5225
+# Windows less similar than this, or whose mean moved by more than this
+# many gray levels, count as changed
+CHANGE_SSIM = 0.4
+CHANGE_LEVELS = 24
+# The strongest tenth of the empty room's gradients are its structural edges
+EDGE_PERCENTILE = 90
+# Translations larger than this share of the image are not alignment errors
+MAX_SHIFT_FRACTION = 0.05
+# Below this edge preservation a result counts as drifted
+DEFAULT_MIN_EDGE_PRESERVATION = 0.4
+CHANGE_TINT = (255, 64, 64)
+
+# `shift` is the (dy, dx) furnished-image offset removed before comparing,
+# in analysis pixels; `mask` is a boolean array of changed analysis pixels
+StructureReport = namedtuple(
+    'StructureReport', ['ssim', 'edge_preservation', 'changed_fraction', 'shift', 'mask', 'drifted']
+)
+
+
+def _load_gray(data, size=None):
+    """EXIF-oriented grayscale float32 array of an image, at most ANALYSIS_EDGE on its long side or exactly `size`"""
+    image = PILImage.open(io.BytesIO(data))
+    target = size or (ANALYSIS_EDGE, ANALYSIS_EDGE)
+    # JPEG decodes at a fraction of full size at almost no cost
+    image.draft("L", target)
+    # The model is sent the upright image, so phone photos must be compared upright too
+    image = ImageOps.exif_transpose(image)
+    image = image.convert("L")
+    if size is None:
+        scale = ANALYSIS_EDGE / max(image.size)
+        size = (max(1, round(image.width * scale)), max(1, round(image.height * scale))) if scale < 1 else image.size
+    if image.size != size:
+        factor = min(image.width // size[0], image.height // size[1])
+        if factor > 1:
+            image = image.reduce(factor)
+        image = image.resize(size, PILImage.BILINEAR)
+    return np.asarray(image, dtype=np.float32)
+
+
+def _box_mean(values, window):
+    """Mean over every full window x window block, from a summed-area table"""
+    table = np.zeros((values.shape[0] + 1, values.shape[1] + 1), dtype=np.float64)
+    np.cumsum(np.cumsum(values, axis=0), axis=1, out=table[1:, 1:])
+    sums = table[window:, window:] - table[:-window, window:] - table[window:, :-window] + table[:-window, :-window]
+    return (sums / (window * window)).astype(np.float32)
+
+
+def ssim_map(x, y, window=SSIM_WINDOW):
+    """SSIM of every full window of two equally sized grayscale arrays"""
+    mu_x = _box_mean(x, window)
+    mu_y = _box_mean(y, window)
+    var_x = _box_mean(x * x, window) - mu_x * mu_x
+    var_y = _box_mean(y * y, window) - mu_y * mu_y
+    cov = _box_mean(x * y, window) - mu_x * mu_y
+    return ((2 * mu_x * mu_y + SSIM_C1) * (2 * cov + SSIM_C2)) / (
+        (mu_x * mu_x + mu_y * mu_y + SSIM_C1) * (var_x + var_y + SSIM_C2)
+    )
+
+
+def _half(gray):
+    """Average every 2x2 block, dropping an odd last row or column"""
+    height, width = gray.shape[0] // 2 * 2, gray.shape[1] // 2 * 2
+    gray = gray[:height, :width]
+    return (gray[0::2, 0::2] + gray[1::2, 0::2] + gray[0::2, 1::2] + gray[1::2, 1::2]) * 0.25
+
+
+def _strong(magnitude):
+    """Pixels among the strongest (100 - EDGE_PERCENTILE)% of a gradient image
+
+    The threshold comes from every other row and column, which is plenty
+    for a percentile and four times cheaper.
+    """
+    return magnitude > max(np.percentile(magnitude[::2, ::2], EDGE_PERCENTILE), 1.0)
+
+
+def gradient_magnitude(gray):
+    """Sobel gradient magnitude; the one-pixel border is left at zero"""
+    padded = np.pad(gray, 1, mode="edge")
+    gx = (padded[:-2, 2:] + 2 * padded[1:-1, 2:] + padded[2:, 2:]) - (padded[:-2, :-2] + 2 * padded[1:-1, :-2] + padded[2:, :-2])
+    gy = (padded[2:, :-2] + 2 * padded[2:, 1:-1] + padded[2:, 2:]) - (padded[:-2, :-2] + 2 * padded[:-2, 1:-1] + padded[:-2, 2:])
+    magnitude = np.hypot(gx, gy)
+    magnitude[[0, -1], :] = 0
+    magnitude[:, [0, -1]] = 0
+    return magnitude
+
+
+def _dilate(mask):
+    """Grow a boolean mask by one pixel in every direction"""
+    grown = mask.copy()
+    grown[1:, :] |= mask[:-1, :]
+    grown[:-1, :] |= mask[1:, :]
+    wide = grown.copy()
+    wide[:, 1:] |= grown[:, :-1]
+    wide[:, :-1] |= grown[:, 1:]
+    return wide
+
+
+def estimate_shift(x, y, max_fraction=MAX_SHIFT_FRACTION):
+    """(dy, dx) translation of `y` relative to `x` by phase correlation, 0 beyond max_fraction
+
+    Correlating at half resolution is four times cheaper and still finds
+    the shift to within a pixel or two.
+    """
+    shift = _phase_correlation(x[::2, ::2], y[::2, ::2])
+    dy, dx = shift[0] * 2, shift[1] * 2
+    if abs(dy) > x.shape[0] * max_fraction or abs(dx) > x.shape[1] * max_fraction:
+        return 0, 0
+    return dy, dx
+
+
+def _phase_correlation(x, y):
+    cross = np.fft.rfft2(y - y.mean()) * np.conj(np.fft.rfft2(x - x.mean()))
+    correlation = np.fft.irfft2(cross / (np.abs(cross) + 1e-6), s=x.shape)
+    dy, dx = np.unravel_index(np.argmax(correlation), correlation.shape)
+    # Peaks past the middle are negative shifts
+    dy = dy - x.shape[0] if dy > x.shape[0] // 2 else dy
+    dx = dx - x.shape[1] if dx > x.shape[1] // 2 else dx
+    return int(dy), int(dx)
+
+
+def _overlap(x, y, shift):
+    """The parts of x and y that line up once y is moved back by `shift`"""
+    dy, dx = shift
+    height, width = x.shape
+    rows = slice(max(0, -dy), height - max(0, dy))
+    cols = slice(max(0, -dx), width - max(0, dx))
+    shifted_rows = slice(rows.start + dy, rows.stop + dy)
+    shifted_cols = slice(cols.start + dx, cols.stop + dx)
+    return x[rows, cols], y[shifted_rows, shifted_cols]
+
+
+def analyze_structure(original_bytes, furnished_bytes, min_edge_preservation=DEFAULT_MIN_EDGE_PRESERVATION):
+    """StructureReport comparing an empty room with its furnished version
+
+    The furnished image is scaled to the original's analysis frame, so a
+    result returned at another resolution or aspect ratio is compared
+    against the same room outline.
+    """
+    original = _load_gray(original_bytes)
+    furnished = _load_gray(furnished_bytes, (original.shape[1], original.shape[0]))
+    shift = estimate_shift(original, furnished)
+    original, furnished = _overlap(original, furnished, shift)
+
+    half_original, half_furnished = _half(original), _half(furnished)
+    similarity = ssim_map(half_original, half_furnished)
+    shifted_mean = np.abs(_box_mean(half_original - half_furnished, SSIM_WINDOW))
+    # Pad the map back to the half-size overlap (border pixels take their nearest
+    # window), then scale it up to the overlap
+    before = (SSIM_WINDOW - 1) // 2
+    after = SSIM_WINDOW - 1 - before
+    changed = np.pad((similarity < CHANGE_SSIM) | (shifted_mean > CHANGE_LEVELS), ((before, after), (before, after)), mode="edge")
+    mask = np.zeros(original.shape, dtype=bool)
+    mask[:changed.shape[0] * 2, :changed.shape[1] * 2] = changed.repeat(2, axis=0).repeat(2, axis=1)
+
+    structural = _strong(gradient_magnitude(original))
+    kept = _dilate(_strong(gradient_magnitude(furnished)))
+    edge_count = np.count_nonzero(structural)
+    edge_preservation = np.count_nonzero(structural & kept) / edge_count if edge_count else 1.0
+
+    return StructureReport(
+        ssim=float(similarity.mean()),
+        edge_preservation=float(edge_preservation),
+        changed_fraction=float(mask.mean()),
+        shift=shift,
+        mask=mask,
+        drifted=bool(edge_preservation < min_edge_preservation)
+    )
+
+
+def change_mask_overlay(furnished_bytes, report, quality=80):
+    """JPEG of the furnished image at analysis size with the changed regions tinted"""
+    image = PILImage.open(io.BytesIO(furnished_bytes))
+    image.draft("RGB", (ANALYSIS_EDGE, ANALYSIS_EDGE))
+    image = ImageOps.exif_transpose(image)
+    height, width = report.mask.shape
+    dy, dx = report.shift
+    pixels = np.asarray(
+        image.convert("RGB").resize((width + abs(dx), height + abs(dy)), PILImage.BILINEAR), dtype=np.float32
+    )
+    pixels = pixels[max(0, dy):max(0, dy) + height, max(0, dx):max(0, dx) + width]
+    tinted = np.where(report.mask[..., None], pixels * 0.5 + np.array(CHANGE_TINT, dtype=np.float32) * 0.5, pixels * 0.7)
+    buffer = io.BytesIO()
+    PILImage.fromarray(tinted.astype(np.uint8)).save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
@@ -0,0 +1,51 @@
+"""Concurrent generation of style variations"""
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Default number of variation requests in flight at once
+DEFAULT_MAX_CONCURRENCY = 4
+
+# The 4 styles generated by "Generate 4 Style Variations"
+STYLE_VARIATIONS = [
+    {"name": "Modern", "style": "modern", "color": "neutral", "furniture": "contemporary"},
+    {"name": "Traditional", "style": "traditional", "color": "warm", "furniture": "traditional"},
+    {"name": "Minimalist", "style": "minimalist", "color": "monochrome", "furniture": "modern"},
+    {"name": "Scandinavian", "style": "scandinavian", "color": "pastel", "furniture": "scandinavian"}
+]
+
+VariationResult = namedtuple('VariationResult', ['index', 'variation', 'result', 'error'])
+
+
+def variation_preferences(preferences, variation):
+    """Preferences for one variation: the user's choices with the variation's style swapped in"""
+    return {
+        **preferences,
+        'style': variation['style'],
+        'color_scheme': variation['color'],
+        'furniture_style': variation['furniture']
+    }
+
+
+def run_variations(generate_fn, variations, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+    """Run generate_fn for every variation concurrently and yield results as they finish
+
+    Results are yielded in completion order as VariationResult tuples. A variation
+    that raises is yielded with its exception in `error` and does not cancel the others.
+    generate_fn runs on worker threads, so it must not call Streamlit.
+    """
+    if not variations:
+        return
+
+    workers = max(1, min(int(max_concurrency), len(variations)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="variation") as executor:
+        futures = {
+            executor.submit(generate_fn, variation): (i, variation)
+            for i, variation in enumerate(variations)
+        }
+        for future in as_completed(futures):
+            i, variation = futures[future]
+            try:
+                result, error = future.result(), None
+            except Exception as e:
+                result, error = None, e
+            yield VariationResult(i, variation, result, error)
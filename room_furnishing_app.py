@@ -1,13 +1,144 @@
 import streamlit as st
 import os
-import io
-import base64
 from PIL import Image as PILImage
-from google import genai
-from google.genai import types
 import tempfile
-import zipfile
+import functools
+import json
+import math
+import time
+import uuid
+import concurrent.futures
 from datetime import datetime
+from furnishing.variations import STYLE_VARIATIONS, DEFAULT_MAX_CONCURRENCY, variation_preferences
+from furnishing.engine import FurnishingEngine, furniture_cache_items
+from furnishing.generation import response_text
+from furnishing.jobs import QUEUED, JobQueue
+from furnishing.furniture_assets import FurnitureRegistry
+from furnishing.furniture_catalog import FurnitureCatalog
+from furnishing.perceptual_hash import room_hashes
+from furnishing.room_index import RoomIndex, request_fingerprint
+from furnishing.response_cache import ResponseCache, content_digest
+from furnishing.client_pool import ClientPool, api_key_digest
+from furnishing.backends import DEFAULT_BACKEND, DEFAULT_FAKE_OPTIONS, FakeOptions, client_factory, requires_api_key
+from furnishing.scheduler import DEFAULT_REQUESTS_PER_MINUTE, RequestScheduler
+from furnishing.admission import DEFAULT_MAX_IN_FLIGHT, DEFAULT_PER_SESSION, AdmissionController
+from furnishing.prefetch import DEFAULT_CANDIDATES, DEFAULT_SESSION_BUDGET, Prefetcher, TransitionStats
+from furnishing.structure import DEFAULT_MIN_EDGE_PRESERVATION, change_mask_overlay
+from furnishing.palette import PaletteIndex, extract_palette, palette_from_colors
+from furnishing.metrics import Metrics
+from furnishing.prompts import DEFAULT_PROMPT_TOKEN_BUDGET
+from furnishing.gallery_export import write_gallery_zip
+from furnishing.gallery_store import (
+    DEFAULT_EXPORT_QUALITY, DEFAULT_PNG_COMPRESS_LEVEL, EXPORT_FORMATS, GalleryStore, make_thumbnail
+)
+from furnishing.image_preprocessing import (
+    DEFAULT_MAX_EDGE, DEFAULT_QUALITY, OUTPUT_FORMATS, PreprocessCache, PreprocessSettings
+)
+
+# Gallery grid layout
+GALLERY_COLUMNS = 3
+GALLERY_PAGE_SIZES = [6, 9, 12, 24]
+
+# Furniture style choices, also used to file catalog items
+FURNITURE_STYLES = ["contemporary", "vintage", "modern", "traditional", "industrial", "scandinavian", "mid-century", "rustic", "luxury"]
+
+# Design style and color scheme choices; prefetching treats options next to each other as likely next tries
+DESIGN_STYLES = ["modern", "minimalist", "traditional", "contemporary", "scandinavian", "industrial", "bohemian", "rustic", "mid-century modern", "art deco"]
+COLOR_SCHEMES = ["neutral", "warm", "cool", "monochrome", "pastel", "bold", "earth tones", "jewel tones", "black and white"]
+
+# Room type choices, also a filter of the color search
+ROOM_TYPES = ["living room", "bedroom", "dining room", "kitchen", "office", "bathroom", "nursery", "study room"]
+
+# Color search results shown at once, and the color it starts from
+COLOR_SEARCH_RESULTS = 9
+DEFAULT_SEARCH_COLOR = "#c8a27a"
+
+# Catalog search results shown at once
+CATALOG_RESULTS = 12
+CATALOG_COLUMNS = 3
+
+# Latency of the most recent model requests shown in the sidebar
+REQUEST_TIMING_HISTORY = 20
+
+# Model backend: "gemini", or "fake" to run offline without an API key
+# (ROOM_FURNISHING_FAKE_DELAY and ROOM_FURNISHING_FAKE_FAILURE_RATE tune it)
+MODEL_BACKEND = os.environ.get("ROOM_FURNISHING_BACKEND", DEFAULT_BACKEND)
+FAKE_OPTIONS = FakeOptions(
+    delay=float(os.environ.get("ROOM_FURNISHING_FAKE_DELAY", DEFAULT_FAKE_OPTIONS.delay)),
+    failure_rate=float(os.environ.get("ROOM_FURNISHING_FAKE_FAILURE_RATE", DEFAULT_FAKE_OPTIONS.failure_rate)),
+    seed=DEFAULT_FAKE_OPTIONS.seed
+)
+
+# Request budget per API key, shared by every session using the key
+# (override with ROOM_FURNISHING_RPM), and how long one request may take
+# including retries
+REQUESTS_PER_MINUTE = float(os.environ.get("ROOM_FURNISHING_RPM", DEFAULT_REQUESTS_PER_MINUTE))
+REQUEST_DEADLINE_SECONDS = 180
+
+# Model requests in flight at once across all sessions and per session; waiting
+# requests are admitted in fair order so one heavy session cannot starve the rest
+# (override with ROOM_FURNISHING_MAX_IN_FLIGHT and ROOM_FURNISHING_SESSION_IN_FLIGHT)
+MAX_IN_FLIGHT = int(os.environ.get("ROOM_FURNISHING_MAX_IN_FLIGHT", DEFAULT_MAX_IN_FLIGHT))
+SESSION_IN_FLIGHT = int(os.environ.get("ROOM_FURNISHING_SESSION_IN_FLIGHT", DEFAULT_PER_SESSION))
+
+# Opt-in prefetch after a single-style generation: how many likely next
+# style/color combinations to generate ahead, how many prefetched model
+# requests one session may spend in total (override with
+# ROOM_FURNISHING_PREFETCH_BUDGET), the workers they run on and their
+# admission weight, a quarter of a user's request
+PREFETCH_CANDIDATES = DEFAULT_CANDIDATES
+PREFETCH_SESSION_BUDGET = int(os.environ.get("ROOM_FURNISHING_PREFETCH_BUDGET", DEFAULT_SESSION_BUDGET))
+PREFETCH_WORKERS = 2
+PREFETCH_WEIGHT = 0.25
+
+# Furnished rooms keeping less than this share of the empty room's structural
+# edges are flagged as drifted (override with ROOM_FURNISHING_MIN_STRUCTURE)
+MIN_STRUCTURE = float(os.environ.get("ROOM_FURNISHING_MIN_STRUCTURE", DEFAULT_MIN_EDGE_PRESERVATION))
+
+# Estimated token budget for the text prompt; longer furniture lists and
+# special instructions are summarized or shortened to fit
+# (override with ROOM_FURNISHING_PROMPT_BUDGET)
+PROMPT_TOKEN_BUDGET = int(os.environ.get("ROOM_FURNISHING_PROMPT_BUDGET", DEFAULT_PROMPT_TOKEN_BUDGET))
+
+# Stage timing collection (set ROOM_FURNISHING_METRICS=0 to start with it off)
+# and an optional JSONL file receiving every observation
+METRICS_ENABLED = os.environ.get("ROOM_FURNISHING_METRICS", "1") != "0"
+METRICS_LOG = os.environ.get("ROOM_FURNISHING_METRICS_LOG")
+
+# Generations run on background workers shared by all sessions, so reruns
+# neither cancel nor wait for them; a session with running jobs polls them
+# this often
+JOB_WORKERS = 8
+JOB_POLL_SECONDS = 1
+# A repeated click for a request whose result arrived this recently is ignored
+JOB_REPEAT_SECONDS = 5
+
+# How each kind of background job reports a failure or a response without an image
+JOB_ERRORS = {
+    'single': "Error furnishing room",
+    'variations': "Error generating style variations",
+    'preview': "Error generating preview",
+    'finalize': "Error finalizing draft",
+    'edit': "Error applying edit",
+}
+JOB_EMPTY_RESULTS = {
+    'single': "No furnished image was generated. Please try different preferences.",
+    'preview': "No preview was generated. Please try again.",
+    'finalize': "No final image was generated. Please try again.",
+    'edit': "No edited image was generated. Try rephrasing the instruction.",
+}
+
+# ZIP exports stay in memory up to this size, then spill to a temporary file
+ZIP_SPOOL_MAX_BYTES = 16 * 1024 * 1024
+
+# Local storage for cached responses (override with ROOM_FURNISHING_DATA_DIR)
+DATA_DIR = os.environ.get(
+    "ROOM_FURNISHING_DATA_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "room_furnishing")
+)
+
+# Start of this script run, for the rerun_seconds metric
+run_started = time.perf_counter()
 
 # Page configuration
 st.set_page_config(
@@ -138,84 +269,1068 @@ if 'client' not in st.session_state:
     st.session_state.client = None
 if 'uploaded_furniture' not in st.session_state:
     st.session_state.uploaded_furniture = []
+if 'furniture_registry' not in st.session_state:
+    st.session_state.furniture_registry = FurnitureRegistry()
+if 'catalog_picks' not in st.session_state:
+    st.session_state.catalog_picks = {}
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+if 'jobs' not in st.session_state:
+    st.session_state.jobs = {}
+if 'job_outcomes' not in st.session_state:
+    st.session_state.job_outcomes = {}
+
+@st.cache_resource
+def get_client_pool():
+    """Process-wide model clients, one per API key hash, reused across reruns and sessions"""
+    return ClientPool(client_factory(MODEL_BACKEND, FAKE_OPTIONS))
 
 def initialize_client(api_key):
-    """Initialize the Gemini client"""
+    """Get the Gemini client for this API key from the shared client pool
+    
+    The session's hold on the client is released when Streamlit discards
+    the session and its session state with it.
+    """
+    pool = get_client_pool()
     try:
-        client = genai.Client(api_key=api_key)
-        st.session_state.client = client
+        st.session_state.client = pool.acquire(api_key, st.session_state.session_id)
+        st.session_state.request_key = api_key_digest(api_key)
+        if 'client_lease' not in st.session_state:
+            st.session_state.client_lease = pool.lease(st.session_state.session_id)
         return True
     except Exception as e:
         st.error(f"Error initializing client: {str(e)}")
         return False
 
-def display_response(response):
-    """Display response parts (text and images)"""
-    for part in response.parts:
-        if part.text:
-            st.markdown(part.text)
-        elif image := part.as_image():
-            # Convert to PIL Image for display
-            pil_image = PILImage.open(io.BytesIO(image.image_bytes))
-            st.image(pil_image, caption="Furnished Room", use_container_width=True)
-            return pil_image
-    return None
-
-def save_furnished_room(original_image, furnished_image, preferences, filename, uploaded_furniture=None):
-    """Save furnished room to session state"""
+@st.cache_resource
+def get_response_cache():
+    """Process-wide response cache shared by all sessions"""
+    return ResponseCache(os.path.join(DATA_DIR, "responses"))
+
+@st.cache_resource
+def get_scheduler():
+    """Process-wide request scheduler: rate limits, retries and circuit breakers per API key"""
+    return RequestScheduler(REQUESTS_PER_MINUTE)
+
+@st.cache_resource
+def get_admission():
+    """Process-wide admission control in front of every model request"""
+    return AdmissionController(MAX_IN_FLIGHT, SESSION_IN_FLIGHT)
+
+@st.cache_resource
+def get_transition_stats():
+    """Process-wide counts of which style and color scheme users try after which"""
+    return TransitionStats(os.path.join(DATA_DIR, "style_transitions.jsonl"))
+
+@st.cache_resource
+def get_prefetcher():
+    """Process-wide background generations of likely next requests"""
+    return Prefetcher(PREFETCH_WORKERS, PREFETCH_SESSION_BUDGET)
+
+@st.cache_resource
+def get_metrics():
+    """Process-wide stage timings, payload sizes and counters for the diagnostics panel"""
+    return Metrics(enabled=METRICS_ENABLED, event_log=METRICS_LOG)
+
+def set_metrics_enabled():
+    """Toggle callback: turn metric collection on or off for the whole process"""
+    get_metrics().enabled = st.session_state.collect_metrics
+
+@st.cache_resource
+def get_preprocess_cache():
+    """Process-wide cache of downscaled, re-encoded upload images"""
+    return PreprocessCache()
+
+def get_engine(model_id, preprocess_settings, stream=True, prefetch=False):
+    """FurnishingEngine bound to this session's client and the shared caches
+    
+    A `prefetch` engine queues for model request slots separately from the
+    session's own requests and at a lower weight, so it does not hold them up.
+    """
+    session_key = st.session_state.session_id
+    return FurnishingEngine(
+        st.session_state.client,
+        model_id,
+        preprocess_settings,
+        response_cache=get_response_cache(),
+        preprocess_cache=get_preprocess_cache(),
+        scheduler=get_scheduler(),
+        request_key=st.session_state.get('request_key'),
+        deadline=REQUEST_DEADLINE_SECONDS,
+        stream=stream,
+        metrics=get_metrics(),
+        prompt_token_budget=PROMPT_TOKEN_BUDGET,
+        admission=get_admission(),
+        session_key=f"{session_key}/prefetch" if prefetch else session_key,
+        admission_weight=PREFETCH_WEIGHT if prefetch else 1.0,
+        structure_threshold=MIN_STRUCTURE,
+        retry_drifted=st.session_state.get('retry_drifted', False) and not prefetch
+    )
+
+def record_generation(result):
+    """Remember the payload and latency of a finished generation for the sidebar"""
+    st.session_state.last_payload = result.payload
+    if result.timing:
+        timings = st.session_state.setdefault('request_timings', [])
+        timings.append(result.timing)
+        del timings[:-REQUEST_TIMING_HISTORY]
+
+def format_bytes(num_bytes):
+    """Human-readable byte count"""
+    for unit in ["B", "KB", "MB"]:
+        if abs(num_bytes) < 1024:
+            return f"{num_bytes:.0f} {unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.1f} GB"
+
+def render_sidebar_stats(container):
+    """Show the gallery size and response cache counters"""
+    cache_stats = get_response_cache().stats()
+    with container.container():
+        col_stat1, col_stat2 = st.columns(2)
+        with col_stat1:
+            st.metric("Furnished Rooms", len(st.session_state.furnished_rooms))
+        with col_stat2:
+            st.metric(
+                "Cache Hits / Misses",
+                f"{cache_stats['hits']} / {cache_stats['misses']}",
+                help=f"{cache_stats['entries']} cached responses on disk"
+            )
+        
+        timings = st.session_state.get('request_timings')
+        if timings:
+            last = timings[-1]
+            avg_ttfb = sum(timing.ttfb for timing in timings) / len(timings)
+            avg_total = sum(timing.total for timing in timings) / len(timings)
+            st.caption(
+                f"Last request: first part after {last.ttfb:.1f}s, done after {last.total:.1f}s"
+                f"{'' if last.streamed else ' (blocking)'} | "
+                f"Last {len(timings)} avg: {avg_ttfb:.1f}s / {avg_total:.1f}s"
+            )
+        
+        jobs = get_job_queue().stats()
+        if jobs['queued'] or jobs['running']:
+            admission = get_admission().stats()
+            st.caption(
+                f"All sessions: {jobs['running']} jobs running, {jobs['queued']} waiting for a worker | "
+                f"{admission['in_flight']} model requests in flight, {admission['waiting']} in line"
+            )
+        
+        prefetch = get_prefetcher().stats()
+        if prefetch['requested']:
+            st.caption(
+                f"Prefetch (all sessions): {prefetch['generated']} generated, {prefetch['hits']} used "
+                f"({prefetch['hit_rate']:.0%} hit rate) | "
+                f"{get_prefetcher().remaining(st.session_state.session_id)} left for this session"
+            )
+        
+        payload = st.session_state.get('last_payload')
+        if payload:
+            saved = payload['original_bytes'] - payload['encoded_bytes']
+            st.caption(
+                f"Last request images: {format_bytes(payload['original_bytes'])} → "
+                f"{format_bytes(payload['encoded_bytes'])} ({format_bytes(saved)} saved)"
+            )
+
+def render_request_estimate(estimate):
+    """Show the approximate size of the request the generate buttons would send"""
+    st.caption(
+        f"Estimated request size: ~{estimate.prompt_tokens:,} prompt tokens + ~{estimate.image_tokens:,} image tokens, "
+        f"{format_bytes(estimate.upload_bytes)} of images (each style variation is a request of about this size)"
+    )
+    if estimate.trimmed:
+        st.caption(
+            f"The prompt was shortened to fit the {estimate.token_budget:,}-token budget: furniture descriptions "
+            "are summarized first, then the special instructions are cut"
+        )
+
+def render_diagnostics(container):
+    """Show p50/p95 of every recorded stage and payload size"""
+    summaries = get_metrics().summary()
+    with container.container():
+        if not summaries:
+            st.caption("No measurements yet")
+            return
+        rows = []
+        for name, summary in summaries.items():
+            if name.endswith("_bytes"):
+                p50, p95 = format_bytes(summary.p50), format_bytes(summary.p95)
+            elif name.endswith("_tokens"):
+                p50, p95 = f"{summary.p50:.0f} tokens", f"{summary.p95:.0f} tokens"
+            elif name.endswith("_ratio"):
+                p50, p95 = f"{summary.p50:.0%}", f"{summary.p95:.0%}"
+            else:
+                p50, p95 = f"{summary.p50 * 1000:.1f} ms", f"{summary.p95 * 1000:.1f} ms"
+            rows.append({'Metric': name, 'Count': summary.count, 'p50': p50, 'p95': p95})
+        st.dataframe(rows, hide_index=True, use_container_width=True)
+        counters = get_metrics().counters()
+        if counters:
+            st.caption(" | ".join(f"{name}: {value}" for name, value in sorted(counters.items())))
+
+def display_response(response, slots):
+    """Display response parts (text and images), called again as a streamed response grows
+    
+    `slots` holds one placeholder per part already shown: the last text part
+    is redrawn as it grows and each image is drawn once, in order.
+    """
+    with get_metrics().timer("display_seconds"):
+        for i in range(max(len(slots) - 1, 0), len(response.parts)):
+            part = response.parts[i]
+            if i == len(slots):
+                slots.append(st.empty())
+            elif not part.text:
+                continue
+            
+            if part.text:
+                slots[i].markdown(part.text)
+            elif image := part.as_image():
+                slots[i].image(image.image_bytes, caption="Furnished Room", use_container_width=True)
+
+@st.cache_resource
+def get_room_index():
+    """Process-wide perceptual-hash index of furnished rooms"""
+    return RoomIndex(os.path.join(DATA_DIR, "room_index.jsonl"))
+
+def current_room_hashes(room_bytes, room_digest):
+    """Perceptual hashes of the uploaded room, computed once per upload"""
+    cached = st.session_state.get('room_hashes')
+    if not cached or cached[0] != room_digest:
+        cached = (room_digest, room_hashes(room_bytes))
+        st.session_state.room_hashes = cached
+    return cached[1]
+
+def find_duplicate_room(room_bytes, room_digest, preferences, uploaded_furniture, model_id, draft=False):
+    """This session's earlier result for a near-identical room and the same request, as (distance, record), or None"""
+    store = get_gallery_store()
+    fingerprint = request_fingerprint(preferences, furniture_cache_items(uploaded_furniture), model_id, draft)
+    return get_room_index().find(
+        current_room_hashes(room_bytes, room_digest),
+        fingerprint,
+        is_available=lambda record: os.path.exists(store.blob_path(record['furnished'])),
+        session=st.session_state.session_id
+    )
+
+def generate_without_reuse(mode):
+    """Run the same generation again, ignoring near-duplicate results"""
+    st.session_state.skip_duplicate_check = mode
+
+def show_reused_result(distance, mode, label):
+    """Explain that an earlier result is shown and offer a fresh generation"""
+    st.info(
+        f"This room matches one furnished earlier with the same preferences "
+        f"(hash distance {distance}/64), so that result is reused instead of generating a new one."
+    )
+    st.button(label, on_click=generate_without_reuse, args=(mode,), key=f"regenerate_{mode}")
+
+def gallery_entry(furnished_digest):
+    """This session's gallery entry holding a furnished image, or None"""
+    return next((room for room in st.session_state.furnished_rooms if room['furnished'] == furnished_digest), None)
+
+@st.cache_resource
+def get_gallery_store():
+    """Process-wide on-disk store for gallery images"""
+    return GalleryStore(os.path.join(DATA_DIR, "gallery"))
+
+def keep_gallery_alive():
+    """Mark this session's gallery as active and run the expiry sweep when due"""
+    now = time.time()
+    if now - st.session_state.get('gallery_touched', 0) > 300:
+        store = get_gallery_store()
+        store.touch_session(st.session_state.session_id)
+        store.maybe_sweep()
+        st.session_state.gallery_touched = now
+
+def save_furnished_room(original_bytes, furnished_bytes, preferences, filename, uploaded_furniture=None, model_id=None,
+                        edit_of=None, draft=False, structure=None):
+    """Save furnished room images to the gallery store and a small handle to session state
+    
+    With `model_id`, the room is also added to the near-duplicate index for that request.
+    `edit_of` is the gallery entry this one refines; the new entry becomes the
+    next version in that entry's chain. `draft` marks a low-resolution draft
+    render that can be finalized later. `structure`, the result's
+    StructureReport, is kept as its scores and a change mask image.
+    The result's color palette is kept too, and indexed for the color search.
+    Returns the new entry.
+    """
+    store = get_gallery_store()
+    metrics = get_metrics()
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     safe_filename = f"{timestamp}_{filename}"
-    st.session_state.furnished_rooms.append({
-        'original': original_image,
-        'furnished': furnished_image,
-        'preferences': preferences,
-        'uploaded_furniture': uploaded_furniture,
-        'filename': safe_filename,
-        'timestamp': timestamp
-    })
-
-def create_room_prompt(preferences, uploaded_furniture_images=None):
-    """Create a detailed prompt based on user preferences and uploaded furniture"""
-    style = preferences.get('style', 'modern')
-    color_scheme = preferences.get('color_scheme', 'neutral')
-    furniture_style = preferences.get('furniture_style', 'contemporary')
-    room_type = preferences.get('room_type', 'living room')
-    lighting = preferences.get('lighting', 'natural')
-    additional_items = preferences.get('additional_items', [])
-    
-    prompt = f"""
-    Transform this room into a beautifully furnished {room_type} with the following specifications:
-    
-    Style: {style}
-    Color Scheme: {color_scheme}
-    Furniture Style: {furniture_style}
-    Lighting: {lighting}
-    
-    Additional Requirements:
-    - Add appropriate furniture for a {room_type}
-    - Maintain the room's architectural features and layout
-    - Ensure the furniture fits the space proportionally
-    - Create a cohesive design that matches the {style} style
-    - Use {color_scheme} colors throughout
-    - Add {lighting} lighting elements
+    with metrics.timer("gallery_save_seconds"):
+        entry = {
+            'id': uuid.uuid4().hex,
+            'original': store.put_bytes(original_bytes),
+            'furnished': store.put_bytes(furnished_bytes),
+            'preferences': preferences,
+            'uploaded_furniture': [
+                {
+                    'digest': store.put_bytes(furniture['data']),
+                    'description': furniture['description'],
+                    'filename': furniture['filename']
+                }
+                for furniture in uploaded_furniture
+            ] if uploaded_furniture else None,
+            'filename': safe_filename,
+            'timestamp': timestamp,
+            'render': "draft" if draft else "final"
+        }
+        if edit_of:
+            entry.update(
+                edit_of=edit_of['id'],
+                root=edit_of.get('root', edit_of['id']),
+                version=edit_of.get('version', 1) + 1
+            )
+        if structure:
+            entry['structure'] = {
+                'ssim': structure.ssim,
+                'edge_preservation': structure.edge_preservation,
+                'changed_fraction': structure.changed_fraction,
+                'drifted': structure.drifted,
+                'change_mask': store.put_bytes(change_mask_overlay(furnished_bytes, structure))
+            }
+        with metrics.timer("palette_seconds"):
+            palette = extract_palette(furnished_bytes)
+        entry['palette'] = {'colors': palette.colors, 'weights': [round(weight, 4) for weight in palette.weights]}
+        dropped = store.add_entry(st.session_state.session_id, entry)
+    
+    get_palette_index().add(
+        palette,
+        preferences['style'],
+        preferences['room_type'],
+        st.session_state.session_id,
+        entry=entry['id'],
+        furnished=entry['furnished'],
+        color_scheme=preferences['color_scheme'],
+        render=entry['render']
+    )
+    
+    if model_id:
+        get_room_index().add(
+            current_room_hashes(original_bytes, entry['original']),
+            request_fingerprint(preferences, furniture_cache_items(uploaded_furniture), model_id, draft),
+            session=st.session_state.session_id,
+            original=entry['original'],
+            furnished=entry['furnished']
+        )
+    
+    # Catalog items used in a result sort first in later catalog browsing
+    catalog_digests = [furniture['digest'] for furniture in uploaded_furniture or [] if furniture['digest'] in st.session_state.catalog_picks]
+    if catalog_digests:
+        get_furniture_catalog().mark_used(catalog_digests)
+    
+    # Only the thumbnail lives in memory; full images are read from disk when shown
+    with metrics.timer("gallery_thumbnail_seconds"):
+        entry['thumbnail'] = make_thumbnail(furnished_bytes)
+    st.session_state.furnished_rooms.append(entry)
+    
+    if dropped:
+        dropped_ids = {room['id'] for room in dropped}
+        st.session_state.furnished_rooms = [room for room in st.session_state.furnished_rooms if room['id'] not in dropped_ids]
+        st.warning(f"Gallery limit reached: removed {len(dropped)} of your oldest rooms.")
+    
+    return entry
+
+@st.cache_resource
+def get_palette_index():
+    """Process-wide color palette index of saved furnished rooms, kept next to the gallery; searches are per session"""
+    return PaletteIndex(os.path.join(DATA_DIR, "gallery", "palettes.jsonl"))
+
+def render_palette(palette):
+    """A bar of a room's palette colors, each as wide as the share of the image it covers"""
+    swatches = "".join(
+        f'<div title="{color}" style="flex: {weight:.4f}; background-color: {color};"></div>'
+        for color, weight in zip(palette['colors'], palette['weights'])
+    )
+    st.markdown(
+        f'<div style="display: flex; height: 1.5rem; border-radius: 4px; overflow: hidden; border: 1px solid #e2e8f0;">{swatches}</div>',
+        unsafe_allow_html=True
+    )
+
+def search_by_palette(palette, label):
+    """Search rooms by every color of a palette instead of a single color"""
+    st.session_state.color_search = {'colors': palette['colors'], 'weights': palette['weights'], 'label': label}
+
+def clear_palette_search():
+    """Go back to searching by a single color"""
+    st.session_state.color_search = None
+
+def render_color_search(store):
+    """Search this session's gallery by color, optionally of one style and room type"""
+    palette_search = st.session_state.get('color_search')
+    col_color, col_style, col_room = st.columns(3)
+    with col_color:
+        if palette_search:
+            st.caption(f"Colors of {palette_search['label']}")
+            render_palette(palette_search)
+            st.button("Search by One Color", on_click=clear_palette_search, key="color_search_clear")
+            query = palette_from_colors(palette_search['colors'], palette_search['weights'])
+        else:
+            color = st.color_picker(
+                "Color",
+                value=DEFAULT_SEARCH_COLOR,
+                key="color_search_color",
+                help="e.g. a paint sample or a fabric you want the room to match"
+            )
+            query = palette_from_colors([color])
+    with col_style:
+        style_filter = st.selectbox("Style", ["any"] + DESIGN_STYLES, key="color_search_style")
+    with col_room:
+        room_filter = st.selectbox("Room Type", ["any"] + ROOM_TYPES, key="color_search_room_type")
+    
+    with get_metrics().timer("palette_search_seconds"):
+        results = get_palette_index().search(
+            query,
+            style=None if style_filter == "any" else style_filter,
+            room_type=None if room_filter == "any" else room_filter,
+            session=st.session_state.session_id,
+            limit=COLOR_SEARCH_RESULTS,
+            # Rooms dropped from the gallery (quota or expiry) are not shown again
+            is_available=lambda record: any(room['id'] == record['entry'] for room in st.session_state.furnished_rooms)
+        )
+    if not results:
+        st.caption("No furnished rooms match these filters.")
+        return
+    
+    result_cols = st.columns(GALLERY_COLUMNS)
+    for k, (distance, record) in enumerate(results):
+        with result_cols[k % GALLERY_COLUMNS]:
+            st.image(
+                store.thumbnail(record['furnished']),
+                caption=f"{record['style'].title()} {record['room_type']}, {record['color_scheme']} colors (distance {distance:.0f})",
+                use_container_width=True
+            )
+            render_palette(record)
+            st.button(
+                "Open",
+                key=f"color_search_open_{k}",
+                on_click=open_gallery_entry,
+                args=(record['entry'],),
+                use_container_width=True
+            )
+
+@st.cache_resource
+def get_furniture_catalog():
+    """Process-wide furniture catalog shared by all sessions"""
+    return FurnitureCatalog(os.path.join(DATA_DIR, "catalog"))
+
+def toggle_catalog_pick(item):
+    """Add a catalog item to this session's furniture, or take it out again"""
+    picks = st.session_state.catalog_picks
+    if item['digest'] in picks:
+        del picks[item['digest']]
+        return
+    catalog = get_furniture_catalog()
+    picks[item['digest']] = {
+        'description': item['description'],
+        'filename': item['filename'],
+        'data': catalog.get_bytes(item['digest']),
+        'digest': item['digest'],
+        'thumbnail': catalog.thumbnail(item['digest']),
+        'prepared': {}
+    }
+
+def save_uploads_to_catalog(uploaded_furniture):
+    """Add described uploads to the shared catalog with the style and tags entered next to the button"""
+    catalog = get_furniture_catalog()
+    catalog_style = st.session_state.catalog_save_style
+    tags = st.session_state.catalog_save_tags
+    for furniture in uploaded_furniture:
+        catalog.add(furniture['data'], furniture['description'], catalog_style, tags, furniture['filename'], furniture['digest'])
+    st.session_state.catalog_saved = len(uploaded_furniture)
+
+def render_furniture_catalog(uploaded_furniture):
+    """Save uploads to the catalog, and search it to pick items without uploading them again"""
+    catalog = get_furniture_catalog()
+    
+    if uploaded_furniture:
+        col_save1, col_save2 = st.columns(2)
+        with col_save1:
+            st.selectbox("Catalog Style", FURNITURE_STYLES, key="catalog_save_style")
+        with col_save2:
+            st.text_input("Tags", placeholder="e.g., sofa, gray, fabric", key="catalog_save_tags")
+        st.button(
+            f"Save {len(uploaded_furniture)} Uploaded Items to Catalog",
+            on_click=save_uploads_to_catalog,
+            args=(list(uploaded_furniture),)
+        )
+        if st.session_state.pop('catalog_saved', None):
+            st.success("Saved to the furniture catalog!")
+        st.divider()
+    
+    picks = st.session_state.catalog_picks
+    if picks:
+        st.caption("Picked: " + ", ".join(furniture['description'] for furniture in picks.values()))
+        st.button("Clear Picks", on_click=picks.clear)
+    
+    col_search1, col_search2 = st.columns([2, 1])
+    with col_search1:
+        query = st.text_input("Search Catalog", placeholder="e.g., gray sofa", key="catalog_query")
+    with col_search2:
+        style_filter = st.selectbox("Style", ["any"] + FURNITURE_STYLES, key="catalog_style")
+    
+    results = catalog.search(query, None if style_filter == "any" else style_filter, limit=CATALOG_RESULTS)
+    if not results:
+        st.caption("No catalog items match." if query or style_filter != "any" else "The catalog is empty. Save uploaded items to reuse them later.")
+        return
+    
+    result_cols = st.columns(CATALOG_COLUMNS)
+    for i, item in enumerate(results):
+        with result_cols[i % CATALOG_COLUMNS]:
+            st.image(catalog.thumbnail(item['digest']), caption=item['description'], use_container_width=True)
+            picked = item['digest'] in st.session_state.catalog_picks
+            st.button(
+                "Remove" if picked else "Use",
+                key=f"catalog_pick_{item['digest']}",
+                on_click=toggle_catalog_pick,
+                args=(item,),
+                use_container_width=True
+            )
+    if len(results) == CATALOG_RESULTS:
+        st.caption(f"Showing the first {CATALOG_RESULTS} matches. Refine the search to narrow them down.")
+
+def open_gallery_entry(room_id):
+    """Show a gallery entry at full size"""
+    st.session_state.gallery_open = room_id
+
+def close_gallery_entry():
+    """Collapse the opened gallery entry"""
+    st.session_state.gallery_open = None
+
+def version_chain(rooms, room_data):
+    """Gallery entries refined from the same first result as `room_data`, oldest first"""
+    root = room_data.get('root', room_data['id'])
+    return [room for room in rooms if room['id'] == root or room.get('root') == root]
+
+def finalize_draft(engine, store, room_data):
+    """Queue a full-quality render of a draft gallery entry with its exact preferences"""
+    room_bytes = store.get_bytes(room_data['original'])
+    furniture = [
+        {
+            'data': store.get_bytes(furniture['digest']),
+            'digest': furniture['digest'],
+            'description': furniture['description'],
+            'filename': furniture['filename']
+        }
+        for furniture in room_data.get('uploaded_furniture') or []
+    ]
+    submit_job(
+        "finalize",
+        f"Final render of the {room_data['preferences']['style']} {room_data['preferences']['room_type']}",
+        functools.partial(engine.generate, room_bytes, room_data['preferences'], furniture or None, room_data['original']),
+        [room_data['id']],
+        save=dict(
+            original_bytes=room_bytes,
+            filename=room_data['filename'].split("_", 2)[-1],
+            uploaded_furniture=furniture or None,
+            model_id=engine.model_id
+        ),
+        room_id=room_data['id']
+    )
+    st.rerun()
+
+def apply_gallery_edit(engine, store, room_data, instruction):
+    """Queue a refinement of a gallery entry; the result opens as its next version"""
+    furnished_bytes = store.get_bytes(room_data['furnished'])
+    # The gallery filename is "<date>_<time>_<upload name>"; keep the upload name
+    submit_job(
+        "edit",
+        f"Edit: {instruction}",
+        functools.partial(
+            engine.edit, furnished_bytes, instruction, room_data['preferences'], furnished_digest=room_data['furnished']
+        ),
+        [room_data['id'], instruction],
+        save=dict(
+            original_bytes=furnished_bytes,
+            filename=room_data['filename'].split("_", 2)[-1],
+            edit_of=room_data,
+            draft=room_data.get('render') == "draft"
+        ),
+        room_id=room_data['id']
+    )
+    st.rerun()
+
+@st.cache_resource
+def get_job_queue():
+    """Process-wide worker pool running generations outside the script thread"""
+    return JobQueue(JOB_WORKERS)
+
+def active_jobs():
+    """This session's jobs that were not collected yet, by job id"""
+    return {job_id: info for job_id, info in st.session_state.jobs.items() if not info.get('collected')}
+
+def submit_job(kind, label, fn, request, **info):
+    """Run a generation on the background workers and remember its job id in this session
+    
+    `request` identifies what is generated. Submitting the same request
+    while its job is running, or right after its result arrived (a double
+    click), returns the existing job instead of paying for it twice.
+    `info` holds what collect_job() needs to save the result.
+    """
+    key = content_digest(json.dumps([st.session_state.session_id, kind, request], sort_keys=True, default=str).encode())
+    now = time.time()
+    for job_id, job_info in list(st.session_state.jobs.items()):
+        if job_info.get('collected') and now - job_info['collected'] > JOB_REPEAT_SECONDS:
+            del st.session_state.jobs[job_id]
+        elif job_info['key'] == key:
+            return job_id
+    
+    clear_outcomes(kind)
+    job_id = get_job_queue().submit(fn, key=key, label=label)
+    st.session_state.jobs[job_id] = dict(info, kind=kind, label=label, key=key)
+    return job_id
+
+def run_variations_job(engine, room_bytes, preferences, variations, furniture, room_digest, max_concurrency, draft,
+                       on_update):
+    """Job function generating style variations, reporting the list of finished ones as it grows"""
+    finished = []
+    for outcome in engine.generate_variations(
+        room_bytes, preferences, variations, furniture, room_digest, max_concurrency, draft=draft
+    ):
+        finished.append(outcome)
+        on_update(list(finished))
+    return finished
+
+def single_style_request(room_digest, preferences, furniture, model_id, preprocess_settings, draft):
+    """What identifies a single-style generation, for job and prefetch keys"""
+    return [room_digest, preferences, furniture_cache_items(furniture), model_id, preprocess_settings, draft]
+
+def prefetch_key(request):
+    return content_digest(json.dumps(request, sort_keys=True, default=str).encode())
+
+def record_style_choice(style, color_scheme):
+    """Count this session's move from its previous single-style choice to this one"""
+    choice = (style, color_scheme)
+    previous = st.session_state.get('last_style_choice')
+    if previous:
+        get_transition_stats().record(previous, choice)
+    st.session_state.last_style_choice = choice
+
+def prefetch_likely_next(preferences, room_bytes, room_digest, furniture, model_id, preprocess_settings, draft):
+    """Start generating the style/color combinations most likely to be tried after `preferences`
+    
+    Nothing is prefetched while any request waits for a model request slot:
+    prefetching only uses spare capacity.
     """
+    if get_admission().stats()['waiting']:
+        return
+    engine = get_engine(model_id, preprocess_settings, stream=False, prefetch=True)
+    choices = get_transition_stats().likely_next(
+        (preferences['style'], preferences['color_scheme']), DESIGN_STYLES, COLOR_SCHEMES, PREFETCH_CANDIDATES
+    )
+    for style, color_scheme in choices:
+        candidate = dict(preferences, style=style, color_scheme=color_scheme)
+        get_prefetcher().submit(
+            st.session_state.session_id,
+            prefetch_key(single_style_request(room_digest, candidate, furniture, model_id, preprocess_settings, draft)),
+            functools.partial(engine.generate, room_bytes, candidate, furniture, room_digest, draft=draft)
+        )
+
+def generate_after_prefetch(prefetcher, prefetch, generate, on_update):
+    """Job function for a request that is being prefetched: wait for it, then read it from the response cache"""
+    # A failed prefetch just means the request is generated now
+    concurrent.futures.wait([prefetch])
+    result = generate(on_update=on_update)
+    prefetcher.consume(prefetch, result)
+    return result
+
+def clear_outcomes(kind):
+    """Drop the results of one kind of generation from the screen"""
+    for outcome_id, outcome in list(st.session_state.job_outcomes.items()):
+        if outcome['kind'] == kind:
+            del st.session_state.job_outcomes[outcome_id]
+
+def add_outcome(outcome, outcome_id=None):
+    """Show a finished generation's outcome until it is dismissed or a newer one of its kind replaces it"""
+    clear_outcomes(outcome['kind'])
+    st.session_state.job_outcomes[outcome_id or uuid.uuid4().hex] = outcome
+
+def dismiss_outcome(outcome_id):
+    st.session_state.job_outcomes.pop(outcome_id, None)
+
+def collect_variations(outcomes, info):
+    """Save finished variations to the gallery; returns the variations outcome fields"""
+    variations = list(info['variations'])
+    original = info.get('original')
+    for outcome in outcomes:
+        index = info['pending'][outcome.index]
+        name = outcome.variation['name']
+        if outcome.error:
+            variations[index] = {'name': name, 'error': f"{name} style failed: {str(outcome.error)}"}
+        elif outcome.result.image_bytes:
+            record_generation(outcome.result)
+            entry = save_furnished_room(
+                furnished_bytes=outcome.result.image_bytes,
+                preferences=outcome.result.preferences,
+                filename=f"{name.lower()}_{info['room_type']}.png",
+                structure=outcome.result.structure,
+                **info['save']
+            )
+            original = entry['original']
+            variations[index] = {
+                'name': name,
+                'furnished': entry['furnished'],
+                'preferences': outcome.result.preferences,
+                'structure': entry.get('structure')
+            }
+        else:
+            variations[index] = {'name': name, 'warning': f"No image was generated for the {name} style."}
+    return {'original': original, 'variations': variations}
+
+def collect_job(job_id, job, info):
+    """Save a finished job's result to the gallery and keep its outcome for display"""
+    kind = info['kind']
+    outcome = {'kind': kind, 'label': info['label']}
+    result = job.result
+    if job.error:
+        outcome['error'] = f"{JOB_ERRORS[kind]}: {str(job.error)}"
+    elif kind == "variations":
+        outcome.update(collect_variations(result, info))
+    else:
+        record_generation(result)
+        if not result.image_bytes:
+            outcome['warning'] = JOB_EMPTY_RESULTS[kind]
+        elif kind == "preview":
+            outcome.update(response=result.response, room_type=info['room_type'], style=info['style'])
+        else:
+            entry = save_furnished_room(
+                furnished_bytes=result.image_bytes, preferences=result.preferences, structure=result.structure,
+                **info['save']
+            )
+            if kind == "single":
+                outcome.update(
+                    original=entry['original'],
+                    furnished=entry['furnished'],
+                    preferences=result.preferences,
+                    draft=info['save']['draft'],
+                    text=response_text(result.response),
+                    structure=entry.get('structure')
+                )
+                if info.get('prefetch'):
+                    prefetch_likely_next(result.preferences, **info['prefetch'])
+            else:
+                # Finalized and edited rooms open in the gallery instead
+                st.session_state.gallery_open = entry['id']
+                outcome = None
     
-    if additional_items:
-        prompt += f"\n- Include these specific items: {', '.join(additional_items)}"
+    if outcome:
+        add_outcome(outcome, job_id)
+    # Only the idempotency key stays behind, to recognize a late repeated click
+    st.session_state.jobs[job_id] = {'key': info['key'], 'kind': kind, 'collected': time.time()}
+    get_job_queue().forget(job_id)
+
+def render_job_progress(job, info):
+    """Status of one running job, with the response or variations received so far"""
+    started = job.started or job.submitted
+    # Model requests of this session waiting for a slot shared with everyone else
+    position = get_admission().position(st.session_state.session_id)
+    if job.status == QUEUED:
+        st.info(f"{info['label']}: waiting for a free worker...")
+    elif position:
+        place, waiting = position
+        st.info(f"{info['label']}: waiting for a model request slot, number {place} of {waiting} in line...")
+    else:
+        st.info(f"{info['label']}: generating for {time.time() - started:.0f}s... You can keep working; the result is saved to your gallery.")
+    
+    if info['kind'] == "variations":
+        finished = job.progress or []
+        st.progress(len(finished) / len(info['pending']), text=f"Finished {len(finished)}/{len(info['pending'])} style variations")
+        variation_cols = st.columns(2)
+        for i, outcome in enumerate(finished):
+            with variation_cols[i % 2]:
+                name = outcome.variation['name']
+                if outcome.error:
+                    st.error(f"{name} style failed: {str(outcome.error)}")
+                elif outcome.result.image_bytes:
+                    st.image(outcome.result.image_bytes, caption=f"{name} Style", use_container_width=True)
+    elif job.progress is not None:
+        display_response(job.progress, [])
+
+def render_jobs():
+    """This session's running jobs; finished ones are collected and the whole app reruns to show them"""
+    queue = get_job_queue()
+    collected = False
+    for job_id, info in active_jobs().items():
+        job = queue.get(job_id)
+        if job is None:
+            # The worker pool went away with a server restart
+            add_outcome({'kind': info['kind'], 'error': f"{info['label']} was interrupted. Please try again."}, job_id)
+            st.session_state.jobs[job_id] = {'key': info['key'], 'kind': info['kind'], 'collected': time.time()}
+            collected = True
+        elif job.done:
+            collect_job(job_id, job, info)
+            collected = True
+        else:
+            render_job_progress(job, info)
+    if collected:
+        st.rerun()
+
+def render_structure_check(store, structure):
+    """Structure check of a furnished room against the empty room: a drift warning, scores and the change mask"""
+    if not structure:
+        return
+    if structure['drifted']:
+        st.warning(
+            f"The room's architecture may have changed: only {structure['edge_preservation']:.0%} of the empty room's "
+            "structural edges (walls, windows, doors) are still in place. Try generating again, or turn on "
+            "**Retry Drifted Rooms** in the sidebar."
+        )
+    with st.expander(f"Structure Check: {structure['edge_preservation']:.0%} of the room's edges kept"):
+        st.caption(
+            f"SSIM {structure['ssim']:.2f} | {structure['changed_fraction']:.0%} of the image changed (tinted red)"
+        )
+        st.image(store.get_bytes(structure['change_mask']), use_container_width=True)
+
+def render_single_outcome(store, outcome):
+    """Before/after comparison and the preferences of a furnished room"""
+    if outcome.get('text'):
+        st.markdown(outcome['text'])
+    st.success("Room furnished successfully!")
+    if outcome['draft']:
+        st.info("This is a quick draft. Open it in the gallery below and choose Finalize to render it at full quality.")
+    
+    # Show before/after comparison
+    st.header("Before & After Comparison")
+    
+    col_before, col_after = st.columns(2)
+    
+    with col_before:
+        st.subheader("Before")
+        st.image(store.get_bytes(outcome['original']), use_container_width=True)
+    
+    with col_after:
+        st.subheader("After")
+        st.image(store.get_bytes(outcome['furnished']), use_container_width=True)
     
-    if uploaded_furniture_images:
-        prompt += f"\n\nIMPORTANT: The user has uploaded specific furniture/accessory images that they want to see in this room. Please integrate these items naturally into the room design:"
-        for i, furniture_data in enumerate(uploaded_furniture_images):
-            prompt += f"\n- Furniture Item {i+1}: {furniture_data['description']} (from uploaded image)"
-        prompt += "\n- Make sure these uploaded items are prominently featured and well-integrated into the overall design"
-        prompt += "\n- Adjust the room's color scheme and other elements to complement these specific furniture pieces"
+    render_structure_check(store, outcome.get('structure'))
     
-    prompt += """
+    # Show preferences used
+    st.header("Design Specifications Used")
+    prefs = outcome['preferences']
+    col_spec1, col_spec2 = st.columns(2)
     
-    Make the room look realistic, lived-in, and professionally designed. Ensure all furniture and decor items are appropriate for the space and create a harmonious, inviting atmosphere.
+    with col_spec1:
+        st.markdown(f"**Room Type:** {prefs['room_type'].title()}")
+        st.markdown(f"**Style:** {prefs['style'].title()}")
+        st.markdown(f"**Color Scheme:** {prefs['color_scheme'].title()}")
+    
+    with col_spec2:
+        st.markdown(f"**Furniture Style:** {prefs['furniture_style'].title()}")
+        st.markdown(f"**Lighting:** {prefs['lighting'].title()}")
+        if prefs['additional_items']:
+            st.markdown(f"**Additional Items:** {', '.join(prefs['additional_items'])}")
+
+def render_variations_outcome(store, outcome):
+    """Grid of style variations with their details"""
+    st.header("Style Variations Comparison")
+    
+    # Show original room
+    if outcome['original']:
+        st.subheader("Original Room")
+        st.image(store.get_bytes(outcome['original']), caption="Original Room", use_container_width=True)
+    
+    st.subheader("Style Variations")
+    variation_cols = st.columns(2)
+    for i, variation in enumerate(outcome['variations']):
+        with variation_cols[i % 2]:
+            if variation.get('error'):
+                st.error(variation['error'])
+            elif variation.get('warning'):
+                st.warning(variation['warning'])
+            else:
+                caption = f"{variation['name']} Style{' (reused)' if variation.get('reused') else ''}"
+                st.image(store.get_bytes(variation['furnished']), caption=caption, use_container_width=True)
+                structure = variation.get('structure')
+                if structure and structure['drifted']:
+                    st.warning(
+                        f"The room's architecture may have changed ({structure['edge_preservation']:.0%} of its edges kept)"
+                    )
+    
+    # Keep the details in the same order as the grid
+    generated_variations = [variation for variation in outcome['variations'] if variation.get('furnished')]
+    failed_variations = [variation['name'] for variation in outcome['variations'] if not variation.get('furnished')]
+    
+    if generated_variations:
+        st.success(f"Generated {len(generated_variations)} style variations!")
+        if failed_variations:
+            st.warning(f"Some variations failed: {', '.join(failed_variations)}")
+        
+        # Show style details
+        st.subheader("Style Details")
+        for variation in generated_variations:
+            with st.expander(f"{variation['name']} Style Details"):
+                prefs = variation['preferences']
+                col_detail1, col_detail2 = st.columns(2)
+                
+                with col_detail1:
+                    st.markdown(f"**Style:** {prefs['style'].title()}")
+                    st.markdown(f"**Color Scheme:** {prefs['color_scheme'].title()}")
+                
+                with col_detail2:
+                    st.markdown(f"**Furniture Style:** {prefs['furniture_style'].title()}")
+                    st.markdown(f"**Lighting:** {prefs['lighting'].title()}")
+    else:
+        st.warning("No style variations were generated. Please try again.")
+
+def render_job_outcomes():
+    """Results of this session's finished generations, newest first"""
+    store = get_gallery_store()
+    for outcome_id, outcome in reversed(list(st.session_state.job_outcomes.items())):
+        if outcome.get('error'):
+            st.error(outcome['error'])
+        elif outcome.get('warning'):
+            st.warning(outcome['warning'])
+        elif outcome['kind'] == "single":
+            render_single_outcome(store, outcome)
+        elif outcome['kind'] == "variations":
+            render_variations_outcome(store, outcome)
+        elif outcome['kind'] == "preview":
+            display_response(outcome['response'], [])
+            st.success("Furniture preview generated!")
+            st.info(f"Preview shows your furniture in a {outcome['style']} {outcome['room_type']}")
+        st.button("Dismiss", key=f"dismiss_{outcome_id}", on_click=dismiss_outcome, args=(outcome_id,))
+
+def build_gallery_zip(store, entries):
+    """Write the gallery into a spooled temporary ZIP and return the archive bytes
+    
+    The archive is built entry by entry without holding the images, but
+    Streamlit serves downloads from bytes, so the finished archive is read
+    back whole: peak memory grows with the archive's size.
     """
+    with tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_MAX_BYTES) as spooled:
+        write_gallery_zip(store, entries, spooled)
+        spooled.seek(0)
+        return spooled.read()
+
+def export_gallery_image(store, digest, export_settings):
+    """Download bytes of a gallery image, encoded on first use and timed"""
+    with get_metrics().timer("gallery_export_seconds"):
+        return store.export_bytes(digest, **export_settings)
+
+def download_file_name(filename, export_settings):
+    """Swap a gallery filename's extension for the download format's"""
+    return f"{os.path.splitext(filename)[0]}.{EXPORT_FORMATS[export_settings['format']][1]}"
+
+def render_gallery_entry(store, room_data, export_settings, engine, rooms):
+    """Render one gallery entry at full size with its preferences, versions, downloads and edit box"""
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        st.subheader("Before")
+        st.image(store.get_bytes(room_data['original']), use_container_width=True)
     
-    return prompt
+    with col2:
+        st.subheader("After")
+        st.image(store.get_bytes(room_data['furnished']), use_container_width=True)
+    
+    render_structure_check(store, room_data.get('structure'))
+    
+    if room_data.get('palette'):
+        col_palette, col_similar = st.columns([3, 1])
+        with col_palette:
+            render_palette(room_data['palette'])
+        with col_similar:
+            st.button(
+                "Find Similar Colors",
+                key=f"palette_search_{room_data['id']}",
+                on_click=search_by_palette,
+                args=(room_data['palette'], f"the {room_data['preferences']['style']} {room_data['preferences']['room_type']}"),
+                use_container_width=True
+            )
+    
+    # Show preferences
+    st.subheader("Design Preferences")
+    prefs = room_data['preferences']
+    col_pref1, col_pref2 = st.columns(2)
+    
+    with col_pref1:
+        st.markdown(f"**Room Type:** {prefs['room_type'].title()}")
+        st.markdown(f"**Style:** {prefs['style'].title()}")
+        st.markdown(f"**Color Scheme:** {prefs['color_scheme'].title()}")
+    
+    with col_pref2:
+        st.markdown(f"**Furniture Style:** {prefs['furniture_style'].title()}")
+        st.markdown(f"**Lighting:** {prefs['lighting'].title()}")
+        if prefs['additional_items']:
+            st.markdown(f"**Additional Items:** {', '.join(prefs['additional_items'])}")
+    
+    if prefs.get('edit_instruction'):
+        st.markdown(f"**Edit (version {room_data['version']}):** {prefs['edit_instruction']}")
+    
+    # Finalize and edit jobs started from this entry open their result here when they finish
+    running = [info['label'] for info in active_jobs().values() if info.get('room_id') == room_data['id']]
+    if running:
+        st.info(f"In progress: {', '.join(running)}. The result opens here when it is ready.")
+    
+    # Drafts were rendered from downscaled images with a short prompt
+    if room_data.get('render') == "draft":
+        if room_data.get('edit_of'):
+            st.info("This is a refined low-resolution draft. Finalize its first version, then refine the final render.")
+        else:
+            st.info("This is a low-resolution draft.")
+            if st.button("Finalize at Full Quality", key=f"finalize_{room_data['id']}", type="primary"):
+                finalize_draft(engine, store, room_data)
+    
+    # Every version refined from the same first result; the "Before" image is the previous version
+    chain = version_chain(rooms, room_data)
+    if len(chain) > 1:
+        st.caption("Versions")
+        version_cols = st.columns(len(chain))
+        for col, version in zip(version_cols, chain):
+            with col:
+                st.button(
+                    f"v{version.get('version', 1)}",
+                    key=f"gallery_version_{room_data['id']}_{version['id']}",
+                    on_click=open_gallery_entry,
+                    args=(version['id'],),
+                    disabled=version['id'] == room_data['id'],
+                    use_container_width=True
+                )
+    
+    # Show uploaded furniture if any
+    if room_data.get('uploaded_furniture'):
+        st.subheader("Uploaded Furniture Used")
+        for j, furniture in enumerate(room_data['uploaded_furniture']):
+            col_furn_display1, col_furn_display2 = st.columns([1, 3])
+            with col_furn_display1:
+                st.image(store.thumbnail(furniture['digest']), caption=f"Item {j+1}", width=100)
+            with col_furn_display2:
+                st.markdown(f"**{furniture['description']}**")
+    
+    # Download buttons (images are encoded on click and memoized on disk)
+    col_dl1, col_dl2 = st.columns(2)
+    mime_type = EXPORT_FORMATS[export_settings['format']][0]
+    
+    with col_dl1:
+        # Download original
+        st.download_button(
+            label="Download Original",
+            data=functools.partial(export_gallery_image, store, room_data['original'], export_settings),
+            file_name=download_file_name(f"original_{room_data['filename']}", export_settings),
+            mime=mime_type,
+            key=f"orig_dl_{room_data['id']}"
+        )
+    
+    with col_dl2:
+        # Download furnished
+        st.download_button(
+            label="Download Furnished",
+            data=functools.partial(export_gallery_image, store, room_data['furnished'], export_settings),
+            file_name=download_file_name(room_data['filename'], export_settings),
+            mime=mime_type,
+            key=f"furn_dl_{room_data['id']}"
+        )
+    
+    # Refine: only this furnished image and a short instruction are sent, not the room and furniture again
+    st.subheader("Refine This Design")
+    edit_instruction = st.text_input(
+        "What should change?",
+        placeholder="e.g., Make the sofa blue",
+        key=f"edit_instruction_{room_data['id']}"
+    )
+    if st.button("Apply Edit", key=f"edit_apply_{room_data['id']}", disabled=not edit_instruction.strip()):
+        apply_gallery_edit(engine, store, room_data, edit_instruction.strip())
+
+keep_gallery_alive()
 
 # Main header
 st.markdown('<h1 class="main-header">AI Room Furnishing Assistant</h1>', unsafe_allow_html=True)
@@ -226,15 +1341,42 @@ with st.sidebar:
     st.header("Configuration")
     
     # API Key input
-    api_key = st.text_input(
-        "Google AI API Key",
-        type="password",
-        help="Get your API key from https://aistudio.google.com/apikey"
-    )
+    if requires_api_key(MODEL_BACKEND):
+        api_key = st.text_input(
+            "Google AI API Key",
+            type="password",
+            help="Get your API key from https://aistudio.google.com/apikey"
+        )
+    else:
+        # Offline backends need no key; every session shares one client
+        api_key = f"{MODEL_BACKEND}-backend"
+        st.info(f"Using the local {MODEL_BACKEND} model backend, no API key needed")
     
     if api_key:
         if initialize_client(api_key):
-            st.success("API Key loaded successfully!")
+            if requires_api_key(MODEL_BACKEND):
+                st.success("API Key loaded successfully!")
+            
+            # Connection setup cost vs request cost for this key's client
+            timings = get_client_pool().timings(api_key)
+            if timings and timings['requests']:
+                avg_connect_ms = 1000 * timings['connect_seconds'] / max(timings['connections'], 1)
+                avg_request_s = timings['request_seconds'] / timings['requests']
+                st.caption(
+                    f"Connections: {timings['connections']} opened ({avg_connect_ms:.0f} ms avg setup), "
+                    f"{timings['reused_connections']} reused | "
+                    f"Requests: {timings['requests']} ({avg_request_s:.1f} s avg)"
+                )
+            
+            # Retries and throttling across all sessions sharing the scheduler
+            scheduler_stats = get_scheduler().stats()
+            breaker = scheduler_stats['breakers'].get(st.session_state.request_key, "closed")
+            if scheduler_stats['retries'] or scheduler_stats['throttled'] or breaker != "closed":
+                st.caption(
+                    f"Retries: {scheduler_stats['retries']} | "
+                    f"Rate-limit waits: {scheduler_stats['throttled']} "
+                    f"({scheduler_stats['throttle_seconds']:.0f} s) | API circuit: {breaker}"
+                )
         else:
             st.error("Invalid API Key")
     else:
@@ -249,10 +1391,106 @@ with st.sidebar:
         help="Currently only Gemini 2.5 Flash Image Preview is supported"
     )
     
+    # Concurrency cap for style variations
+    max_concurrency = st.slider(
+        "Parallel Variation Requests",
+        min_value=1,
+        max_value=len(STYLE_VARIATIONS),
+        value=DEFAULT_MAX_CONCURRENCY,
+        help="How many style variations are generated at the same time"
+    )
+    
+    # Streaming shows text and the image as they arrive; off falls back to blocking requests
+    stream_responses = st.toggle(
+        "Stream Responses",
+        value=True,
+        help="Show the model's text and image as soon as they arrive instead of waiting for the full response"
+    )
+    
+    # Drafts send heavily downscaled images and a compact prompt; finalize the keepers from the gallery
+    draft_mode = st.toggle(
+        "Draft Mode",
+        value=False,
+        help="Fast, low-cost previews from small images and a short prompt. Open a draft in the gallery to render it at full quality"
+    )
+    
+    # After a single style, generate the styles and color schemes most often tried next, within a per-session budget
+    prefetch_next = st.toggle(
+        "Prefetch Likely Next Styles",
+        value=False,
+        help=f"Generate the {PREFETCH_CANDIDATES} style or color scheme changes you are most likely to try next in the "
+             f"background, so trying them is instant. Uses up to {PREFETCH_SESSION_BUDGET} extra requests per session"
+    )
+    
+    # Results whose walls, windows or camera angle moved are generated once more with a reminder
+    st.toggle(
+        "Retry Drifted Rooms",
+        value=False,
+        key="retry_drifted",
+        help="If a furnished room keeps too little of the empty room's structure, generate it once more "
+             "with a reminder to keep the architecture, and keep the better result. Costs an extra request"
+    )
+    
+    # Near-duplicate rooms (re-exports, small crops) reuse earlier results for the same preferences
+    reuse_duplicates = st.toggle(
+        "Reuse Near-Duplicate Rooms",
+        value=True,
+        help="If a nearly identical room was already furnished with the same preferences, show that result instead of generating again"
+    )
+    
+    st.divider()
+    
+    # Upload preprocessing applied before images are sent to the model
+    st.subheader("Image Preprocessing")
+    max_image_edge = st.select_slider(
+        "Max Image Edge (px)",
+        options=[768, 1024, 1536, 2048, 3072],
+        value=DEFAULT_MAX_EDGE,
+        help="Uploads are downscaled so their longest side is at most this many pixels"
+    )
+    upload_format = st.radio(
+        "Upload Format",
+        list(OUTPUT_FORMATS),
+        horizontal=True,
+        help="Images are re-encoded in this format without metadata"
+    )
+    upload_quality = st.slider("Upload Quality", min_value=50, max_value=95, value=DEFAULT_QUALITY)
+    preprocess_settings = PreprocessSettings(max_image_edge, upload_format, upload_quality)
+    
     st.divider()
     
-    # Furnished rooms counter
-    st.metric("Furnished Rooms", len(st.session_state.furnished_rooms))
+    # Furnished rooms counter and cache stats (refreshed again at the end of the run)
+    sidebar_stats = st.empty()
+    render_sidebar_stats(sidebar_stats)
+    
+    # Where the time goes: p50/p95 per stage (refreshed again at the end of the run)
+    with st.expander("Diagnostics"):
+        st.toggle(
+            "Collect Metrics",
+            value=get_metrics().enabled,
+            key="collect_metrics",
+            on_change=set_metrics_enabled,
+            help="Time every generation stage and rerun; applies to all sessions of this app"
+        )
+        diagnostics = st.empty()
+        render_diagnostics(diagnostics)
+        col_export1, col_export2 = st.columns(2)
+        with col_export1:
+            st.download_button(
+                "JSON Lines",
+                data=get_metrics().to_jsonl,
+                file_name="room_furnishing_metrics.jsonl",
+                mime="application/jsonl",
+                use_container_width=True
+            )
+        with col_export2:
+            st.download_button(
+                "Prometheus",
+                data=get_metrics().to_prometheus,
+                file_name="room_furnishing_metrics.prom",
+                mime="text/plain",
+                use_container_width=True
+            )
 
 # Main content area
 if not api_key:
@@ -277,7 +1515,11 @@ with col_upload1:
     )
     
     if uploaded_file:
-        original_image = PILImage.open(uploaded_file)
+        with get_metrics().timer("room_decode_seconds"):
+            original_image = PILImage.open(uploaded_file)
+            original_image.load()
+        room_bytes = uploaded_file.getvalue()
+        room_digest = content_digest(room_bytes)
         st.image(original_image, caption="Original Room", use_container_width=True)
         st.info(f"Image size: {original_image.size[0]}x{original_image.size[1]} pixels")
 
@@ -291,16 +1533,16 @@ with col_upload2:
         key="furniture_upload"
     )
     
+    # Decoded, thumbnailed and hashed once per upload; reruns only look them up
+    furniture_assets = st.session_state.furniture_registry.sync(uploaded_furniture_files)
+    st.session_state.uploaded_furniture = []
+    
     if uploaded_furniture_files:
-        st.session_state.uploaded_furniture = []
-        
-        for i, furniture_file in enumerate(uploaded_furniture_files):
-            furniture_image = PILImage.open(furniture_file)
-            
+        for i, asset in enumerate(furniture_assets):
             col_furn1, col_furn2 = st.columns([1, 2])
             
             with col_furn1:
-                st.image(furniture_image, caption=f"Item {i+1}", use_container_width=True)
+                st.image(asset.thumbnail, caption=f"Item {i+1}", use_container_width=True)
             
             with col_furn2:
                 furniture_description = st.text_input(
@@ -311,16 +1553,17 @@ with col_upload2:
                 )
                 
                 if furniture_description:
-                    st.session_state.uploaded_furniture.append({
-                        'image': furniture_image,
-                        'description': furniture_description,
-                        'filename': furniture_file.name
-                    })
-        
-        if st.session_state.uploaded_furniture:
-            st.success(f"{len(st.session_state.uploaded_furniture)} items ready!")
-        else:
-            st.warning("Please add descriptions for your furniture items")
+                    st.session_state.uploaded_furniture.append(asset.as_furniture(furniture_description))
+    
+    # Furniture saved by earlier sessions, picked without uploading it again
+    with st.expander(f"Furniture Catalog ({len(st.session_state.catalog_picks)} picked)"):
+        render_furniture_catalog(st.session_state.uploaded_furniture)
+    st.session_state.uploaded_furniture += list(st.session_state.catalog_picks.values())
+    
+    if st.session_state.uploaded_furniture:
+        st.success(f"{len(st.session_state.uploaded_furniture)} items ready!")
+    elif uploaded_furniture_files:
+        st.warning("Please add descriptions for your furniture items")
 
 # Design Preferences Section
 st.header("Design Preferences")
@@ -332,28 +1575,28 @@ with col_pref1:
     # Room type
     room_type = st.selectbox(
         "Room Type",
-        ["living room", "bedroom", "dining room", "kitchen", "office", "bathroom", "nursery", "study room"],
+        ROOM_TYPES,
         help="What type of room is this?"
     )
     
     # Style
     style = st.selectbox(
         "Design Style",
-        ["modern", "minimalist", "traditional", "contemporary", "scandinavian", "industrial", "bohemian", "rustic", "mid-century modern", "art deco"],
+        DESIGN_STYLES,
         help="Choose your preferred design style"
     )
     
     # Color scheme
     color_scheme = st.selectbox(
         "Color Scheme",
-        ["neutral", "warm", "cool", "monochrome", "pastel", "bold", "earth tones", "jewel tones", "black and white"],
+        COLOR_SCHEMES,
         help="Select your preferred color palette"
     )
     
     # Furniture style
     furniture_style = st.selectbox(
         "Furniture Style",
-        ["contemporary", "vintage", "modern", "traditional", "industrial", "scandinavian", "mid-century", "rustic", "luxury"],
+        FURNITURE_STYLES,
         help="What style of furniture do you prefer?"
     )
     
@@ -388,13 +1631,35 @@ with col_pref2:
 
 # Generation Options
 st.header("Generate Room Designs")
+
+# What a request with the current preferences would send, before anything is clicked
+if uploaded_file:
+    render_request_estimate(get_engine(model_id, preprocess_settings, stream_responses).estimate_request(
+        room_bytes,
+        {
+            'room_type': room_type,
+            'style': style,
+            'color_scheme': color_scheme,
+            'furniture_style': furniture_style,
+            'lighting': lighting,
+            'additional_items': additional_items,
+            'special_instructions': special_instructions
+        },
+        st.session_state.uploaded_furniture or None,
+        room_digest,
+        draft_mode
+    ))
+
 col_gen1, col_gen2, col_gen3 = st.columns([1, 1, 1])
 
+# A "generate a new result" click on a reused result repeats the generation without reuse
+skip_duplicate_check = st.session_state.pop('skip_duplicate_check', None)
+
 with col_gen1:
-    single_style = st.button("Generate Single Style", type="primary", use_container_width=True)
+    single_style = st.button("Generate Single Style", type="primary", use_container_width=True) or skip_duplicate_check == "single"
 
 with col_gen2:
-    multiple_styles = st.button("Generate 4 Style Variations", type="secondary", use_container_width=True)
+    multiple_styles = st.button("Generate 4 Style Variations", type="secondary", use_container_width=True) or skip_duplicate_check == "variations"
 
 with col_gen3:
     if st.session_state.uploaded_furniture:
@@ -402,305 +1667,258 @@ with col_gen3:
 
 # Process single style generation
 if single_style and uploaded_file:
-    with st.spinner("AI is furnishing your room... This may take a moment."):
-        try:
-            # Create preferences dictionary
-            preferences = {
-                'room_type': room_type,
-                'style': style,
-                'color_scheme': color_scheme,
-                'furniture_style': furniture_style,
-                'lighting': lighting,
-                'additional_items': additional_items,
-                'special_instructions': special_instructions
-            }
-            
-            # Create the prompt
-            uploaded_furniture_data = st.session_state.uploaded_furniture if st.session_state.uploaded_furniture else None
-            base_prompt = create_room_prompt(preferences, uploaded_furniture_data)
-            if special_instructions:
-                base_prompt += f"\n\nSpecial Instructions: {special_instructions}"
-            
-            # Prepare content for AI generation
-            content_list = [base_prompt, original_image]
-            
-            # Add uploaded furniture images to the content
-            if uploaded_furniture_data:
-                for furniture in uploaded_furniture_data:
-                    content_list.append(furniture['image'])
-            
-            # Generate furnished room
-            response = st.session_state.client.models.generate_content(
-                model=model_id,
-                contents=content_list,
-                config=types.GenerateContentConfig(
-                    response_modalities=['Text', 'Image']
-                )
+    try:
+        # Create preferences dictionary
+        preferences = {
+            'room_type': room_type,
+            'style': style,
+            'color_scheme': color_scheme,
+            'furniture_style': furniture_style,
+            'lighting': lighting,
+            'additional_items': additional_items,
+            'special_instructions': special_instructions
+        }
+        
+        uploaded_furniture_data = st.session_state.uploaded_furniture if st.session_state.uploaded_furniture else None
+        record_style_choice(style, color_scheme)
+        
+        # Reuse the result of a near-identical room furnished with the same preferences
+        duplicate = None
+        if reuse_duplicates and not skip_duplicate_check:
+            duplicate = find_duplicate_room(
+                room_bytes, room_digest, preferences, uploaded_furniture_data, model_id, draft_mode
             )
-            
-            # Display the response
-            furnished_image = display_response(response)
-            
-            if furnished_image:
-                # Save to session
-                save_furnished_room(original_image, furnished_image, preferences, f"furnished_{room_type}.png", uploaded_furniture_data)
-                
-                st.success("Room furnished successfully!")
-                
-                # Show before/after comparison
-                st.header("Before & After Comparison")
-                
-                col_before, col_after = st.columns(2)
-                
-                with col_before:
-                    st.subheader("Before")
-                    st.image(original_image, use_container_width=True)
-                
-                with col_after:
-                    st.subheader("After")
-                    st.image(furnished_image, use_container_width=True)
-                
-                # Show preferences used
-                st.header("Design Specifications Used")
-                col_spec1, col_spec2 = st.columns(2)
-                
-                with col_spec1:
-                    st.markdown(f"**Room Type:** {room_type.title()}")
-                    st.markdown(f"**Style:** {style.title()}")
-                    st.markdown(f"**Color Scheme:** {color_scheme.title()}")
-                
-                with col_spec2:
-                    st.markdown(f"**Furniture Style:** {furniture_style.title()}")
-                    st.markdown(f"**Lighting:** {lighting.title()}")
-                    if additional_items:
-                        st.markdown(f"**Additional Items:** {', '.join(additional_items)}")
-                
-            else:
-                st.warning("No furnished image was generated. Please try different preferences.")
-                
-        except Exception as e:
-            st.error(f"Error furnishing room: {str(e)}")
+        
+        if duplicate:
+            distance, record = duplicate
+            show_reused_result(distance, "single", "Generate a New Result Instead")
+            entry = gallery_entry(record['furnished']) or save_furnished_room(
+                room_bytes, get_gallery_store().get_bytes(record['furnished']), preferences, f"furnished_{room_type}.png",
+                uploaded_furniture_data, draft=draft_mode
+            )
+            add_outcome({
+                'kind': "single",
+                'original': entry['original'],
+                'furnished': entry['furnished'],
+                'preferences': preferences,
+                'draft': draft_mode,
+                'structure': entry.get('structure')
+            })
+        else:
+            # Generate furnished room in the background (served from the response cache when
+            # nothing changed); the job panel below streams the response and saves the result
+            engine = get_engine(model_id, preprocess_settings, stream_responses)
+            request = single_style_request(
+                room_digest, preferences, uploaded_furniture_data, model_id, preprocess_settings, draft_mode
+            )
+            generate = functools.partial(
+                engine.generate, room_bytes, preferences, uploaded_furniture_data, room_digest, draft=draft_mode
+            )
+            # A prefetch of exactly this request was already paid for: wait for it rather than asking again
+            prefetched = get_prefetcher().claim(st.session_state.session_id, prefetch_key(request))
+            if prefetched:
+                generate = functools.partial(generate_after_prefetch, get_prefetcher(), prefetched, generate)
+            submit_job(
+                "single",
+                f"{style.title()} {room_type}",
+                generate,
+                request,
+                save=dict(
+                    original_bytes=room_bytes,
+                    filename=f"furnished_{room_type}.png",
+                    uploaded_furniture=uploaded_furniture_data,
+                    model_id=model_id,
+                    draft=draft_mode
+                ),
+                prefetch=dict(
+                    room_bytes=room_bytes,
+                    room_digest=room_digest,
+                    furniture=uploaded_furniture_data,
+                    model_id=model_id,
+                    preprocess_settings=preprocess_settings,
+                    draft=draft_mode
+                ) if prefetch_next else None
+            )
+    
+    except Exception as e:
+        st.error(f"Error furnishing room: {str(e)}")
 
 # Process multiple style generation
 if multiple_styles and uploaded_file:
-    with st.spinner("AI is generating 4 different style variations... This may take a few moments."):
-        try:
-            # Define 4 different styles to generate
-            style_variations = [
-                {"name": "Modern", "style": "modern", "color": "neutral", "furniture": "contemporary"},
-                {"name": "Traditional", "style": "traditional", "color": "warm", "furniture": "traditional"},
-                {"name": "Minimalist", "style": "minimalist", "color": "monochrome", "furniture": "modern"},
-                {"name": "Scandinavian", "style": "scandinavian", "color": "pastel", "furniture": "scandinavian"}
-            ]
-            
-            generated_variations = []
-            
-            for i, variation in enumerate(style_variations):
-                with st.spinner(f"Generating {variation['name']} style... ({i+1}/4)"):
-                    # Create preferences for this variation
-                    var_preferences = {
-                        'room_type': room_type,
-                        'style': variation['style'],
-                        'color_scheme': variation['color'],
-                        'furniture_style': variation['furniture'],
-                        'lighting': lighting,
-                        'additional_items': additional_items,
-                        'special_instructions': special_instructions
-                    }
-                    
-                    # Create the prompt
-                    uploaded_furniture_data = st.session_state.uploaded_furniture if st.session_state.uploaded_furniture else None
-                    base_prompt = create_room_prompt(var_preferences, uploaded_furniture_data)
-                    if special_instructions:
-                        base_prompt += f"\n\nSpecial Instructions: {special_instructions}"
-                    
-                    # Prepare content for AI generation
-                    content_list = [base_prompt, original_image]
-                    
-                    # Add uploaded furniture images to the content
-                    if uploaded_furniture_data:
-                        for furniture in uploaded_furniture_data:
-                            content_list.append(furniture['image'])
-                    
-                    # Generate furnished room
-                    response = st.session_state.client.models.generate_content(
-                        model=model_id,
-                        contents=content_list,
-                        config=types.GenerateContentConfig(
-                            response_modalities=['Text', 'Image']
-                        )
-                    )
-                    
-                    # Extract image from response
-                    furnished_image = None
-                    for part in response.parts:
-                        if image := part.as_image():
-                            furnished_image = PILImage.open(io.BytesIO(image.image_bytes))
-                            break
-                    
-                    if furnished_image:
-                        generated_variations.append({
-                            'name': variation['name'],
-                            'image': furnished_image,
-                            'preferences': var_preferences
-                        })
+    try:
+        uploaded_furniture_data = st.session_state.uploaded_furniture if st.session_state.uploaded_furniture else None
+        base_preferences = {
+            'room_type': room_type,
+            'lighting': lighting,
+            'additional_items': additional_items,
+            'special_instructions': special_instructions
+        }
+        
+        # Variations whose near-identical room was already furnished reuse that result
+        reused_variations = {}
+        if reuse_duplicates and not skip_duplicate_check:
+            for i, variation in enumerate(STYLE_VARIATIONS):
+                duplicate = find_duplicate_room(
+                    room_bytes, room_digest, variation_preferences(base_preferences, variation), uploaded_furniture_data, model_id,
+                    draft_mode
+                )
+                if duplicate:
+                    reused_variations[i] = duplicate
+        pending_indices = [i for i in range(len(STYLE_VARIATIONS)) if i not in reused_variations]
+        
+        # Reused variations go to the gallery right away; the rest are filled in by the job
+        variations = [None] * len(STYLE_VARIATIONS)
+        original = None
+        if reused_variations:
+            closest = min(distance for distance, _ in reused_variations.values())
+            show_reused_result(closest, "variations", "Generate New Variations Instead")
+        store = get_gallery_store()
+        for i, (distance, record) in reused_variations.items():
+            variation = STYLE_VARIATIONS[i]
+            var_preferences = variation_preferences(base_preferences, variation)
+            entry = gallery_entry(record['furnished']) or save_furnished_room(
+                room_bytes, store.get_bytes(record['furnished']), var_preferences,
+                f"{variation['name'].lower()}_{room_type}.png", uploaded_furniture_data, draft=draft_mode
+            )
+            original = entry['original']
+            variations[i] = {
+                'name': variation['name'],
+                'furnished': entry['furnished'],
+                'preferences': var_preferences,
+                'structure': entry.get('structure'),
+                'reused': True
+            }
+        
+        if pending_indices:
+            # Images are preprocessed once; every variation sends the same parts
+            engine = get_engine(model_id, preprocess_settings, stream_responses)
+            submit_job(
+                "variations",
+                f"{len(pending_indices)} style variations of the {room_type}",
+                functools.partial(
+                    run_variations_job, engine, room_bytes, base_preferences,
+                    [STYLE_VARIATIONS[i] for i in pending_indices], uploaded_furniture_data, room_digest,
+                    max_concurrency, draft_mode
+                ),
+                [room_digest, base_preferences, pending_indices, furniture_cache_items(uploaded_furniture_data), model_id,
+                 preprocess_settings, draft_mode],
+                pending=pending_indices,
+                variations=variations,
+                original=original,
+                room_type=room_type,
+                save=dict(
+                    original_bytes=room_bytes,
+                    uploaded_furniture=uploaded_furniture_data,
+                    model_id=model_id,
+                    draft=draft_mode
+                )
+            )
+        else:
+            add_outcome({'kind': "variations", 'original': original, 'variations': variations})
             
-            if generated_variations:
-                st.success(f"Generated {len(generated_variations)} style variations!")
-                
-                # Display all variations
-                st.header("Style Variations Comparison")
-                
-                # Show original room
-                st.subheader("Original Room")
-                col_orig = st.columns(1)[0]
-                with col_orig:
-                    st.image(original_image, caption="Original Room", use_container_width=True)
-                
-                # Show variations in a grid
-                st.subheader("Style Variations")
-                variation_cols = st.columns(2)
-                
-                for i, variation in enumerate(generated_variations):
-                    with variation_cols[i % 2]:
-                        st.image(variation['image'], caption=f"{variation['name']} Style", use_container_width=True)
-                        
-                        # Save each variation
-                        save_furnished_room(
-                            original_image, 
-                            variation['image'], 
-                            variation['preferences'], 
-                            f"{variation['name'].lower()}_{room_type}.png", 
-                            uploaded_furniture_data
-                        )
-                
-                # Show style details
-                st.subheader("Style Details")
-                for variation in generated_variations:
-                    with st.expander(f"{variation['name']} Style Details"):
-                        prefs = variation['preferences']
-                        col_detail1, col_detail2 = st.columns(2)
-                        
-                        with col_detail1:
-                            st.markdown(f"**Style:** {prefs['style'].title()}")
-                            st.markdown(f"**Color Scheme:** {prefs['color_scheme'].title()}")
-                        
-                        with col_detail2:
-                            st.markdown(f"**Furniture Style:** {prefs['furniture_style'].title()}")
-                            st.markdown(f"**Lighting:** {prefs['lighting'].title()}")
-            else:
-                st.warning("No style variations were generated. Please try again.")
-                
-        except Exception as e:
-            st.error(f"Error generating style variations: {str(e)}")
+    except Exception as e:
+        st.error(f"Error generating style variations: {str(e)}")
 
 # Process furniture preview
 if 'preview_style' in locals() and preview_style and uploaded_file and st.session_state.uploaded_furniture:
-    with st.spinner("Creating furniture preview..."):
-        try:
-            # Create a simple preview prompt
-            preview_prompt = f"""
-            Create a {room_type} in {style} style featuring the uploaded furniture items.
-            Make sure the uploaded furniture is prominently displayed and well-integrated into the room design.
-            The room should showcase how these specific furniture pieces look in a {style} {room_type}.
-            """
-            
-            # Prepare content for preview
-            preview_content = [preview_prompt, original_image]
-            for furniture in st.session_state.uploaded_furniture:
-                preview_content.append(furniture['image'])
-            
-            # Generate preview
-            preview_response = st.session_state.client.models.generate_content(
-                model=model_id,
-                contents=preview_content,
-                config=types.GenerateContentConfig(
-                    response_modalities=['Text', 'Image']
-                )
-            )
-            
-            # Display preview
-            preview_image = display_response(preview_response)
-            
-            if preview_image:
-                st.success("Furniture preview generated!")
-                st.info(f"Preview shows your furniture in a {style} {room_type}")
-            else:
-                st.warning("No preview was generated. Please try again.")
-                
-        except Exception as e:
-            st.error(f"Error generating preview: {str(e)}")
+    try:
+        # Generate a simple preview in the background (served from the response cache when nothing changed)
+        engine = get_engine(model_id, preprocess_settings, stream_responses)
+        submit_job(
+            "preview",
+            f"Furniture preview in a {style} {room_type}",
+            functools.partial(engine.preview, room_bytes, room_type, style, st.session_state.uploaded_furniture, room_digest),
+            [room_digest, room_type, style, furniture_cache_items(st.session_state.uploaded_furniture), model_id,
+             preprocess_settings],
+            room_type=room_type,
+            style=style
+        )
+    
+    except Exception as e:
+        st.error(f"Error generating preview: {str(e)}")
+
+# Background generations of this session: progress while they run (polled without
+# rerunning the whole app), then their saved results
+if active_jobs():
+    st.fragment(render_jobs, run_every=JOB_POLL_SECONDS)()
+render_job_outcomes()
 
 
 # Gallery section
 if st.session_state.furnished_rooms:
     st.header("Your Furnished Rooms Gallery")
     
-    # Display all furnished rooms
-    for i, room_data in enumerate(st.session_state.furnished_rooms):
-        with st.expander(f"Room {i+1} - {room_data['preferences']['room_type'].title()} ({room_data['timestamp']})"):
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                st.subheader("Before")
-                st.image(room_data['original'], use_container_width=True)
-            
-            with col2:
-                st.subheader("After")
-                st.image(room_data['furnished'], use_container_width=True)
-            
-            # Show preferences
-            st.subheader("Design Preferences")
-            prefs = room_data['preferences']
-            col_pref1, col_pref2 = st.columns(2)
-            
-            with col_pref1:
-                st.markdown(f"**Room Type:** {prefs['room_type'].title()}")
-                st.markdown(f"**Style:** {prefs['style'].title()}")
-                st.markdown(f"**Color Scheme:** {prefs['color_scheme'].title()}")
-            
-            with col_pref2:
-                st.markdown(f"**Furniture Style:** {prefs['furniture_style'].title()}")
-                st.markdown(f"**Lighting:** {prefs['lighting'].title()}")
-                if prefs['additional_items']:
-                    st.markdown(f"**Additional Items:** {', '.join(prefs['additional_items'])}")
-            
-            # Show uploaded furniture if any
-            if room_data.get('uploaded_furniture'):
-                st.subheader("Uploaded Furniture Used")
-                for j, furniture in enumerate(room_data['uploaded_furniture']):
-                    col_furn_display1, col_furn_display2 = st.columns([1, 3])
-                    with col_furn_display1:
-                        st.image(furniture['image'], caption=f"Item {j+1}", width=100)
-                    with col_furn_display2:
-                        st.markdown(f"**{furniture['description']}**")
-            
-            # Download buttons
-            col_dl1, col_dl2 = st.columns(2)
-            
-            with col_dl1:
-                # Download original
-                img_bytes = io.BytesIO()
-                room_data['original'].save(img_bytes, format='PNG')
-                st.download_button(
-                    label="Download Original",
-                    data=img_bytes.getvalue(),
-                    file_name=f"original_{room_data['filename']}",
-                    mime="image/png",
-                    key=f"orig_dl_{i}"
-                )
-            
-            with col_dl2:
-                # Download furnished
-                img_bytes = io.BytesIO()
-                room_data['furnished'].save(img_bytes, format='PNG')
-                st.download_button(
-                    label="Download Furnished",
-                    data=img_bytes.getvalue(),
-                    file_name=room_data['filename'],
-                    mime="image/png",
-                    key=f"furn_dl_{i}"
-                )
+    store = get_gallery_store()
+    rooms = st.session_state.furnished_rooms
+    room_numbers = {room['id']: i + 1 for i, room in enumerate(rooms)}
+    
+    # Export every room, furniture image and a preferences manifest in one ZIP (built on click)
+    st.download_button(
+        label="Download All (ZIP)",
+        data=functools.partial(build_gallery_zip, store, list(rooms)),
+        file_name=f"furnished_rooms_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip",
+        mime="application/zip",
+        key="gallery_zip_dl"
+    )
+    
+    # Download format for gallery images
+    with st.expander("Download Settings"):
+        export_format = st.selectbox("Download Format", list(EXPORT_FORMATS))
+        if export_format == "PNG":
+            export_settings = {
+                'format': export_format,
+                'compress_level': st.slider("PNG Compression Level", 0, 9, DEFAULT_PNG_COMPRESS_LEVEL, help="Higher is smaller but slower to encode")
+            }
+        else:
+            export_settings = {
+                'format': export_format,
+                'quality': st.slider("Download Quality", 50, 100, DEFAULT_EXPORT_QUALITY)
+            }
+    
+    # Only the opened room is loaded at full size
+    open_room = next((room for room in rooms if room['id'] == st.session_state.get('gallery_open')), None)
+    if open_room:
+        with st.container(border=True):
+            col_title, col_close = st.columns([5, 1])
+            with col_title:
+                version = f" v{open_room['version']}" if open_room.get('version') else ""
+                draft_label = " (draft)" if open_room.get('render') == "draft" else ""
+                st.subheader(f"Room {room_numbers[open_room['id']]}{version}{draft_label} - {open_room['preferences']['room_type'].title()} ({open_room['timestamp']})")
+            with col_close:
+                st.button("Close", key="gallery_close", on_click=close_gallery_entry, use_container_width=True)
+            render_gallery_entry(
+                store, open_room, export_settings, get_engine(model_id, preprocess_settings, stream_responses), rooms
+            )
+    
+    # Paginated thumbnail grid, newest rooms first
+    col_page1, col_page2 = st.columns(2)
+    with col_page1:
+        page_size = st.selectbox("Rooms per page", GALLERY_PAGE_SIZES, index=1)
+    page_count = math.ceil(len(rooms) / page_size)
+    with col_page2:
+        page = st.number_input("Page", min_value=1, max_value=page_count, value=1, help=f"{page_count} pages")
+    
+    page_rooms = rooms[::-1][(page - 1) * page_size:page * page_size]
+    gallery_cols = st.columns(GALLERY_COLUMNS)
+    for k, room_data in enumerate(page_rooms):
+        with gallery_cols[k % GALLERY_COLUMNS]:
+            st.image(
+                room_data['thumbnail'],
+                caption=f"Room {room_numbers[room_data['id']]}{' (draft)' if room_data.get('render') == 'draft' else ''} - {room_data['preferences']['room_type'].title()} ({room_data['timestamp']})",
+                use_container_width=True
+            )
+            st.button(
+                "Open",
+                key=f"gallery_open_{room_data['id']}",
+                on_click=open_gallery_entry,
+                args=(room_data['id'],),
+                use_container_width=True
+            )
+
+# Color search over this session's gallery
+if st.session_state.furnished_rooms:
+    st.header("Find Rooms by Color")
+    render_color_search(get_gallery_store())
 
 # Tips section
 with st.expander("Tips for Better Results"):
@@ -742,6 +1960,11 @@ with st.expander("Tips for Better Results"):
     - Use the preview feature to experiment with different styles
     """)
 
+# Refresh sidebar stats now that this run's generations are done
+get_metrics().observe("rerun_seconds", time.perf_counter() - run_started)
+render_sidebar_stats(sidebar_stats)
+render_diagnostics(diagnostics)
+
 # Footer
 st.divider()
 st.markdown("""
@@ -0,0 +1,103 @@
+import threading
+import time
+from contextlib import ExitStack
+
+import pytest
+
+from furnishing.admission import AdmissionController
+from furnishing.scheduler import DeadlineExceeded
+
+
+class Waiters:
+    """Requests queued one at a time from threads, recording the order they are admitted in"""
+
+    def __init__(self, controller):
+        self.controller = controller
+        self.admitted = []
+        self._threads = []
+
+    def queue(self, name, session, weight=1.0):
+        waiting = self.controller.stats()['waiting']
+
+        def request():
+            with self.controller.admit(session, weight):
+                self.admitted.append(name)
+        thread = threading.Thread(target=request)
+        thread.start()
+        self._threads.append(thread)
+        # Wait until it is in line, so queueing order (and tags) are fixed
+        wait_for(lambda: self.controller.stats()['waiting'] > waiting or name in self.admitted)
+
+    def join(self):
+        for thread in self._threads:
+            thread.join(5)
+
+
+def wait_for(condition):
+    for _ in range(500):
+        if condition():
+            return
+        time.sleep(0.01)
+    raise AssertionError("condition not reached")
+
+
+def test_single_request_goes_ahead_of_the_rest_of_a_batch():
+    controller = AdmissionController(max_in_flight=1, per_session=4)
+    waiters = Waiters(controller)
+    with controller.admit("busy"):
+        for i in range(1, 5):
+            waiters.queue(f"batch-{i}", "heavy")
+        waiters.queue("single", "light")
+        assert controller.position("light") == (2, 5)
+        assert controller.position("heavy") == (1, 5)
+        assert controller.position("busy") is None
+    waiters.join()
+    assert waiters.admitted == ["batch-1", "single", "batch-2", "batch-3", "batch-4"]
+
+
+def test_prefetch_is_a_separate_lower_weight_flow():
+    controller = AdmissionController(max_in_flight=1, per_session=4)
+    waiters = Waiters(controller)
+    with controller.admit("busy"):
+        waiters.queue("prefetch-1", "sid/prefetch", weight=0.25)
+        waiters.queue("prefetch-2", "sid/prefetch", weight=0.25)
+        waiters.queue("own", "sid")
+    waiters.join()
+    assert waiters.admitted == ["own", "prefetch-1", "prefetch-2"]
+
+
+def test_prefetch_does_not_use_the_session_limit():
+    controller = AdmissionController(max_in_flight=4, per_session=1)
+    with controller.admit("sid"):
+        with controller.admit("sid/prefetch", 0.25) as waited:
+            assert waited == pytest.approx(0, abs=0.05)
+            assert controller.stats()['in_flight'] == 2
+
+
+def test_session_and_global_limits():
+    controller = AdmissionController(max_in_flight=2, per_session=1)
+    waiters = Waiters(controller)
+    with ExitStack() as held:
+        held.enter_context(controller.admit("a"))
+        # A global slot is free, but "a" already uses its one
+        waiters.queue("a-2", "a")
+        assert waiters.admitted == []
+        # Another session gets the free slot at once, filling the process limit
+        held.enter_context(controller.admit("b"))
+        waiters.queue("c-1", "c")
+        stats = controller.stats()
+        assert (stats['in_flight'], stats['waiting']) == (2, 2)
+        assert waiters.admitted == []
+    waiters.join()
+    assert sorted(waiters.admitted) == ["a-2", "c-1"]
+    assert controller.stats()['in_flight'] == 0
+
+
+def test_waiting_past_the_deadline_gives_up_the_place_in_line():
+    controller = AdmissionController(max_in_flight=1, per_session=1)
+    with controller.admit("a"):
+        with pytest.raises(DeadlineExceeded):
+            with controller.admit("b", deadline=0.05):
+                pass
+        assert controller.position("b") is None
+        assert controller.stats()['deadline_exceeded'] == 1
@@ -0,0 +1,67 @@
+import gc
+
+from furnishing.client_pool import ClientPool
+
+
+class FakeModels:
+    def generate_content(self, model, contents, config=None):
+        return "response"
+
+    def generate_content_stream(self, model, contents, config=None):
+        yield "chunk 1"
+        yield "chunk 2"
+
+
+class FakeClient:
+    def __init__(self):
+        self.models = FakeModels()
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def make_pool():
+    clients = []
+
+    def factory(api_key, timings):
+        clients.append(FakeClient())
+        return clients[-1]
+    return ClientPool(factory), clients
+
+
+def test_switching_keys_waits_for_requests_in_flight():
+    pool, clients = make_pool()
+    client = pool.acquire("key-1", "session")
+    assert client.models.generate_content(model="m", contents=[]) == "response"
+
+    # A background job is still streaming from the old key's client
+    stream = client.models.generate_content_stream(model="m", contents=[])
+    assert next(stream) == "chunk 1"
+    pool.acquire("key-2", "session")
+    assert not clients[0].closed
+
+    assert list(stream) == ["chunk 2"]
+    assert clients[0].closed
+    assert not clients[1].closed
+
+
+def test_lease_releases_the_holder_when_collected():
+    pool, clients = make_pool()
+    pool.acquire("key", "session-1")
+    pool.acquire("key", "session-2")
+    lease = pool.lease("session-1")
+    other_lease = pool.lease("session-2")
+
+    del lease
+    gc.collect()
+    assert not clients[0].closed
+
+    del other_lease
+    gc.collect()
+    assert clients[0].closed
+    assert pool.timings("key") is None
+
+    # The next session gets a fresh client
+    pool.acquire("key", "session-3")
+    assert len(clients) == 2
@@ -0,0 +1,42 @@
+import io
+import json
+import os
+import zipfile
+
+from PIL import Image as PILImage
+
+from furnishing.gallery_export import write_gallery_zip
+from furnishing.gallery_store import GalleryStore
+
+
+def png(color):
+    buffer = io.BytesIO()
+    PILImage.new("RGB", (64, 48), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_export_skips_blobs_removed_from_the_store(tmp_path):
+    store = GalleryStore(str(tmp_path))
+    original = store.put_bytes(png((200, 190, 175)))
+    furniture = store.put_bytes(png((60, 70, 120)))
+    entries = [
+        {'id': f"entry-{i}", 'filename': "room.png", 'timestamp': "2026-01-01T00:00:00", 'preferences': {},
+         'original': original, 'furnished': store.put_bytes(png((i * 40, 100, 100))),
+         'uploaded_furniture': [{'description': "Sofa", 'digest': furniture}]}
+        for i in (1, 2)
+    ]
+    # The expiry sweep removed one furnished image
+    os.remove(store.blob_path(entries[0]['furnished']))
+
+    archive = zipfile.ZipFile(write_gallery_zip(store, entries, io.BytesIO()))
+
+    manifest = json.loads(archive.read("manifest.json"))
+    assert [record['furnished'] for record in manifest] == [None, "room_002_room/furnished.png"]
+    # Shared images are listed once and stored once
+    assert manifest[0]['original'] == manifest[1]['original']
+    assert manifest[0]['uploaded_furniture'][0]['path'] == manifest[1]['uploaded_furniture'][0]['path']
+    assert sorted(archive.namelist()) == sorted(
+        ["manifest.json", "room_002_room/furnished.png", manifest[0]['original'],
+         manifest[0]['uploaded_furniture'][0]['path']]
+    )
+    assert archive.read("room_002_room/furnished.png") == store.get_bytes(entries[1]['furnished'])
@@ -0,0 +1,87 @@
+import threading
+import time
+
+import pytest
+
+from furnishing.jobs import DONE, FAILED, JobQueue
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def wait_until_done(queue, job_id):
+    for _ in range(500):
+        job = queue.get(job_id)
+        if job.done:
+            return job
+        time.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+
+@pytest.fixture
+def queue():
+    queue = JobQueue(max_workers=2)
+    yield queue
+    queue.shutdown()
+
+
+def test_resubmitting_a_running_key_returns_the_same_job(queue):
+    release = threading.Event()
+    calls = []
+
+    def slow(on_update):
+        calls.append(1)
+        on_update("halfway")
+        release.wait(5)
+        return "room"
+
+    job_id = queue.submit(slow, key="single")
+    assert queue.submit(slow, key="single") == job_id
+    release.set()
+    job = wait_until_done(queue, job_id)
+    assert (job.status, job.result, job.progress) == (DONE, "room", "halfway")
+    assert len(calls) == 1
+
+    # Once finished, the key starts a new job
+    assert queue.submit(slow, key="single") != job_id
+
+
+def test_failures_end_the_job_and_free_its_key(queue):
+    def broken(on_update):
+        raise ValueError("bad request")
+
+    job = wait_until_done(queue, queue.submit(broken, key="single"))
+    assert job.status == FAILED
+    assert isinstance(job.error, ValueError)
+
+    def interrupted(on_update):
+        raise KeyboardInterrupt()
+
+    job_id = queue.submit(interrupted, key="single")
+    job = wait_until_done(queue, job_id)
+    assert job.status == FAILED
+    assert isinstance(job.error, KeyboardInterrupt)
+    assert queue.submit(lambda on_update: "room", key="single") != job_id
+
+
+def test_finished_jobs_are_pruned_after_the_retention_period():
+    clock = FakeClock()
+    queue = JobQueue(max_workers=1, retention=60, clock=clock)
+    try:
+        job_id = queue.submit(lambda on_update: "room")
+        wait_until_done(queue, job_id)
+
+        clock.now = 60
+        queue.submit(lambda on_update: "room")
+        assert queue.get(job_id) is not None
+
+        clock.now = 61
+        queue.submit(lambda on_update: "room")
+        assert queue.get(job_id) is None
+    finally:
+        queue.shutdown()
@@ -0,0 +1,76 @@
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import wait
+
+from furnishing.prefetch import PRUNE_INTERVAL, Prefetcher
+
+Result = namedtuple('Result', ['cached'])
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def wait_for(condition):
+    for _ in range(500):
+        if condition():
+            return
+        time.sleep(0.01)
+    raise AssertionError("condition not reached")
+
+
+def test_hit_is_counted_only_when_the_result_is_consumed():
+    prefetcher = Prefetcher(max_workers=2)
+    started, fail = threading.Event(), threading.Event()
+
+    def broken():
+        started.set()
+        fail.wait(5)
+        raise ZeroDivisionError()
+
+    prefetcher.submit("session", "ok", lambda: Result(cached=False))
+    prefetcher.submit("session", "broken", broken)
+    wait_for(lambda: prefetcher.stats()['generated'] == 1 and started.is_set())
+    ok = prefetcher.claim("session", "ok")
+    # Claimed while still running, so the failure only shows afterwards
+    broken_future = prefetcher.claim("session", "broken")
+    assert ok is not None and broken_future is not None
+    fail.set()
+    wait([ok, broken_future])
+    assert prefetcher.stats()['hits'] == 0
+
+    assert prefetcher.consume(ok, Result(cached=True)) is True
+    assert prefetcher.consume(broken_future, Result(cached=True)) is False
+    assert prefetcher.stats()['hits'] == 1
+    # Both entries were evicted by claiming them
+    assert prefetcher.claim("session", "ok") is None
+    assert prefetcher.claim("session", "broken") is None
+    prefetcher.shutdown()
+
+
+def test_prefetch_that_already_failed_is_evicted_on_claim():
+    prefetcher = Prefetcher(max_workers=1)
+    prefetcher.submit("session", "broken", lambda: 1 / 0)
+    wait_for(lambda: prefetcher.stats()['failed'] == 1)
+    assert prefetcher.claim("session", "broken") is None
+    # Gone for good: submitting it again starts a new prefetch
+    assert prefetcher.submit("session", "broken", lambda: Result(cached=False)) is True
+    prefetcher.shutdown()
+
+
+def test_idle_sessions_are_forgotten():
+    clock = FakeClock()
+    prefetcher = Prefetcher(max_workers=1, idle_timeout=100, clock=clock)
+    prefetcher.submit("old", "key", lambda: Result(cached=False))
+    wait_for(lambda: prefetcher.stats()['generated'])
+
+    clock.now = 100 + PRUNE_INTERVAL + 1
+    prefetcher.submit("new", "key", lambda: Result(cached=False))
+    assert prefetcher.session_count() == 1
+    assert prefetcher.remaining("old") == prefetcher.session_budget
+    prefetcher.shutdown()
@@ -0,0 +1,72 @@
+import pytest
+
+from furnishing.prompts import (
+    ELLIPSIS, _room_prompt, add_special_instructions, create_room_prompt, estimate_tokens, fit_room_prompt
+)
+
+PREFERENCES = {'room_type': 'bedroom', 'style': 'rustic', 'special_instructions': "Keep the reading corner bright."}
+FURNITURE = [{'description': f"Oak wardrobe number {i} with brass handles and a tall mirror"} for i in range(1, 13)]
+
+
+def furniture_lines(prompt):
+    return prompt.text.count("- Furniture Item ")
+
+
+def test_prompt_that_fits_is_not_trimmed():
+    prompt = fit_room_prompt(PREFERENCES, FURNITURE, token_budget=None)
+    assert prompt.text == add_special_instructions(create_room_prompt(PREFERENCES, FURNITURE),
+                                                   PREFERENCES['special_instructions'])
+    assert not prompt.trimmed
+    assert fit_room_prompt(PREFERENCES, FURNITURE, token_budget=prompt.tokens) == prompt
+
+
+@pytest.mark.parametrize("count", [0, 1, 2, 12])
+def test_shows_the_most_furniture_lines_that_fit(count):
+    furniture = FURNITURE[:count]
+    instructions = PREFERENCES['special_instructions']
+    descriptions = [item['description'] for item in furniture]
+    # From the smallest budget that needs no cut to the instructions up to the whole prompt
+    bare = estimate_tokens(add_special_instructions(_room_prompt(PREFERENCES, descriptions, 0), instructions))
+    full = fit_room_prompt(PREFERENCES, furniture, token_budget=None).tokens
+    for budget in range(bare, full + 1):
+        prompt = fit_room_prompt(PREFERENCES, furniture, token_budget=budget)
+        assert prompt.tokens <= budget
+        assert prompt.special_instructions == instructions
+        # Linear search for the most lines that fit
+        expected = max(shown for shown in range(count + 1) if estimate_tokens(
+            add_special_instructions(_room_prompt(PREFERENCES, descriptions, shown), instructions)) <= budget)
+        assert furniture_lines(prompt) == expected
+        assert prompt.trimmed == (expected < count)
+
+
+def test_long_instructions_are_shortened_to_the_budget():
+    preferences = dict(PREFERENCES, special_instructions="Use warm wood and soft textiles everywhere. " * 200)
+    base_tokens = estimate_tokens(_room_prompt(preferences, [item['description'] for item in FURNITURE], 0))
+    for budget in (base_tokens + 10, base_tokens + 50, 512):
+        prompt = fit_room_prompt(preferences, FURNITURE, token_budget=budget)
+        assert prompt.tokens <= budget
+        assert prompt.trimmed
+        assert furniture_lines(prompt) == 0
+        assert prompt.special_instructions.endswith(ELLIPSIS)
+        assert prompt.text.endswith(prompt.special_instructions)
+
+
+def test_budget_smaller_than_the_specification_keeps_only_the_specification():
+    for furniture in ([], FURNITURE):
+        prompt = fit_room_prompt(PREFERENCES, furniture, token_budget=10)
+        assert prompt.text == prompt.base == _room_prompt(PREFERENCES, [item['description'] for item in furniture], 0)
+        assert prompt.special_instructions == ""
+        assert prompt.trimmed
+        # The specification itself is never cut, so it is the smallest prompt there is
+        assert prompt.tokens > 10
+        assert fit_room_prompt(PREFERENCES, furniture, token_budget=0) == prompt
+
+
+def test_draft_and_structure_reminder_stay_within_the_budget():
+    preferences = dict(PREFERENCES, special_instructions="Add plants by the window. " * 40)
+    for draft in (False, True):
+        full = fit_room_prompt(preferences, FURNITURE, token_budget=None, draft=draft, structure_reminder=True)
+        budget = full.tokens // 2
+        prompt = fit_room_prompt(preferences, FURNITURE, token_budget=budget, draft=draft, structure_reminder=True)
+        assert prompt.tokens <= budget
+        assert "Keep the walls" in prompt.base
@@ -0,0 +1,99 @@
+import pytest
+
+from furnishing.scheduler import DeadlineExceeded, RequestScheduler, RetryPolicy
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class ServiceUnavailable(Exception):
+    code = 503
+
+
+class BadRequest(Exception):
+    code = 400
+
+
+def fail(timeout=None):
+    raise ServiceUnavailable()
+
+
+def bad_request(timeout=None):
+    raise BadRequest()
+
+
+def test_deadline_during_half_open_trial_releases_the_trial():
+    clock = FakeClock()
+    scheduler = RequestScheduler(
+        requests_per_minute=1, burst=1, retry_policy=RetryPolicy(max_attempts=1, base_delay=0, max_delay=0),
+        failure_threshold=1, reset_timeout=10, clock=clock, sleep=clock.sleep
+    )
+    with pytest.raises(ServiceUnavailable):
+        scheduler.run("key", fail)
+    assert scheduler.stats()['breakers']['key'] == "open"
+
+    # Half-open, but the next token is 50s away: the trial gives up waiting for it
+    clock.now = 10
+    with pytest.raises(DeadlineExceeded):
+        scheduler.run("key", lambda timeout: "ok", deadline=5)
+
+    clock.now = 70
+    assert scheduler.run("key", lambda timeout: "ok") == "ok"
+    assert scheduler.stats()['breakers']['key'] == "closed"
+
+
+def test_attempts_are_limited_to_the_time_left_before_the_deadline():
+    clock = FakeClock()
+    scheduler = RequestScheduler(
+        requests_per_minute=60, burst=1, retry_policy=RetryPolicy(max_attempts=4, base_delay=0, max_delay=0),
+        clock=clock, sleep=clock.sleep
+    )
+    timeouts = []
+
+    def stall(timeout):
+        # A stalled call that gives up when its timeout runs out
+        timeouts.append(timeout)
+        clock.sleep(timeout)
+        raise TimeoutError()
+
+    with pytest.raises(DeadlineExceeded):
+        scheduler.run("key", stall, deadline=5)
+    assert timeouts == [5]
+    assert clock.now == 5
+    assert scheduler.stats()['deadline_exceeded'] == 1
+
+    timeouts.clear()
+    assert scheduler.run("key", lambda timeout: timeouts.append(timeout) or "ok") == "ok"
+    assert timeouts == [None]
+
+
+def test_bad_requests_neither_close_nor_reset_the_breaker():
+    clock = FakeClock()
+    scheduler = RequestScheduler(
+        requests_per_minute=6000, burst=10, retry_policy=RetryPolicy(max_attempts=1, base_delay=0, max_delay=0),
+        failure_threshold=2, reset_timeout=10, clock=clock, sleep=clock.sleep
+    )
+    # A bad request between two 503s does not reset the failure streak
+    with pytest.raises(ServiceUnavailable):
+        scheduler.run("key", fail)
+    with pytest.raises(BadRequest):
+        scheduler.run("key", bad_request)
+    with pytest.raises(ServiceUnavailable):
+        scheduler.run("key", fail)
+    assert scheduler.stats()['breakers']['key'] == "open"
+
+    # A bad request as the half-open trial leaves the breaker half-open for the next trial
+    clock.now = 10
+    with pytest.raises(BadRequest):
+        scheduler.run("key", bad_request)
+    assert scheduler.stats()['breakers']['key'] == "half-open"
+    assert scheduler.run("key", lambda timeout: "ok") == "ok"
+    assert scheduler.stats()['breakers']['key'] == "closed"
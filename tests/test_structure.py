@@ -0,0 +1,53 @@
+import io
+
+from PIL import Image as PILImage
+from PIL import ImageDraw
+
+from furnishing.structure import analyze_structure
+
+# EXIF Orientation 6: the stored pixels are shown rotated 90 degrees clockwise
+ORIENTATION = 0x0112
+
+
+def draw_room(size, furniture=False):
+    """A one-point-perspective room with a window and door; `furniture` adds a sofa and a cabinet"""
+    width, height = size
+    image = PILImage.new("RGB", size, (200, 190, 175))
+    draw = ImageDraw.Draw(image)
+    left, top, right, bottom = width * 0.3, height * 0.25, width * 0.7, height * 0.65
+    line = (90, 80, 70)
+    draw.polygon([(0, height), (left, bottom), (right, bottom), (width, height)], fill=(150, 120, 90))
+    draw.polygon([(0, 0), (left, top), (right, top), (width, 0)], fill=(230, 230, 225))
+    draw.rectangle([left, top, right, bottom], fill=(210, 200, 185), outline=line, width=4)
+    for corner, back_corner in [((0, 0), (left, top)), ((width, 0), (right, top)),
+                                ((0, height), (left, bottom)), ((width, height), (right, bottom))]:
+        draw.line([corner, back_corner], fill=line, width=5)
+    draw.rectangle([width * 0.34, height * 0.31, width * 0.48, height * 0.49], fill=(170, 200, 230),
+                   outline=(60, 60, 60), width=6)
+    draw.rectangle([width * 0.56, height * 0.37, width * 0.64, bottom], fill=(120, 90, 60),
+                   outline=(50, 40, 30), width=6)
+    if furniture:
+        draw.rectangle([width * 0.25, height * 0.62, width * 0.7, height * 0.85], fill=(60, 70, 120))
+        draw.rectangle([width * 0.75, height * 0.5, width * 0.85, height * 0.9], fill=(180, 150, 90))
+    return image
+
+
+def encode(image, exif=None):
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90, **({'exif': exif} if exif else {}))
+    return buffer.getvalue()
+
+
+def test_exif_rotated_original_is_compared_upright():
+    upright = draw_room((1024, 768))
+    exif = PILImage.Exif()
+    exif[ORIENTATION] = 6
+    # A phone photo: pixels stored sideways, turned upright by the Orientation tag
+    original = encode(upright.transpose(PILImage.Transpose.ROTATE_90), exif)
+    furnished = encode(draw_room((1024, 768), furniture=True))
+
+    report = analyze_structure(original, furnished)
+
+    assert report.mask.shape[1] > report.mask.shape[0]
+    assert report.edge_preservation > 0.5
+    assert not report.drifted